@@ -0,0 +1,196 @@
+import os
+import time
+
+
+class FolderWatcher:
+    __version__='1.0'
+    """
+    **FolderWatcher**
+
+    A class for detecting the files written to a folder, e.g. the images saved by the downloader, as soon as they are complete.
+
+    On Linux, if the optional 'inotify_simple' package is installed, the folder is watched with inotify: a file is complete as soon as the writer closes it (IN_CLOSE_WRITE) or renames it into the folder (IN_MOVED_TO).
+    Otherwise the folder is polled, and a file is complete once its size and modification time have not changed for settle seconds.
+    The files present when the watcher starts are not reported, unless they change afterwards.
+
+    Parameters
+    ----------
+    path : str/path
+        Folder to watch.
+    extensions : tuple, optional
+        Extensions of the files to report (default: ('.png',)).
+    settle : float, optional
+        Time in seconds a polled file must keep the same size to be complete (default: 2.0).
+    poll_interval : float, optional
+        Time in seconds between two scans of the folder when polling (default: 1.0).
+    use_inotify : bool, optional
+        If False, the folder is polled even if inotify is available (default: True).
+
+    Examples
+    --------
+    >>> watcher = FolderWatcher('path/to/savePath')
+    >>> while True:
+    ...     for name in watcher.wait(timeout=60):
+    ...         georeference(name)
+
+    Methods
+    -------
+    __init__()
+        Initializes the FolderWatcher object and starts watching the folder.
+
+        Parameters
+        ----------
+        path : str/path
+            Folder to watch.
+        extensions : tuple, optional
+            Extensions of the files to report (default: ('.png',)).
+        settle : float, optional
+            Time in seconds a polled file must keep the same size to be complete (default: 2.0).
+        poll_interval : float, optional
+            Time in seconds between two scans of the folder when polling (default: 1.0).
+        use_inotify : bool, optional
+            If False, the folder is polled even if inotify is available (default: True).
+
+        Returns
+        -------
+
+    wait(timeout=None)
+        Waits until at least one file is complete, or until timeout.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Maximum time to wait in seconds. If set to 'None', waits forever (default: None).
+
+        Returns
+        -------
+        list
+            Sorted filenames of the files completed since the previous call (empty on timeout).
+
+    close()
+        Stops watching the folder.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+    """
+
+    def __init__(self, path, extensions=('.png',), settle=2.0, poll_interval=1.0, use_inotify=True):
+        """
+        Initializes the FolderWatcher object and starts watching the folder.
+
+        Parameters
+        ----------
+        path : str/path
+            Folder to watch.
+        extensions : tuple, optional
+            Extensions of the files to report (default: ('.png',)).
+        settle : float, optional
+            Time in seconds a polled file must keep the same size to be complete (default: 2.0).
+        poll_interval : float, optional
+            Time in seconds between two scans of the folder when polling (default: 1.0).
+        use_inotify : bool, optional
+            If False, the folder is polled even if inotify is available (default: True).
+        """
+        self.path = path
+        self.extensions = tuple(extension.lower() for extension in extensions)
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.inotify = None
+
+        if use_inotify:
+            try:
+                from inotify_simple import INotify, flags
+                self.inotify = INotify()
+                self.inotify.add_watch(path, flags.CLOSE_WRITE | flags.MOVED_TO)
+            except (ImportError, OSError):
+                # Not on Linux, inotify_simple not installed or out of watches: fall back to polling
+                self.inotify = None
+
+        # Polling state: filename -> (size, mtime, time of the last change, reported)
+        self.files = {}
+        if self.inotify is None:
+            now = time.monotonic()
+            for name, size, mtime in self._scan():
+                self.files[name] = (size, mtime, now, True)
+
+    @property
+    def mode(self):
+        """
+        Returns 'inotify' or 'polling'.
+        """
+        return 'polling' if self.inotify is None else 'inotify'
+
+    def _scan(self):
+        """
+        Lists the watched files of the folder with their size and modification time.
+        """
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.lower().endswith(self.extensions):
+                    stat = entry.stat()
+                    yield entry.name, stat.st_size, stat.st_mtime_ns
+
+    def _poll(self):
+        """
+        Scans the folder once and returns the files that have not changed for settle seconds.
+        """
+        now = time.monotonic()
+        ready = []
+        for name, size, mtime in self._scan():
+            previous = self.files.get(name)
+            if previous is None or previous[:2] != (size, mtime):
+                self.files[name] = (size, mtime, now, False)
+            elif not previous[3] and size > 0 and now - previous[2] >= self.settle:
+                self.files[name] = (size, mtime, previous[2], True)
+                ready.append(name)
+        return ready
+
+    def wait(self, timeout=None):
+        """
+        Waits until at least one file is complete, or until timeout.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Maximum time to wait in seconds. If set to 'None', waits forever (default: None).
+
+        Returns
+        -------
+        names : list
+            Sorted filenames of the files completed since the previous call (empty on timeout).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if self.inotify is not None:
+                events = self.inotify.read(timeout=None if remaining is None else int(remaining * 1000))
+                names = {event.name for event in events if event.name.lower().endswith(self.extensions)}
+                ready = [name for name in names if os.path.exists(os.path.join(self.path, name))
+                         and os.path.getsize(os.path.join(self.path, name)) > 0]
+            else:
+                ready = self._poll()
+                if not ready and remaining != 0:
+                    time.sleep(self.poll_interval if remaining is None else min(self.poll_interval, remaining))
+
+            if ready or (deadline is not None and time.monotonic() >= deadline):
+                return sorted(ready)
+
+    def close(self):
+        """
+        Stops watching the folder.
+        """
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+
+    def __getattr__(self, attrib):
+        if attrib=="__version__":
+            return self.__version__
+        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{attrib}'")
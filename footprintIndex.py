@@ -0,0 +1,268 @@
+import os
+import json
+import argparse
+import numpy as np
+
+
+class FootprintIndex:
+    __version__='1.0'
+    """
+    **FootprintIndex**
+
+    A class for finding the georeferenced tiles covering an area without opening the VRT or parsing the filenames.
+
+    The footprints (bounding boxes in EPSG:4326) of the tiles are kept in numpy arrays and bucketed in a uniform grid whose cells are about the size of a tile.
+    A query only tests the tiles of the grid cells overlapping the query box, so it takes microseconds even for hundreds of thousands of tiles.
+    If the optional 'rtree' package is installed and use_rtree is True, an R-tree is used instead of the grid.
+
+    The index is stored as a GeoJSON FeatureCollection ('<id>_footprints.geojson', written by georef.GeorefRun.finish), readable by QGIS and GDAL.
+
+    Parameters
+    ----------
+    names : list
+        Name (path) of each tile.
+    bounds : numpy.ndarray
+        Array of shape (N, 4) with the bounds (west, south, east, north) of each tile.
+    images : list, optional
+        Input image of each tile (default: None).
+    use_rtree : bool, optional
+        If True and 'rtree' is installed, the index is an R-tree (default: False).
+
+    Examples
+    --------
+    >>> index = FootprintIndex.read('path/to/acq_001_footprints.geojson')
+    >>> index.query(22.10, 35.10, 22.12, 35.11)
+    ['path/to/save_folder/IMG0001_LT35.1_LG22.1.tif', ...]
+
+    >>> python footprintIndex.py --inputpath path/to/acq_001_footprints.geojson --bbox 22.10 35.10 22.12 35.11
+
+    Methods
+    -------
+    __init__()
+        Initializes the FootprintIndex object and builds the index.
+
+        Parameters
+        ----------
+        See the class parameters.
+
+        Returns
+        -------
+
+    query(west, south, east, north)
+        Finds the tiles intersecting a bounding box.
+
+        Parameters
+        ----------
+        west, south, east, north : float
+            Bounding box in degrees.
+
+        Returns
+        -------
+        list
+            Names of the tiles, in index order.
+
+    query_point(lat, lon)
+        Finds the tiles containing a point.
+
+        Parameters
+        ----------
+        lat : float
+            Latitude.
+        lon : float
+            Longitude.
+
+        Returns
+        -------
+        list
+            Names of the tiles.
+
+    write(path)
+        Writes the footprints as a GeoJSON FeatureCollection.
+
+        Parameters
+        ----------
+        path : str/path
+            Path of the GeoJSON file.
+
+        Returns
+        -------
+
+    read(path, use_rtree=False)
+        Loads an index from a GeoJSON file written by write().
+
+        Parameters
+        ----------
+        path : str/path
+            Path of the GeoJSON file.
+        use_rtree : bool, optional
+            If True and 'rtree' is installed, the index is an R-tree (default: False).
+
+        Returns
+        -------
+        FootprintIndex
+            The index.
+
+    """
+
+    def __init__(self, names, bounds, images=None, use_rtree=False):
+        """
+        Initializes the FootprintIndex object and builds the index.
+
+        Parameters
+        ----------
+        names : list
+            Name (path) of each tile.
+        bounds : numpy.ndarray
+            Array of shape (N, 4) with the bounds (west, south, east, north) of each tile.
+        images : list, optional
+            Input image of each tile (default: None).
+        use_rtree : bool, optional
+            If True and 'rtree' is installed, the index is an R-tree (default: False).
+        """
+        self.names = list(names)
+        self.images = list(images) if images is not None else [None] * len(self.names)
+        self.bounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 4)
+        self.rtree = None
+        self.cells = {}
+
+        if len(self.names) == 0:
+            return
+
+        if use_rtree:
+            try:
+                from rtree import index
+                self.rtree = index.Index((i, tuple(box), None) for i, box in enumerate(self.bounds))
+                return
+            except ImportError:
+                pass
+
+        # Grid cells of the median tile size, so a tile falls in a few cells
+        self.origin = self.bounds[:, :2].min(axis=0)
+        self.cell = np.maximum(np.median(self.bounds[:, 2:] - self.bounds[:, :2], axis=0), 1e-9)
+        first = np.floor((self.bounds[:, :2] - self.origin) / self.cell).astype(np.int64)
+        last = np.floor((self.bounds[:, 2:] - self.origin) / self.cell).astype(np.int64)
+
+        cells = {}
+        for i, ((c0, r0), (c1, r1)) in enumerate(zip(first, last)):
+            for c in range(c0, c1 + 1):
+                for r in range(r0, r1 + 1):
+                    cells.setdefault((c, r), []).append(i)
+        self.cells = {key: np.array(value, dtype=np.int64) for key, value in cells.items()}
+
+    def _candidates(self, west, south, east, north):
+        """
+        Returns the indices of the tiles of the grid cells overlapping a bounding box.
+        """
+        c0, r0 = np.floor((np.array([west, south]) - self.origin) / self.cell).astype(np.int64)
+        c1, r1 = np.floor((np.array([east, north]) - self.origin) / self.cell).astype(np.int64)
+        if (c1 - c0 + 1) * (r1 - r0 + 1) > len(self.cells):
+            # Large boxes: testing all the tiles is faster than visiting the cells
+            return np.arange(len(self.names))
+        hits = [self.cells[(c, r)] for c in range(c0, c1 + 1) for r in range(r0, r1 + 1) if (c, r) in self.cells]
+        if not hits:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(hits)) if len(hits) > 1 else hits[0]
+
+    def query(self, west, south, east, north):
+        """
+        Finds the tiles intersecting a bounding box.
+
+        Parameters
+        ----------
+        west, south, east, north : float
+            Bounding box in degrees.
+
+        Returns
+        -------
+        names : list
+            Names of the tiles, in index order.
+        """
+        if len(self.names) == 0:
+            return []
+        if self.rtree is not None:
+            return [self.names[i] for i in sorted(self.rtree.intersection((west, south, east, north)))]
+
+        candidates = self._candidates(west, south, east, north)
+        boxes = self.bounds[candidates]
+        hits = candidates[(boxes[:, 0] <= east) & (boxes[:, 2] >= west) & (boxes[:, 1] <= north) & (boxes[:, 3] >= south)]
+        return [self.names[i] for i in hits]
+
+    def query_point(self, lat, lon):
+        """
+        Finds the tiles containing a point.
+
+        Parameters
+        ----------
+        lat : float
+            Latitude.
+        lon : float
+            Longitude.
+
+        Returns
+        -------
+        names : list
+            Names of the tiles.
+        """
+        return self.query(lon, lat, lon, lat)
+
+    def write(self, path):
+        """
+        Writes the footprints as a GeoJSON FeatureCollection, atomically.
+
+        Parameters
+        ----------
+        path : str/path
+            Path of the GeoJSON file.
+        """
+        features = []
+        for name, image, (w, s, e, n) in zip(self.names, self.images, self.bounds.tolist()):
+            features.append({'type': 'Feature',
+                             'bbox': [w, s, e, n],
+                             'geometry': {'type': 'Polygon', 'coordinates': [[[w, s], [e, s], [e, n], [w, n], [w, s]]]},
+                             'properties': {'path': name, 'image': image}})
+        with open(path + '.part', 'w') as file:
+            json.dump({'type': 'FeatureCollection', 'features': features}, file)
+        os.replace(path + '.part', path)
+
+    @staticmethod
+    def read(path, use_rtree=False):
+        """
+        Loads an index from a GeoJSON file written by write().
+
+        Parameters
+        ----------
+        path : str/path
+            Path of the GeoJSON file.
+        use_rtree : bool, optional
+            If True and 'rtree' is installed, the index is an R-tree (default: False).
+
+        Returns
+        -------
+        index : FootprintIndex
+            The index.
+        """
+        with open(path) as file:
+            features = json.load(file)['features']
+        return FootprintIndex([feature['properties']['path'] for feature in features],
+                              [feature['bbox'] for feature in features],
+                              images=[feature['properties'].get('image') for feature in features],
+                              use_rtree=use_rtree)
+
+
+    def __getattr__(self, attrib):
+        if attrib=="__version__":
+            return self.__version__
+        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{attrib}'")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process command line arguments")
+    parser.add_argument("--inputpath","-i", help="Footprint GeoJSON written by georef", required=True)
+    parser.add_argument("--bbox","-b", type=float, nargs=4, metavar=('WEST', 'SOUTH', 'EAST', 'NORTH'), help="Bounding box in degrees", default=None)
+    parser.add_argument("--point", type=float, nargs=2, metavar=('LAT', 'LON'), help="Point in degrees", default=None)
+
+    args = parser.parse_args()
+
+    index = FootprintIndex.read(args.inputpath)
+    names = index.query(*args.bbox) if args.bbox is not None else index.query_point(*args.point)
+    print('\n'.join(names))
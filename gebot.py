@@ -1,13 +1,15 @@
 import pyautogui 
 import time 
-from os.path import exists, join, splitext, getsize
-from os import mkdir 
+from os.path import exists, join, splitext
+from os import mkdir, remove
 import datetime  
 import pandas as pd  
 import json 
 import tkinter as tk
 from statusIndicator import GEBotInfoDisplay
 from notificationHandler import SendEmail 
+from folderWatcher import FolderWatcher
+from jobStore import JobStore
 from tqdm import tqdm
 
 class ImageDownloader:
@@ -21,11 +23,19 @@ class ImageDownloader:
 
     In the current version, the bot is equipped with download logic, a notification handler (to send the status to the registered email on failure), and a status window (to display the bot's status).
 
+    The state of each grid point (pending, in progress, done, failed, attempts and timings) is kept in a SQLite job store (see jobStore.JobStore), 'jobs.sqlite' in the save path unless 'jobStore' is set in the configuration file.
+    Restarting the bot with the same points continues exactly where it stopped: the points done are skipped and the point being downloaded during a crash is downloaded again.
+
     Parameters
     ----------
 
     config_path : str, optional
         The file path to the configuration file (default is './resources/config.json').
+    quality_check : bool, optional
+        If True, each image is checked for blank or partly loaded captures once saved (see tileQuality.TileQuality), and the bad ones are listed in 'requeue.csv' in the save path (default: False).
+    adaptive : bool, optional
+        If True, the bot waits until the map stops changing (see renderStability.RenderStability) instead of sleeping for the fixed hover and step times, which become upper bounds.
+        The map region is read from 'map_region' in the location report (see getLoc.py), the whole screen if missing. The time saved on each image is appended to 'render_times.csv' in the save path (default: False).
 
     Examples
     --------
@@ -44,6 +54,10 @@ class ImageDownloader:
         ----------
         config_path : str, optional
             Path to the configuration file (default: './resources/config.json').
+        quality_check : bool, optional
+            If True, the saved images are checked and the bad ones listed in 'requeue.csv' (default: False).
+        adaptive : bool, optional
+            If True, the fixed sleeps are replaced by waiting for the map to be rendered (default: False).
         
         Returns
         -------
@@ -64,9 +78,12 @@ class ImageDownloader:
         
         Returns
         -------
+        float
+            Time saved in seconds by the adaptive waits (0 if adaptive is False).
 
     download_images(latitude, longitude, img_id, sleep_time=0, sleep_after=25)
         Download multiple images from coordinates. This method takes a list of parameters and downloads them; the user has less control over the filename but it is faster.
+        The points are added to the job store and claimed from it one at a time, so the points already done are skipped.
 
         Parameters
         ----------
@@ -86,6 +103,7 @@ class ImageDownloader:
         
     __check_download_complete__(filename)
         Check if the download is complete for a specific file on the given save path. This is an internal method to check the status of the download.
+        The save path is watched with folderWatcher.FolderWatcher: with inotify, the bot continues as soon as Google Earth closes the file; otherwise the folder is polled until the file size stops changing.
         Once the download is completed, it sends a trigger flag to the bot to continue downloading. Additionally, if the bot gets into a 'stalled' state and stops downloading, it sends an email to the registered user.
 
         Parameters
@@ -95,6 +113,21 @@ class ImageDownloader:
         
         Returns
         -------
+
+    __wait_render__(max_wait, require_change=False)
+        Internal method. Waits until the map is rendered, or sleeps for max_wait seconds if adaptive is False.
+
+        Parameters
+        ----------
+        max_wait : float
+            Maximum time to wait in seconds.
+        require_change : bool, optional
+            If True, the map must change before it is stable (default: False).
+
+        Returns
+        -------
+        float
+            Time saved in seconds.
     
     __update_status__()
         Internal method. This method is used to update the status on the notification window of the bot after each image download.
@@ -141,7 +174,7 @@ class ImageDownloader:
 
     """
 
-    def __init__(self, config_path='./resources/config.json'):
+    def __init__(self, config_path='./resources/config.json', quality_check=False, adaptive=False):
         """
         Initialize ImageDownloader class.
 
@@ -151,6 +184,10 @@ class ImageDownloader:
         ----------
         config_path : str, optional
             Path to the configuration file (default: './resources/config.json').
+        quality_check : bool, optional
+            If True, the saved images are checked and the bad ones listed in 'requeue.csv' in the save path (default: False).
+        adaptive : bool, optional
+            If True, the bot waits until the map stops changing instead of sleeping for the fixed hover and step times, and the time saved on each image is appended to 'render_times.csv' in the save path (default: False).
         """
         with open(config_path) as file:
             self.config = json.load(file)
@@ -163,6 +200,27 @@ class ImageDownloader:
         self.counter = 0
         self.trigger_time = 600  # trigger time to send the stop email in second.
 
+        # Watch the save path from the start, so a file closed before the bot checks it is not missed
+        if not exists(self.save_path):
+            mkdir(self.save_path)
+        self.watcher = FolderWatcher(self.save_path, settle=1.0, poll_interval=1.0)
+        self.completed = set()
+
+        # Download state of each grid point, to resume after a crash
+        self.jobs = JobStore(self.config.get('jobStore', join(self.save_path, 'jobs.sqlite')))
+
+        # Check of the saved images, to download the blank or partly loaded ones again
+        self.quality = None
+        if quality_check:
+            from tileQuality import TileQuality
+            self.quality = TileQuality()
+
+        # Screenshots of the map, to continue as soon as it is rendered
+        self.render = None
+        if adaptive:
+            from renderStability import RenderStability
+            self.render = RenderStability(region=self.LOCATION_REPORT.get('map_region'))
+
         # Initialize status window
         self.root = tk.Tk()
         self.gebot_display = GEBotInfoDisplay(self.root)
@@ -190,7 +248,12 @@ class ImageDownloader:
         hover_time : int, optional
             Time to sleep when GE pro is hovering (default: 4).
         step_sleep : int, optional
-            Time to sleep (default: 2).
+            Time to sleep (default: 2). With adaptive, the maximum time to wait for the map after unchecking the coordinates; the other steps wait for the keyboard focus and keep the fixed sleep.
+
+        Returns
+        -------
+        saved : float
+            Time saved in seconds by the adaptive waits (0 if adaptive is False).
         """
         # Searching bar lat, long entering
         pyautogui.click(self.LOCATION_REPORT['search_loc'])
@@ -201,14 +264,15 @@ class ImageDownloader:
 
         # Wait for Google Earth to hover to the location
         print("{} Hovering to {}".format(datetime.datetime.now().replace(microsecond=0), coord))
-        time.sleep(hover_time)
+        saved = self.__wait_render__(hover_time, require_change=True)
 
         # Uncheck coordinate icon
         pyautogui.click(self.LOCATION_REPORT['uncheck'])
-        time.sleep(step_sleep)
+        saved += self.__wait_render__(step_sleep)
 
         # Click on Save Images
         pyautogui.click(self.LOCATION_REPORT['save_image_loc'])
+        # Waits for the filename field to take the keyboard focus, which the map does not show
         time.sleep(step_sleep)
         pyautogui.typewrite(filename)
         time.sleep(step_sleep)
@@ -216,11 +280,14 @@ class ImageDownloader:
         # Click on save button
         pyautogui.click(self.LOCATION_REPORT['save_button_loc'])
         print("{} Saving file: {}".format(datetime.datetime.now().replace(microsecond=0), filename))
+        return saved
 
 
     def download_images(self, latitude, longitude, img_id, sleep_time=0, sleep_after=25):
         """
         Download multiple images from coordinates. This method takes a list of parameters and downloads them; the user has less control over the filename but it is faster.
+        The points are added to the job store and claimed from it in id order: the points already done are skipped, and the failed ones (e.g. bad captures) are retried at the end.
+        A point claimed again (failed, or interrupted by a crash) may already have a file in the save path: it is removed before the download, so the Save dialog of Google Earth does not ask to overwrite it.
 
         Parameters
         ----------
@@ -236,21 +303,56 @@ class ImageDownloader:
             Sleep after a certain number of downloads to avoid banning. (default: 25).
         """
         self.status = "Downloading"
-        self.img_len = len(img_id)
         self.bot_start_time = time.time()
-        
-        for lat, long, id in zip(latitude, longitude, img_id):
+
+        ids = [int(id) for id in img_id]
+        # The images saved before the job store existed are not downloaded again
+        existing = [exists(join(self.save_path, "IMG" + str(id).zfill(4) + "_LT" + str(lat) + "_LG" + str(long) + '.png'))
+                    for id, lat, long in zip(ids, latitude, longitude)]
+        self.jobs.add(ids, latitude, longitude, done=existing)
+        self.img_len = self.jobs.remaining(ids)
+        print("{} {} images left to download".format(datetime.datetime.now().replace(microsecond=0), self.img_len))
+
+        while (job := self.jobs.claim(ids)) is not None:
+            id, lat, long = job
             filename = "IMG" + str(id).zfill(4) + "_LT" + str(lat) + "_LG" + str(long) + '.png'
+            started = time.time()
+
+            # A failed or interrupted attempt may have left the file: the Save dialog would ask to overwrite it
+            if exists(join(self.save_path, filename)):
+                remove(join(self.save_path, filename))
+                print("{} Removed previous file: {}".format(datetime.datetime.now().replace(microsecond=0), filename))
+            self.completed.discard(filename)
 
+            # If the bot is interrupted here (crash, pyautogui fail-safe), the point stays in progress and is downloaded first at the next start
             # Download image from coordinates
-            self.download_image(coord=str(lat) + "," + str(long), filename=filename)
+            saved = self.download_image(coord=str(lat) + "," + str(long), filename=filename)
             # time.sleep(8)
 
             # Check download completed
             self.__check_download_complete__(filename)
-            self.img_len = self.img_len-1
 
-            time.sleep(2)
+            error = None
+            if self.quality is not None:
+                result = self.quality.check(join(self.save_path, filename))
+                if result['bad']:
+                    self.quality.write_requeue([result], join(self.save_path, 'requeue.csv'))
+                    print("{} Bad capture ({}): {}".format(datetime.datetime.now().replace(microsecond=0), result['reasons'], filename))
+                    error = 'Bad capture: ' + result['reasons']
+
+            # Bad captures are downloaded again once all the other points are done
+            if error is not None:
+                self.jobs.fail(id, error, seconds=time.time() - started)
+            else:
+                self.jobs.done(id, seconds=time.time() - started)
+            self.img_len = self.jobs.remaining(ids)
+
+            saved += self.__wait_render__(2)
+            if self.render is not None:
+                with open(join(self.save_path, 'render_times.csv'), 'a') as file:
+                    file.write(f"{filename},{saved:.2f}\n")
+                print("{} Render waits saved {:.1f} s".format(datetime.datetime.now().replace(microsecond=0), saved))
+
             self.counter += 1
             self.__update_status__()
 
@@ -261,6 +363,7 @@ class ImageDownloader:
     def __check_download_complete__(self, filename):
         """
         Check if the download is complete for a specific file on the given save path. This is an internal method to check the status of the download.
+        The file is complete when Google Earth closes it (inotify IN_CLOSE_WRITE), or, without inotify, when its size has not changed for a second (see folderWatcher.FolderWatcher).
         Once the download is completed, it sends a trigger flag to the bot to continue downloading. Additionally, if the bot gets into a 'stalled' state and stops downloading, it sends an email to the registered user.
 
         Parameters
@@ -268,17 +371,13 @@ class ImageDownloader:
         filename : str
             Name of the file to check.
         """
-        d_complete = False
-        size_cr = size_pr = 0
         elapsed_time = time.time()
         emailstatus = False
-        while not d_complete:
-            if exists(join(self.save_path, filename)):
-                size_cr = getsize(join(self.save_path, filename))
-                if size_cr == size_pr:  # If saving completes
-                    d_complete = True
-                size_pr = size_cr
-            time.sleep(1)
+        while filename not in self.completed:
+            # Returns as soon as a file is complete, or after a second to check the stalled state
+            self.completed.update(self.watcher.wait(timeout=1))
+            if filename in self.completed:
+                break
             if time.time() - elapsed_time > self.trigger_time:
                 if not emailstatus:
                     self.se.process_stopped()
@@ -286,7 +385,29 @@ class ImageDownloader:
                 self.status = "Stopped"
                 self.__update_status__()
 
+        self.completed.discard(filename)
         print("{} Saved file: {}".format(datetime.datetime.now().replace(microsecond=0), filename))
+
+    def __wait_render__(self, max_wait, require_change=False):
+        """
+        Internal method. Waits until the map is rendered (see renderStability.RenderStability), or sleeps for max_wait seconds if adaptive is False.
+
+        Parameters
+        ----------
+        max_wait : float
+            Maximum time to wait in seconds.
+        require_change : bool, optional
+            If True, the map must change before it is stable, e.g. while hovering to a new location (default: False).
+
+        Returns
+        -------
+        saved : float
+            Time saved in seconds compared to sleeping for max_wait.
+        """
+        if self.render is None:
+            time.sleep(max_wait)
+            return 0.0
+        return max(0.0, max_wait - self.render.wait(max_wait, require_change=require_change))
     
     def __update_status__(self):
         """
@@ -398,10 +519,10 @@ class ImageDownloader:
 if __name__ == '__main__':
     data = pd.read_csv('./resources/grid_points_csv.csv')
 
-    start = 632
-    latitude = data['Lat'][start:]
-    longitude = data['Long'][start:]
-    img_id = data['id'][start:]
+    # The job store in the save path skips the points already downloaded
+    latitude = data['Lat']
+    longitude = data['Long']
+    img_id = data['id']
 
     downloader = ImageDownloader()
     # downloader.download_images(latitude, longitude, img_id=img_id, sleep_time=100, sleep_after=200)
@@ -2,10 +2,183 @@ import math
 import numpy as np
 import cv2
 import rasterio
+import rasterio.shutil
 import os
 import argparse
+import json
+from contextlib import contextmanager, ExitStack
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import warnings
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from rasterio.enums import ColorInterp
+from rasterio.errors import NotGeoreferencedWarning
+from rasterio.windows import Window
 from tqdm import tqdm
 from osgeo import gdal
+from manifestHandler import GeorefManifest
+from leaseHandler import LeaseManager
+from stageTimer import StageTimer, NULL_TIMER
+
+# Ground resolution of a GEBOT capture in meters per pixel
+PIX_RES = 0.17475
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# Output profiles for the georeferenced images: driver and creation options
+PROFILES = {
+    'gtiff': {'driver': 'GTiff'},
+    'deflate': {'driver': 'GTiff', 'tiled': True, 'blockxsize': 256, 'blockysize': 256, 'compress': 'deflate', 'predictor': 2},
+    'lzw': {'driver': 'GTiff', 'tiled': True, 'blockxsize': 256, 'blockysize': 256, 'compress': 'lzw', 'predictor': 2},
+    'zstd': {'driver': 'GTiff', 'tiled': True, 'blockxsize': 256, 'blockysize': 256, 'compress': 'zstd', 'predictor': 2},
+    'jpeg': {'driver': 'GTiff', 'tiled': True, 'blockxsize': 256, 'blockysize': 256, 'compress': 'jpeg', 'photometric': 'ycbcr', 'jpeg_quality': 90},
+    'cog': {'driver': 'COG', 'blocksize': 512, 'compress': 'deflate', 'predictor': 2, 'overview_resampling': 'average'},
+    # Written by tileContainer.GpkgTileWriter, not by open_output
+    'gpkg': {'driver': 'GPKG'},
+}
+
+# With the 'gpkg' profile, all the images of a folder are pasted into one tile matrix of this GeoPackage in the save folder
+GPKG_CONTAINER = 'tiles.gpkg'
+
+# GeoPackage writers of the 'gpkg' profile, one per container, shared by the threads of this process
+_gpkg_writers = {}
+_gpkg_lock = threading.Lock()
+
+# The downloaded PNG/JPG files are read with rasterio and carry no georeferencing yet
+warnings.filterwarnings('ignore', category=NotGeoreferencedWarning)
+
+# Decode buffer reused across the images handled by a worker (one per thread)
+_local = threading.local()
+
+
+def _get_buffer(shape):
+    """
+    Returns a uint8 array of the given shape backed by the buffer of the calling thread. The buffer only grows, so it is allocated once per worker for images of the same size.
+
+    Parameters
+    ----------
+    shape : tuple
+        Shape of the array.
+
+    Returns
+    -------
+    buffer : numpy.ndarray
+        Array view on the buffer. Its content is overwritten by the next call from the same thread.
+    """
+    size = int(np.prod(shape))
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None or buffer.size < size:
+        buffer = _local.buffer = np.empty(size, dtype=np.uint8)
+    return buffer[:size].reshape(shape)
+
+
+def gpkg_writer(container):
+    """
+    Returns the writer of a GeoPackage of the 'gpkg' profile (see tileContainer.GpkgTileWriter), opened once per process.
+
+    Parameters
+    ----------
+    container : str
+        Path of the GeoPackage.
+
+    Returns
+    -------
+    writer : tileContainer.GpkgTileWriter
+        The writer, shared by the threads of this process.
+    """
+    with _gpkg_lock:
+        if container not in _gpkg_writers:
+            from tileContainer import GpkgTileWriter
+            _gpkg_writers[container] = GpkgTileWriter(container)
+        return _gpkg_writers[container]
+
+
+def close_gpkg(container, commit_only=False):
+    """
+    Commits the images written to a GeoPackage of the 'gpkg' profile and, unless commit_only, closes its writer. Does nothing if it is not open.
+
+    Parameters
+    ----------
+    container : str
+        Path of the GeoPackage.
+    commit_only : bool, optional
+        If True, the writer is kept open for the next images (default: False).
+    """
+    with _gpkg_lock:
+        writer = _gpkg_writers.get(container) if commit_only else _gpkg_writers.pop(container, None)
+    if writer is None:
+        return
+    if commit_only:
+        writer.commit()
+    else:
+        writer.close()
+
+
+@contextmanager
+def open_output(savepath, width, height, transform, profile='gtiff', **creation):
+    """
+    Opens an RGB uint8 EPSG:4326 raster for writing with the driver and creation options of an output profile.
+
+    The file is written under a '.part' name and renamed to savepath once complete, so a half-written output is never taken for a finished one.
+    The COG driver can only copy an existing dataset, so for the 'cog' profile the pixels are first written to a temporary tiled GeoTIFF on the local disk, which is then copied to savepath with its overviews.
+    The 'gpkg' profile is not written through a dataset: see gpkg_writer().
+
+    Parameters
+    ----------
+    savepath : str
+        The path of the file to write.
+    width : int
+        Width of the raster in pixels.
+    height : int
+        Height of the raster in pixels.
+    transform : affine.Affine
+        Affine transform of the raster.
+    profile : str
+        Output profile, one of the keys of PROFILES.
+    **creation
+        Additional creation options (e.g. bigtiff='IF_SAFER').
+
+    Yields
+    ------
+    dst : rasterio.io.DatasetWriter
+        The opened dataset.
+    """
+    options = dict(PROFILES[profile], **creation)
+    driver = options.pop('driver')
+    meta = dict(dtype=rasterio.uint8,
+                transform=transform,
+                crs=rasterio.crs.CRS.from_epsg(4326),
+                width=width,
+                height=height,
+                count=3)
+
+    if driver == 'GPKG':
+        raise ValueError("The 'gpkg' profile is written with gpkg_writer(), not open_output()")
+
+    partpath = savepath + '.part'
+    try:
+        if driver != 'COG':
+            with rasterio.open(partpath, 'w', driver=driver, **meta, **options) as dst:
+                yield dst
+        else:
+            fd, tmppath = tempfile.mkstemp(suffix='.tif')
+            os.close(fd)
+            try:
+                with rasterio.open(tmppath, 'w', driver='GTiff', tiled=True, blockxsize=512, blockysize=512, **creation, **meta) as dst:
+                    yield dst
+                rasterio.shutil.copy(tmppath, partpath, driver='COG', **options)
+            finally:
+                os.remove(tmppath)
+        os.replace(partpath, savepath)
+    finally:
+        if os.path.exists(partpath):
+            os.remove(partpath)
 
 
 class Geotagger:
@@ -32,7 +205,8 @@ class Geotagger:
         The ending number for the filenames of the images in the folder for georeferencing. If set to 'None', the function will perform the action for all the items in the folder.
 
     
-    The 'start' and 'stop' parameters are helpful if we want to terminate the process in the middle and restart it later.
+    An interrupted run is resumed by running it again: the manifest kept in the output folder ('georef_manifest.json') records the images already georeferenced.
+    The 'start' and 'stop' parameters restrict a run to a slice of the sorted filenames.
 
     Examples
     --------
@@ -55,6 +229,16 @@ class Geotagger:
             Pixel resolution in the X direction.
         pixYRES : float
             Pixel resolution in the Y direction.
+        bounds : tuple
+            Precomputed bounding box (north, south, west, east), e.g. from batch_corners(). If set to 'None', it is computed in getcoord().
+        block_size : int
+            Number of rows read and written at a time. If set, geotag() streams the image in strips with rasterio windows instead of decoding it at once, so the memory used is bounded by the strip size. If set to 'None', the whole image is decoded.
+        profile : str
+            Output profile, one of the keys of PROFILES: 'gtiff' (plain striped GeoTIFF), 'deflate', 'lzw', 'zstd', 'jpeg' (tiled and compressed GeoTIFF), 'cog' (Cloud-Optimized GeoTIFF with internal overviews) or 'gpkg' (tiles of one GeoPackage per folder, see GPKG_CONTAINER; block_size is ignored).
+        sidecar : bool
+            If True, geotag() leaves the pixels untouched and only writes a world file and a .aux.xml with the CRS next to the image.
+        timer : stageTimer.StageTimer
+            Timer recording the duration of the decode, color, corners and write stages. If set to 'None', nothing is recorded.
 
         Returns
         -------
@@ -114,7 +298,88 @@ class Geotagger:
         -------
         tuple
             Tuple containing latitude and longitude.
+
+    image_size()
+        Reads the width and height of an image from its header, without decoding the pixels.
+
+        Parameters
+        ----------
+        filepath : str
+            The path to the image file.
+
+        Returns
+        -------
+        tuple
+            Tuple containing width and height in pixels.
+
+    batch_corners()
+        Vectorized version of output_corners() for a whole set of images.
+
+        Parameters
+        ----------
+        lat : numpy.ndarray
+            Latitudes of the image centers.
+        lon : numpy.ndarray
+            Longitudes of the image centers.
+        width : numpy.ndarray
+            Widths of the images in pixels.
+        height : numpy.ndarray
+            Heights of the images in pixels.
+        pixXRES : float
+            Pixel resolution in the X direction.
+        pixYRES : float
+            Pixel resolution in the Y direction.
+
+        Returns
+        -------
+        tuple
+            Tuple containing the bounding boxes as a (N, 4) array (north, south, west, east) and the affine transforms as a (N, 6) array (a, b, c, d, e, f).
     
+    read_rgb()
+        Reads a window of an opened image as a band-interleaved RGB uint8 array, with the same pixel values as the OpenCV decode in getcoord().
+
+        Parameters
+        ----------
+        src : rasterio.DatasetReader
+            The opened image.
+        window : rasterio.windows.Window
+            The window to read.
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of shape (3, rows, columns).
+
+    get_bounds()
+        Returns the bounding box of the image, from the precomputed bounds if given.
+
+        Parameters
+        ----------
+        width : int
+            Width of the image in pixels.
+        height : int
+            Height of the image in pixels.
+
+        Returns
+        -------
+        tuple
+            Tuple containing the bounding box coordinates (north, south, west, east).
+
+    decode()
+        Decodes the image straight into a band-interleaved RGB uint8 array, in the layout rasterio writes.
+
+        Parameters
+        ----------
+        data : bytes, optional
+            Content of the image file, if already read. If set to 'None', the image is read from filepath.
+        reuse : bool, optional
+            If True, the array is backed by a buffer reused by the next decode in the same thread.
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of shape (3, height, width).
+
     getcoord()
         Computes the geotagged image's bounding box and corner coordinates.
         
@@ -127,6 +392,37 @@ class Geotagger:
         tuple
             Tuple containing the bounding box coordinates (north, south, west, east) and the image.   
     
+    open_output()
+        Opens the output raster for writing with the driver and creation options of the selected profile.
+
+        Parameters
+        ----------
+        savepath : str
+            The path of the file to write.
+        width : int
+            Width of the image in pixels.
+        height : int
+            Height of the image in pixels.
+        transform : affine.Affine
+            Affine transform of the image.
+
+        Returns
+        -------
+        rasterio.io.DatasetWriter
+            The opened dataset, as a context manager.
+
+    write_sidecar()
+        Georeferences the image in place by writing a world file (.pgw/.jgw) and a .aux.xml with the CRS next to it. Only the image header is read.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        str
+            The path of the world file.
+
     geotag()
         Geotags the image and saves it in TIFF format.
         
@@ -135,10 +431,75 @@ class Geotagger:
 
         Returns
         -------
+        str
+            The path of the file written (the world file in sidecar mode).
+
+    output_path()
+        Returns the path of the georeferenced image: a TIFF in the save folder, or the GeoPackage of the folder for the 'gpkg' profile.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        str
+            The path of the output.
+
+    write()
+        Writes a decoded image (see decode()) as a georeferenced TIFF in the save folder, or into the tiles of the GeoPackage of the folder for the 'gpkg' profile.
+
+        Parameters
+        ----------
+        img : numpy.ndarray
+            Array of shape (3, height, width).
+
+        Returns
+        -------
+        str
+            The path of the file written.
+
+    genVRT()
+        Generates a virtual merged (VRT) file of the georeferenced images. It is only rebuilt when its list of tiles changes.
+
+        Parameters
+        ----------
+        input_path : str/path
+            Folder of the georeferenced images. Only used if files is 'None'.
+        output_path : str/path
+            Path of the VRT file.
+        extensions : tuple
+            Extensions of the files collected from input_path.
+        files : list
+            Paths of the georeferenced images. If set to 'None', input_path is listed.
+
+        Returns
+        -------
+        bool
+            True if the VRT was (re)built, False if it was up to date.
+
+    genOverviews()
+        Builds the overviews (pyramid levels) of a VRT or mosaic with GDAL threads. A VRT gets an external '.ovr' file, a GeoTIFF internal overviews.
+
+        Parameters
+        ----------
+        path : str/path
+            Path of the VRT or GeoTIFF.
+        levels : list
+            Decimation factors of the overviews. If set to 'None', factors 2, 4, 8, ... are used until the overview fits in 256 pixels.
+        resampling : str
+            Resampling method, e.g. 'nearest' or 'average'.
+        workers : int
+            Number of threads. If set to 'None', all the CPUs are used.
+
+        Returns
+        -------
+        list
+            Decimation factors of the overviews built.
 
     """
 
-    def __init__(self, filepath, center_coord, savepath, pixXRES, pixYRES):
+    def __init__(self, filepath, center_coord, savepath, pixXRES, pixYRES, bounds=None, block_size=None, profile='gtiff', sidecar=False, timer=None):
         """
         Initializes the Geotagger object.
 
@@ -154,6 +515,16 @@ class Geotagger:
             Pixel resolution in the X direction.
         pixYRES : float
             Pixel resolution in the Y direction.
+        bounds : tuple
+            Precomputed bounding box (north, south, west, east), e.g. from batch_corners(). If set to 'None', it is computed in getcoord().
+        block_size : int
+            Number of rows read and written at a time. If set to 'None', the whole image is decoded.
+        profile : str
+            Output profile, one of the keys of PROFILES.
+        sidecar : bool
+            If True, geotag() only writes a world file and a .aux.xml next to the image.
+        timer : stageTimer.StageTimer
+            Timer recording the duration of the stages. If set to 'None', nothing is recorded.
         Returns
         -------
         """
@@ -162,6 +533,13 @@ class Geotagger:
         self.savepath = savepath
         self.pixXRES = pixXRES
         self.pixYRES = pixYRES
+        self.bounds = bounds
+        self.block_size = block_size
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown output profile '{profile}', expected one of {list(PROFILES)}")
+        self.profile = profile
+        self.sidecar = sidecar
+        self.timer = timer if timer is not None else NULL_TIMER
 
     @staticmethod
     def lat_long(lat, lon, dn, de):
@@ -251,6 +629,173 @@ class Geotagger:
         """
         return float(os.path.splitext(filename)[0].split("_")[1][2:]), float(os.path.splitext(filename)[0].split("_")[2][2:])
 
+    @staticmethod
+    def image_size(filepath):
+        """
+        Reads the width and height of an image from its header, without decoding the pixels.
+
+        Parameters
+        ----------
+        filepath : str
+            The path to the image file.
+
+        Returns
+        -------
+        size : tuple
+            Tuple containing width and height in pixels.
+        """
+        with open(filepath, 'rb') as file:
+            header = file.read(24)
+        if header[:8] == PNG_SIGNATURE:
+            # The IHDR chunk always comes first and starts with the width and height
+            return struct.unpack('>II', header[16:24])
+
+        with rasterio.open(filepath) as src:
+            return src.width, src.height
+
+    @staticmethod
+    def batch_corners(lat, lon, width, height, pixXRES, pixYRES):
+        """
+        Vectorized version of output_corners() for a whole set of images. It gives the same bounding boxes as getcoord(), without decoding any image.
+
+        Parameters
+        ----------
+        lat : numpy.ndarray
+            Latitudes of the image centers.
+        lon : numpy.ndarray
+            Longitudes of the image centers.
+        width : numpy.ndarray
+            Widths of the images in pixels.
+        height : numpy.ndarray
+            Heights of the images in pixels.
+        pixXRES : float
+            Pixel resolution in the X direction.
+        pixYRES : float
+            Pixel resolution in the Y direction.
+
+        Returns
+        -------
+        bounds : numpy.ndarray
+            Array of shape (N, 4) containing the bounding boxes (north, south, west, east).
+        transforms : numpy.ndarray
+            Array of shape (N, 6) containing the affine transforms (a, b, c, d, e, f), as given by rasterio.transform.from_bounds.
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        width = np.asarray(width, dtype=np.float64)
+        height = np.asarray(height, dtype=np.float64)
+
+        # Earth’s radius, sphere
+        R = 6378137
+
+        # Same offsets as getcoord(): north from the image height, east from the image width
+        dn = height * pixYRES / 2
+        de = width * pixXRES / 2
+
+        # Coordinate offsets in decimal degrees
+        dLat = dn / R * 180 / np.pi
+        dLon = de / (R * np.cos(np.pi * lat / 180)) * 180 / np.pi
+
+        bounds = np.stack([lat + dLat, lat - dLat, lon - dLon, lon + dLon], axis=1)
+
+        n, s, w, e = bounds.T
+        transforms = np.zeros((len(bounds), 6), dtype=np.float64)
+        transforms[:, 0] = (e - w) / width
+        transforms[:, 2] = w
+        transforms[:, 4] = (s - n) / height
+        transforms[:, 5] = n
+
+        return bounds, transforms
+
+    @staticmethod
+    def read_rgb(src, window):
+        """
+        Reads a window of an opened image as a band-interleaved RGB uint8 array, with the same pixel values as the OpenCV decode in getcoord().
+
+        Parameters
+        ----------
+        src : rasterio.DatasetReader
+            The opened image.
+        window : rasterio.windows.Window
+            The window to read.
+
+        Returns
+        -------
+        rgb : numpy.ndarray
+            Array of shape (3, rows, columns).
+        """
+        if src.colorinterp[0] == ColorInterp.palette:
+            # Expand the palette, as OpenCV does
+            lut = np.zeros((256, 3), dtype=np.uint8)
+            for index, color in src.colormap(1).items():
+                lut[index] = color[:3]
+            return np.moveaxis(lut[src.read(1, window=window)], -1, 0)
+
+        # Alpha is dropped and grayscale is repeated over the three bands, as OpenCV does
+        indexes = [1, 2, 3] if src.count >= 3 else [1, 1, 1]
+        data = src.read(indexes, window=window)
+        if data.dtype == np.uint16:
+            data = data >> 8
+        return data.astype(np.uint8, copy=False)
+
+    def get_bounds(self, width, height):
+        """
+        Returns the bounding box of the image, from the precomputed bounds if given.
+
+        Parameters
+        ----------
+        width : int
+            Width of the image in pixels.
+        height : int
+            Height of the image in pixels.
+
+        Returns
+        -------
+        bounds : tuple
+            Tuple containing the bounding box coordinates (north, south, west, east).
+        """
+        with self.timer.stage('corners'):
+            if self.bounds is not None:
+                return tuple(self.bounds)
+            bounds, _ = Geotagger.batch_corners(
+                [self.center_coord[0]], [self.center_coord[1]], [width], [height], self.pixXRES, self.pixYRES
+            )
+            return tuple(bounds[0])
+
+    def decode(self, data=None, reuse=True):
+        """
+        Decodes the image straight into a band-interleaved RGB uint8 array, in the layout rasterio writes. This avoids the cvtColor, moveaxis and astype copies of getcoord().
+
+        Parameters
+        ----------
+        data : bytes, optional
+            Content of the image file, if already read (e.g. prefetched). If set to 'None', the image is read from filepath (default: None).
+        reuse : bool, optional
+            If True, the array is backed by the buffer of the calling thread, reused by its next decode. Set it to False when the array is handed over to another thread (default: True).
+
+        Returns
+        -------
+        img : numpy.ndarray
+            Array of shape (3, height, width).
+        """
+        nbytes = 0
+        if self.timer.enabled:
+            nbytes = len(data) if data is not None else os.path.getsize(self.filepath)
+
+        with self.timer.stage('decode', nbytes=nbytes), ExitStack() as stack:
+            if data is None:
+                src = stack.enter_context(rasterio.open(self.filepath))
+            else:
+                src = stack.enter_context(stack.enter_context(rasterio.MemoryFile(data)).open())
+
+            if src.count < 3 or src.dtypes[0] != 'uint8' or src.colorinterp[0] == ColorInterp.palette:
+                # Gray, palette and 16 bit images are converted to RGB uint8 while they are read
+                return Geotagger.read_rgb(src, None)
+            shape = (3, src.height, src.width)
+            img = _get_buffer(shape) if reuse else np.empty(shape, dtype=np.uint8)
+            src.read([1, 2, 3], out=img)
+        return img
+
     def getcoord(self):
         """
         Computes the geotagged image's bounding box and corner coordinates.
@@ -260,17 +805,25 @@ class Geotagger:
         coordinates : tuple
             Tuple containing the bounding box coordinates (north, south, west, east) and the image.
         """
-        img = cv2.cvtColor(cv2.imread(self.filepath), cv2.COLOR_RGB2BGR)
-
-        coords = Geotagger.output_corners(
-            self.center_coord[0], self.center_coord[1], img.shape[0], img.shape[1],
-            img.shape[0] * self.pixYRES / 2, img.shape[1] * self.pixXRES / 2
-        )
-
-        n = np.max(coords[:, 0])
-        s = np.min(coords[:, 0])
-        w = np.min(coords[:, 1])
-        e = np.max(coords[:, 1])
+        with self.timer.stage('decode', nbytes=os.path.getsize(self.filepath) if self.timer.enabled else 0):
+            img = cv2.imread(self.filepath)
+        with self.timer.stage('color', nbytes=img.nbytes if self.timer.enabled else 0):
+            img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+
+        if self.bounds is not None:
+            n, s, w, e = self.bounds
+            return n, s, w, e, img
+
+        with self.timer.stage('corners'):
+            coords = Geotagger.output_corners(
+                self.center_coord[0], self.center_coord[1], img.shape[0], img.shape[1],
+                img.shape[0] * self.pixYRES / 2, img.shape[1] * self.pixXRES / 2
+            )
+
+            n = np.max(coords[:, 0])
+            s = np.min(coords[:, 0])
+            w = np.min(coords[:, 1])
+            e = np.max(coords[:, 1])
 
         return n, s, w, e, img
 
@@ -283,31 +836,253 @@ class Geotagger:
     #     """
     #     return self.getcoord()
 
+    def open_output(self, savepath, width, height, transform):
+        """
+        Opens the output raster for writing with the driver and creation options of the selected profile. See the module level open_output().
+
+        Parameters
+        ----------
+        savepath : str
+            The path of the file to write.
+        width : int
+            Width of the image in pixels.
+        height : int
+            Height of the image in pixels.
+        transform : affine.Affine
+            Affine transform of the image.
+
+        Returns
+        -------
+        dst : rasterio.io.DatasetWriter
+            The opened dataset, as a context manager.
+        """
+        return open_output(savepath, width, height, transform, profile=self.profile)
+
+    def write_sidecar(self):
+        """
+        Georeferences the image in place by writing a world file (.pgw/.jgw) and a .aux.xml with the CRS next to it. Only the image header is read, the pixels are not rewritten.
+
+        Returns
+        -------
+        worldpath : str
+            The path of the world file.
+        """
+        width, height = Geotagger.image_size(self.filepath)
+        n, s, w, e = self.get_bounds(width, height)
+        tsfm = rasterio.transform.from_bounds(w, s, e, n, width, height)
+
+        root, ext = os.path.splitext(self.filepath)
+        worldpath = root + '.' + ext[1] + ext[-1] + 'w'
+
+        with self.timer.stage('write'):
+            # The world file refers to the center of the top left pixel
+            lines = [tsfm.a, tsfm.d, tsfm.b, tsfm.e, tsfm.c + tsfm.a / 2, tsfm.f + tsfm.e / 2]
+            # Written under a '.part' name and renamed, as for the GeoTIFF outputs
+            with open(worldpath + '.part', 'w') as file:
+                file.write('\n'.join(repr(float(value)) for value in lines) + '\n')
+
+            with open(self.filepath + '.aux.xml.part', 'w') as file:
+                file.write('<PAMDataset>\n')
+                file.write(f'  <SRS dataAxisToSRSAxisMapping="2,1">{rasterio.crs.CRS.from_epsg(4326).to_wkt()}</SRS>\n')
+                file.write('</PAMDataset>\n')
+
+            os.replace(self.filepath + '.aux.xml.part', self.filepath + '.aux.xml')
+            os.replace(worldpath + '.part', worldpath)
+
+        return worldpath
+
     def geotag(self):
         """
         Geotags the image and saves it in TIFF format.
+
+        Returns
+        -------
+        savepath : str
+            The path of the file written (the world file in sidecar mode).
+        """
+        if self.sidecar:
+            return self.write_sidecar()
+
+        # The captures of a GeoPackage are small and pasted tile by tile, so they are not streamed
+        if self.block_size is not None and self.profile != 'gpkg':
+            savepath = self.output_path()
+            self.geotag_windowed(savepath)
+            return savepath
+
+        return self.write(self.decode())
+
+    def output_path(self):
+        """
+        Returns the path of the georeferenced image: a TIFF in the save folder, or the GeoPackage of the folder (GPKG_CONTAINER) for the 'gpkg' profile.
+
+        Returns
+        -------
+        savepath : str
+            The path of the output.
+        """
+        if self.profile == 'gpkg':
+            return os.path.join(self.savepath, GPKG_CONTAINER)
+        name = os.path.splitext(os.path.split(self.filepath)[1])[0]
+        return os.path.join(self.savepath, name + ".tif")
+
+    def write(self, img):
+        """
+        Writes a decoded image (see decode()) as a georeferenced TIFF in the save folder, or into the tiles of the GeoPackage of the folder for the 'gpkg' profile.
+
+        Parameters
+        ----------
+        img : numpy.ndarray
+            Array of shape (3, height, width).
+
+        Returns
+        -------
+        savepath : str
+            The path of the file written.
         """
-        n, s, w, e, img = self.getcoord()
+        savepath = self.output_path()
+        n, s, w, e = self.get_bounds(img.shape[2], img.shape[1])
 
         with rasterio.Env():
-            tsfm = rasterio.transform.from_bounds(w, s, e, n, img.shape[1], img.shape[0])
-            img = np.moveaxis(img, -1, 0)
-
-            savepath = os.path.join(self.savepath, os.path.splitext(os.path.split(self.filepath)[1])[0] + ".tif")
-
-            with rasterio.open(savepath, 'w', dtype=rasterio.uint8,
-                               transform=tsfm,
-                               crs=rasterio.crs.CRS.from_epsg(4326),
-                               driver='GTiff',
-                               width=img.shape[2],
-                               height=img.shape[1],
-                               count=img.shape[0]) as dst:
-                dst.write(img.astype(rasterio.uint8))
+            tsfm = rasterio.transform.from_bounds(w, s, e, n, img.shape[2], img.shape[1])
+
+            if self.profile == 'gpkg':
+                with self.timer.stage('write', nbytes=img.nbytes):
+                    gpkg_writer(savepath).write(img, tsfm)
+                return savepath
+
+            with self.timer.stage('write', nbytes=img.nbytes), self.open_output(savepath, img.shape[2], img.shape[1], tsfm) as dst:
+                dst.write(img)
+
+        return savepath
+
+    def geotag_windowed(self, savepath):
+        """
+        Geotags the image strip by strip, reading and writing block_size rows at a time.
+
+        Parameters
+        ----------
+        savepath : str
+            The path of the TIFF file to write.
+        """
+        # A small block cache keeps the memory of parallel workers bounded as well
+        with rasterio.Env(GDAL_CACHEMAX=64):
+            with rasterio.open(self.filepath) as src:
+                n, s, w, e = self.get_bounds(src.width, src.height)
+                tsfm = rasterio.transform.from_bounds(w, s, e, n, src.width, src.height)
+
+                # Reading and writing are interleaved, so they are recorded as one stage
+                with self.timer.stage('windowed', nbytes=3 * src.width * src.height), \
+                        self.open_output(savepath, src.width, src.height, tsfm) as dst:
+                    # Whole rows of tiles are written at once, so compressed tiles are never encoded twice
+                    tile_height = dst.block_shapes[0][0]
+                    rows = -(-self.block_size // tile_height) * tile_height
+                    for row in range(0, src.height, rows):
+                        window = Window(0, row, src.width, min(rows, src.height - row))
+                        dst.write(Geotagger.read_rgb(src, window), window=window)
     
-    def genVRT(self,input_path, output_path):
+    @staticmethod
+    def genVRT(input_path, output_path, extensions=('.tif',), files=None):
+        """
+        Generates a virtual merged (VRT) file of the georeferenced images.
+
+        The list of tiles is recorded next to the VRT ('<output_path>.tiles'), and the VRT is only rebuilt when the list changes.
+        It is built under a temporary name and renamed, so the VRT can be opened at any time during a run.
+        A rebuild opens every tile again, so rebuilding every k images of a run of N images opens about N²/(2k) files: keep k large on a NAS.
+        If there is no tile (e.g. all the images failed), no VRT is written and a previous VRT and its tile list are removed.
+
+        Parameters
+        ----------
+        input_path : str/path
+            Folder of the georeferenced images. Only used if files is 'None'.
+        output_path : str/path
+            Path of the VRT file.
+        extensions : tuple
+            Extensions of the files collected from input_path.
+        files : list
+            Paths of the georeferenced images. If set to 'None', input_path is listed.
+
+        Returns
+        -------
+        rebuilt : bool
+            True if the VRT was (re)built, False if it was up to date or there is no tile.
+        """
+        if files is None:
+            files = [os.path.join(input_path, f) for f in os.listdir(input_path) if f.lower().endswith(extensions)]
+        files = sorted(files)
+
+        tiles_path = output_path + '.tiles'
+        if not files:
+            # gdal.BuildVRT writes nothing without sources; a stale VRT would list removed tiles
+            for path in (output_path, tiles_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            return False
+        if os.path.exists(output_path) and os.path.exists(tiles_path):
+            with open(tiles_path) as file:
+                if json.load(file) == files:
+                    return False
+
         print(f'Generating VRT file {output_path}')
-        tif_files = [os.path.join(input_path, f) for f in os.listdir(input_path) if f.endswith('.tif')]
-        gdal.BuildVRT(output_path, tif_files)
+        tmppath = os.path.join(os.path.dirname(output_path), '.' + os.path.basename(output_path))
+        vrt = gdal.BuildVRT(tmppath, files)
+        vrt = None  # closing the dataset writes the file
+        os.replace(tmppath, output_path)
+
+        with open(tiles_path + '.part', 'w') as file:
+            json.dump(files, file)
+        os.replace(tiles_path + '.part', tiles_path)
+        return True
+
+    @staticmethod
+    def genOverviews(path, levels=None, resampling='average', workers=None):
+        """
+        Builds the overviews (pyramid levels) of a VRT or mosaic, so zoomed-out views read the overviews instead of every full resolution tile.
+
+        A VRT gets an external, DEFLATE compressed '.ovr' file; a GeoTIFF gets internal overviews. The overviews are computed by GDAL using workers threads.
+        For a VRT, nothing is done if the '.ovr' file is newer than the VRT; an older '.ovr' file is deleted first, as GDAL would otherwise update it in place with the size and extent of the previous VRT.
+
+        Parameters
+        ----------
+        path : str/path
+            Path of the VRT or GeoTIFF.
+        levels : list
+            Decimation factors of the overviews. If set to 'None', factors 2, 4, 8, ... are used until the overview fits in 256 pixels.
+        resampling : str
+            Resampling method: 'nearest', 'average', 'bilinear', 'cubic', 'lanczos' or 'mode'.
+        workers : int
+            Number of threads. If set to 'None', all the CPUs are used.
+
+        Returns
+        -------
+        levels : list
+            Decimation factors of the overviews built (empty if they were up to date).
+        """
+        is_vrt = path.lower().endswith('.vrt')
+        if is_vrt and os.path.exists(path + '.ovr'):
+            if os.path.getmtime(path + '.ovr') >= os.path.getmtime(path):
+                return []
+            # genVRT rewrote the VRT, e.g. with new images that change its extent
+            os.remove(path + '.ovr')
+
+        gdal.SetConfigOption('GDAL_NUM_THREADS', str(workers) if workers else 'ALL_CPUS')
+        gdal.SetConfigOption('COMPRESS_OVERVIEW', 'DEFLATE')
+        try:
+            # Opened read-only, a VRT gets an external .ovr file; a GeoTIFF opened in update mode gets internal overviews
+            ds = gdal.Open(path, gdal.GA_ReadOnly if is_vrt else gdal.GA_Update)
+            if levels is None:
+                levels = []
+                factor = 2
+                while max(ds.RasterXSize, ds.RasterYSize) / factor >= 256:
+                    levels.append(factor)
+                    factor *= 2
+                levels = levels or [2]
+            print(f'Building overviews {levels} of {path}')
+            ds.BuildOverviews(resampling.upper(), levels)
+            ds = None  # closing the dataset writes the overviews
+        finally:
+            gdal.SetConfigOption('GDAL_NUM_THREADS', None)
+            gdal.SetConfigOption('COMPRESS_OVERVIEW', None)
+        return levels
 
     
 
@@ -316,47 +1091,911 @@ class Geotagger:
             return self.__version__
         raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{attrib}'")
 
-def main(imagePath, vrt=False, saveFolder=None, start=None, stop=None):
+def shard_of(image, shard_count):
     """
-    
+    Returns the shard of an image. It only depends on the filename, so all the nodes agree on the partition whatever the order they list the folder in.
+
+    Parameters
+    ----------
+    image : str
+        Filename of the image.
+    shard_count : int
+        Number of shards.
+
+    Returns
+    -------
+    shard : int
+        Index of the shard, between 0 and shard_count - 1.
     """
-    if saveFolder is None:
-        saveFolder = os.path.basename(imagePath) + '_GEOTAGGED'
+    return zlib.crc32(image.encode()) % shard_count
 
-    parent_folder_path = os.path.abspath(os.path.join(imagePath, os.pardir))
-    save_path = os.path.join(parent_folder_path, saveFolder)
 
-    if not os.path.exists(save_path):
-        os.mkdir(save_path)
+def _make_geotagger(task):
+    """
+    Builds the Geotagger of a task. If timing is enabled, it gets its own StageTimer, whose records are returned with the result.
 
-    image_list = os.listdir(os.path.join(imagePath))
-    image_list.sort()
+    Parameters
+    ----------
+    task : tuple
+        Tuple containing the image filename, the image folder, the save folder, the precomputed bounding box (or None), the keyword arguments passed to Geotagger, the LeaseManager (or None) and the timing flag.
 
-    if start is None:
-        start = 0
-    if stop is None:
-        stop = len(image_list)
+    Returns
+    -------
+    geotagger : Geotagger
+        The Geotagger of the image.
+    """
+    image, imagePath, save_path, bounds, options, _, timing = task
+    return Geotagger(
+        filepath=os.path.join(imagePath, image),
+        center_coord=Geotagger.name2latlong(image),
+        savepath=save_path,
+        pixYRES=PIX_RES,  # parameter controlling height
+        pixXRES=PIX_RES,  # parameter controlling width
+        bounds=bounds,
+        timer=StageTimer(image) if timing else None,
+        **options
+    )
+
+
+def _lease_stamp(task):
+    """
+    Returns the stamp of the lease of a task: the options recorded by the manifest and the size and modification time of the input image,
+    so a lease done with other options or for another version of the image is claimed again (see leaseHandler.LeaseManager).
+    """
+    image, imagePath, _, _, options = task[:5]
+    stat = os.stat(os.path.join(imagePath, image))
+    return json.dumps({'profile': options['profile'], 'sidecar': options['sidecar'], 'size': stat.st_size, 'mtime': stat.st_mtime_ns}, sort_keys=True)
+
+
+def _georef_image(task):
+    """
+    Georeferences a single image. This is the unit of work used by main, both in the serial loop and in the process pool.
+
+    Parameters
+    ----------
+    task : tuple
+        Tuple containing the image filename, the image folder, the save folder, the precomputed bounding box (or None), the keyword arguments passed to Geotagger, the LeaseManager (or None) and the timing flag.
+
+    Returns
+    -------
+    result : tuple
+        Tuple containing the image filename, the output filename, the error traceback (None if the image was georeferenced) and the timing records (None if timing is disabled).
+        The output and error are both None if the image is held by another node.
+    """
+    image, leases = task[0], task[5]
+    geotagger = None
+    try:
+        # A failed claim (e.g. the NAS dropped out) is the error of this image; releasing an image not claimed does nothing
+        if leases is not None and not leases.claim(image, stamp=_lease_stamp(task)):
+            return image, None, None, None
+        geotagger = _make_geotagger(task)
+        output = geotagger.geotag()
+    except Exception:
+        if leases is not None:
+            leases.release(image, done=False)
+        return image, None, traceback.format_exc(), _records(geotagger)
+    if leases is not None:
+        leases.release(image, done=True)
+    return image, os.path.basename(output), None, _records(geotagger)
+
+
+def _records(geotagger):
+    """
+    Returns the timing records of a Geotagger, or None if timing is disabled (or the Geotagger could not be built).
+    """
+    if geotagger is None or not geotagger.timer.enabled:
+        return None
+    return geotagger.timer.records
+
+
+def plan(imagePath, image_list, pixXRES=PIX_RES, pixYRES=PIX_RES):
+    """
+    Precomputes the bounding boxes of a list of GEBOT images in one vectorized call. Only the filenames and image headers are read.
+
+    Only the bounds are precomputed: the transform is derived from them when the image is written, with the size of the array actually written (the decoded image, or the source dataset in sidecar and windowed modes).
+    rasterio.transform.from_bounds costs about 2 µs per image, so passing the transforms of batch_corners() through the tasks would save nothing measurable.
+
+    Parameters
+    ----------
+    imagePath : str/path
+        Path to the image folder.
+    image_list : list
+        Filenames of the images.
+    pixXRES : float
+        Pixel resolution in the X direction.
+    pixYRES : float
+        Pixel resolution in the Y direction.
+
+    Returns
+    -------
+    bounds : list
+        Bounding box (north, south, west, east) of each image, or None when the filename or the header could not be read.
+    """
+    bounds = [None] * len(image_list)
+    valid, rows = [], []
+    for i, image in enumerate(image_list):
+        try:
+            lat, lon = Geotagger.name2latlong(image)
+            width, height = Geotagger.image_size(os.path.join(imagePath, image))
+        except Exception:
+            # Left to the georeferencing step, which reports the error for this image
+            continue
+        valid.append(i)
+        rows.append((lat, lon, width, height))
+
+    if rows:
+        rows = np.array(rows, dtype=np.float64)
+        # The transforms are recomputed from the bounds by the writer (see above)
+        batch_bounds, _ = Geotagger.batch_corners(rows[:, 0], rows[:, 1], rows[:, 2], rows[:, 3], pixXRES, pixYRES)
+        for i, bbox in zip(valid, batch_bounds.tolist()):
+            bounds[i] = tuple(bbox)
+
+    return bounds
+
+
+class GeorefRun:
+    __version__='1.0'
+    """
+    **GeorefRun**
+
+    A class holding the state of the georeferencing of one acquisition folder: the images to process, the manifest and the errors.
+    It does not run the images itself, so the same run can be driven by main (one folder) or by georef_batch.batchGeoref (several folders sharing one worker pool).
+
+    Parameters
+    ----------
+    imagePath : str/path
+        Path to the image folder.
+    saveFolder : str/path
+        Name of the folder where the georeferenced images should be saved. If set to 'None', '_GEOTAGGED' is appended to the image folder name.
+    start : int
+        Index of the first image to georeference.
+    stop : int
+        Index after the last image to georeference.
+    incremental : bool
+        If True, the images recorded as done in the manifest are skipped.
+    block_size : int
+        Number of rows read and written at a time, or 'None'.
+    profile : str
+        Output profile, one of the keys of PROFILES.
+    sidecar : bool
+        If True, only world files and .aux.xml are written.
+    shard_index : int
+        Index of the shard of this node, for runs shared by several nodes (see shard_of), or 'None'.
+    shard_count : int
+        Number of shards, or 'None'.
+    lease : bool
+        If True, the images are claimed through lease files in the save folder before being georeferenced (see leaseHandler.LeaseManager), so nodes can join or drop out. Combined with a shard, the node starts with its own shard and then helps with the others.
+    lease_ttl : int
+        Time in seconds after which the lease of a node that dropped out can be taken over.
+    node : str
+        Name of this node in lease mode, for its manifest and leases. If set to 'None', the host name, so a node keeps its manifest across runs.
+    timing : str/path
+        Path of a JSON lines file where the duration and bytes of each stage of each image are appended (see stageTimer.StageTimer). A summary is printed by finish(). If set to 'None', nothing is recorded.
+    quality : bool
+        If True, the images are checked for blank or partly loaded captures before being georeferenced (see tileQuality.TileQuality). The bad images are skipped and listed in 'requeue.csv' in the save folder.
+
+    Examples
+    --------
+    >>> run = GeorefRun('path/to/image_folder')
+    >>> for task in run.tasks:
+    ...     run.record(_georef_image(task))
+    >>> run.finish(vrt=True)
+
+    Methods
+    -------
+    __init__()
+        Lists the images of the folder and prepares the tasks of the images to georeference.
+
+        Parameters
+        ----------
+        See the class parameters.
+
+        Returns
+        -------
+
+    add(images)
+        Adds images saved to the image folder after the run was created.
+
+        Parameters
+        ----------
+        images : list
+            Filenames of the new images.
+
+        Returns
+        -------
+        list
+            Tasks of the images that are not georeferenced yet.
+
+    screen(images)
+        Removes the bad captures from a list of images and appends them to the requeue list.
+
+        Parameters
+        ----------
+        images : list
+            Filenames of the images.
+
+        Returns
+        -------
+        list
+            Filenames of the good images.
+
+    georeferenced_files()
+        Lists the georeferenced files from the manifest, without rescanning the save folder.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        list
+            Paths of the georeferenced files (the original images in sidecar mode).
+
+    output_file(image, output)
+        Returns the path of the georeferenced file of an image, as recorded in the manifest.
+
+        Parameters
+        ----------
+        image : str
+            Filename of the input image.
+        output : str
+            Output filename recorded in the manifest.
+
+        Returns
+        -------
+        str
+            Path of the georeferenced file.
+
+    footprint_index()
+        Builds the footprint index of the georeferenced files from the bounds recorded in the manifest.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        footprintIndex.FootprintIndex
+            The index.
+
+    record(result, vrt_every=None)
+        Records the result of a task in the manifest.
+
+        Parameters
+        ----------
+        result : tuple
+            Result of _georef_image.
+        vrt_every : int, optional
+            If set, the VRT is updated every vrt_every recorded results (default: None).
+
+        Returns
+        -------
+
+    save()
+        Saves the manifest, after committing the images written to the GeoPackage of a 'gpkg' run.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+    retry_held(vrt_every=None)
+        Georeferences the images skipped because another node held their lease, once that node is done with them or dropped out.
+
+        Parameters
+        ----------
+        vrt_every : int, optional
+            If set, the VRT is updated every vrt_every recorded results (default: None).
+
+        Returns
+        -------
+
+    finish(vrt=False, mosaic=False, mosaic_rule='first', overviews=False, overview_levels=None, overview_resampling='average', workers=None, xyz=None, store=None)
+        Saves the manifest, reports the errors, writes the footprint index ('<id>_footprints.geojson' next to the VRT) and runs the VRT, mosaic, overview and XYZ tile stages.
+
+        Parameters
+        ----------
+        See main.
+
+        Returns
+        -------
+        dict
+            Dictionary mapping the filenames that failed to their error traceback.
+
+    """
+
+    def __init__(self, imagePath, saveFolder=None, start=None, stop=None, incremental=True, block_size=None, profile='gtiff', sidecar=False,
+                 shard_index=None, shard_count=None, lease=False, lease_ttl=600, node=None, timing=None, quality=False):
+        """
+        Lists the images of the folder and prepares the tasks of the images to georeference.
+
+        Parameters
+        ----------
+        imagePath : str/path
+            Path to the image folder.
+        saveFolder : str/path
+            Name of the folder where the georeferenced images should be saved.
+        start : int
+            Index of the first image to georeference.
+        stop : int
+            Index after the last image to georeference.
+        incremental : bool
+            If True, the images recorded as done in the manifest are skipped.
+        block_size : int
+            Number of rows read and written at a time, or 'None'.
+        profile : str
+            Output profile, one of the keys of PROFILES.
+        sidecar : bool
+            If True, only world files and .aux.xml are written.
+        shard_index : int
+            Index of the shard of this node, or 'None'.
+        shard_count : int
+            Number of shards, or 'None'.
+        lease : bool
+            If True, the images are claimed through lease files before being georeferenced.
+        lease_ttl : int
+            Time in seconds after which the lease of a node that dropped out can be taken over.
+        node : str
+            Name of this node in lease mode, or 'None' for the host name.
+        timing : str/path
+            Path of the JSON lines file of the stage timings, or 'None'.
+        quality : bool
+            If True, the bad captures are skipped and listed in the requeue list of the save folder.
+        """
+        if saveFolder is None:
+            saveFolder = os.path.basename(imagePath) + '_GEOTAGGED'
+
+        parent_folder_path = os.path.abspath(os.path.join(imagePath, os.pardir))
+        save_path = os.path.join(parent_folder_path, saveFolder)
+
+        if not os.path.exists(save_path):
+            os.mkdir(save_path)
+
+        # One scandir gives the names and the stats used by the manifest
+        stats = {}
+        with os.scandir(imagePath) as entries:
+            for entry in entries:
+                if entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file():
+                    stat = entry.stat()
+                    stats[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        image_list = sorted(stats)
+
+        if start is None:
+            start = 0
+        if stop is None:
+            stop = len(image_list)
+
+        image_list = image_list[start:stop]
+        options = {'block_size': block_size, 'profile': profile, 'sidecar': sidecar}
+
+        sharded = shard_count is not None and shard_count > 1
+        if profile == 'gpkg' and (sidecar or sharded or lease):
+            raise ValueError("The 'gpkg' profile has a single writer and cannot be combined with sidecar, shards or leases")
+        if sharded:
+            node = f'shard{shard_index}of{shard_count}'
+        elif lease:
+            # Stable across runs, so the node finds its own manifest again
+            node = node if node is not None else socket.gethostname()
+        else:
+            node = None
+
+        # The block size does not change the output, so it does not invalidate the manifest
+        self.manifest = GeorefManifest(save_path, options={'profile': profile, 'sidecar': sidecar}, node=node)
+
+        if sharded:
+            if lease:
+                # Own shard first, then the images of the nodes that are slower or dropped out
+                image_list = sorted(image_list, key=lambda image: shard_of(image, shard_count) != shard_index)
+            else:
+                image_list = [image for image in image_list if shard_of(image, shard_count) == shard_index]
+
+        if incremental:
+            pending = [image for image in image_list if not self.manifest.is_done(image, *stats[image])]
+            if len(pending) < len(image_list):
+                print(f'{len(image_list) - len(pending)} images already georeferenced, {len(pending)} remaining')
+            image_list = pending
+
+        self.imagePath = imagePath
+        self.requeue_path = os.path.join(save_path, 'requeue.csv')
+        self.quality = None
+        if quality:
+            from tileQuality import TileQuality
+            self.quality = TileQuality()
+            # The pending images are all checked again, so the list is rewritten
+            if os.path.exists(self.requeue_path):
+                os.remove(self.requeue_path)
+            image_list = self.screen(image_list)
+
+        leases = LeaseManager(os.path.join(save_path, '.leases'), node=node, ttl=lease_ttl) if lease else None
+        if leases is not None and not incremental:
+            # The done leases would skip the images to georeference again. A node started later with force clears them again and redoes the images done meanwhile
+            leases.clear_done()
+        self.tasks = [(image, imagePath, save_path, bounds, options, leases, timing is not None) for image, bounds in zip(image_list, plan(imagePath, image_list))]
+        # Recorded in the manifest with the results, for the footprint index
+        self.bounds = {task[0]: task[3] for task in self.tasks}
 
-    length = len(image_list[start:stop])
-    
-    for image in tqdm(image_list[start:stop]):
-        # print("Image: {}, remaining image: {}".format(image, length))
-        geotagger = Geotagger(
-            filepath=os.path.join(imagePath, image),
-            center_coord=Geotagger.name2latlong(image),
-            savepath=os.path.join(save_path),
-            pixYRES=0.17475,  # parameter controlling height
-            pixXRES=0.17475  # parameter controlling width
-        )
-        geotagger.geotag()
-        length -= 1
-    
-    #generate virtual meged vrt file
-    if vrt:
         folder_split = save_path.split('/')
         id1 = folder_split[-2]
         id2 = folder_split[-1].split('_')[0]
-        geotagger.genVRT(input_path=save_path, output_path=os.path.abspath(os.path.join(save_path, os.pardir,f'{id1}_{id2}_output.vrt')))
+
+        self.save_path = save_path
+        self.stats = stats
+        self.profile = profile
+        self.sidecar = sidecar
+        self.vrt_path = os.path.abspath(os.path.join(save_path, os.pardir,f'{id1}_{id2}_output.vrt'))
+        self.footprints_path = os.path.abspath(os.path.join(save_path, os.pardir, f'{id1}_{id2}_footprints.geojson'))
+        self.mosaic_path = os.path.abspath(os.path.join(save_path, os.pardir, f'{id1}_{id2}_mosaic.tif'))
+        self.errors = {}
+        self.held = []
+        self.count = 0
+        self.options = options
+        self.leases = leases
+        self.timing = timing
+        self.timer = StageTimer() if timing is not None else NULL_TIMER
+
+    def add(self, images):
+        """
+        Adds images saved to the image folder after the run was created (see watch()).
+
+        Parameters
+        ----------
+        images : list
+            Filenames of the new images.
+
+        Returns
+        -------
+        tasks : list
+            Tasks of the images that are not georeferenced yet, also appended to the tasks of the run.
+        """
+        pending = []
+        for image in images:
+            stat = os.stat(os.path.join(self.imagePath, image))
+            self.stats[image] = (stat.st_size, stat.st_mtime_ns)
+            if not self.manifest.is_done(image, *self.stats[image]):
+                pending.append(image)
+        pending = self.screen(pending)
+
+        tasks = [(image, self.imagePath, self.save_path, bounds, self.options, self.leases, self.timing is not None)
+                 for image, bounds in zip(pending, plan(self.imagePath, pending))]
+        self.tasks.extend(tasks)
+        self.bounds.update((task[0], task[3]) for task in tasks)
+        return tasks
+
+    def screen(self, images):
+        """
+        Removes the bad captures from a list of images and appends them to the requeue list (see tileQuality.TileQuality.check_folder). Does nothing if quality is disabled.
+
+        Parameters
+        ----------
+        images : list
+            Filenames of the images.
+
+        Returns
+        -------
+        images : list
+            Filenames of the good images.
+        """
+        if self.quality is None or not images:
+            return images
+        bad = {result['file'] for result in self.quality.check_folder(self.imagePath, images=images, requeue_path=self.requeue_path)}
+        if bad:
+            print(f'{len(bad)} bad images skipped, listed in {self.requeue_path}')
+        return [image for image in images if image not in bad]
+
+    def georeferenced_files(self):
+        """
+        Lists the georeferenced files from the manifest, without rescanning the save folder.
+
+        Returns
+        -------
+        files : list
+            Paths of the georeferenced files (the original images in sidecar mode, the GeoPackage once for the 'gpkg' profile).
+        """
+        # All the images of a 'gpkg' run are in the same file
+        return list(dict.fromkeys(self.output_file(image, output) for image, output in self.manifest.done()))
+
+    def output_file(self, image, output):
+        """
+        Returns the path of the georeferenced file of an image, as recorded in the manifest (the original image in sidecar mode).
+
+        Parameters
+        ----------
+        image : str
+            Filename of the input image.
+        output : str
+            Output filename recorded in the manifest.
+
+        Returns
+        -------
+        path : str
+            Path of the georeferenced file.
+        """
+        if self.sidecar:
+            return os.path.join(self.imagePath, image)
+        return os.path.join(self.save_path, output)
+
+    def footprint_index(self):
+        """
+        Builds the footprint index of the georeferenced files from the bounds recorded in the manifest (see footprintIndex.FootprintIndex).
+        The bounds missing from the manifests of older runs are computed again from the filenames and image headers.
+
+        Returns
+        -------
+        index : footprintIndex.FootprintIndex
+            The index, with the paths of the georeferenced files as names.
+        """
+        from footprintIndex import FootprintIndex
+
+        done = self.manifest.done()
+        footprints = self.manifest.footprints()
+        missing = [image for image, _ in done if footprints.get(image) is None]
+        footprints.update(zip(missing, plan(self.imagePath, missing)))
+
+        done = [(image, output) for image, output in done if footprints.get(image) is not None]
+        # (north, south, west, east) to (west, south, east, north)
+        bounds = [[footprints[image][i] for i in (2, 1, 3, 0)] for image, _ in done]
+        return FootprintIndex([self.output_file(image, output) for image, output in done], bounds, images=[image for image, _ in done])
+
+    def record(self, result, vrt_every=None):
+        """
+        Records the result of a task in the manifest.
+
+        Parameters
+        ----------
+        result : tuple
+            Tuple containing the image filename, the output filename, the error traceback and the timing records, as returned by _georef_image.
+        vrt_every : int, optional
+            If set, the VRT is updated every vrt_every recorded results (default: None).
+        """
+        image, output, error, records = result
+        if records:
+            self.timer.add(records)
+        if output is None and error is None:
+            # Held by another node, retried by retry_held()
+            self.held.append(image)
+            return
+        self.manifest.update(image, *self.stats[image], output=output, error=error, bounds=self.bounds.get(image))
+        if error is not None:
+            self.errors[image] = error
+
+        self.count += 1
+        # Checkpoint the manifest, so a crash loses at most the last images
+        if self.count % 100 == 0:
+            self.save()
+        if vrt_every and self.count % vrt_every == 0:
+            if self.profile == 'gpkg':
+                close_gpkg(os.path.join(self.save_path, GPKG_CONTAINER), commit_only=True)
+            with self.timer.stage('vrt'):
+                Geotagger.genVRT(input_path=self.save_path, output_path=self.vrt_path, files=self.georeferenced_files())
+
+    def save(self):
+        """
+        Saves the manifest. For the 'gpkg' profile, the images written to the GeoPackage are committed first, so the manifest never lists images a crash would lose.
+        """
+        if self.profile == 'gpkg':
+            close_gpkg(os.path.join(self.save_path, GPKG_CONTAINER), commit_only=True)
+        self.manifest.save()
+
+    def retry_held(self, vrt_every=None):
+        """
+        Georeferences the images skipped because another node held their lease. The leases are checked every lease_ttl/4 seconds (30 at most):
+        the images done by the other node are dropped, and the ones released or abandoned are claimed and georeferenced here, so the work of a node that drops out is not left undone.
+
+        Parameters
+        ----------
+        vrt_every : int, optional
+            If set, the VRT is updated every vrt_every recorded results (default: None).
+        """
+        tasks = {task[0]: task for task in self.tasks}
+        while self.leases is not None and self.held:
+            held, self.held = self.held, []
+            held = [image for image in held if self.leases.status(image, stamp=_lease_stamp(tasks[image])) != 'done']
+            if not held:
+                return
+            waiting = all(self.leases.status(image, stamp=_lease_stamp(tasks[image])) == 'held' for image in held)
+            if waiting:
+                time.sleep(min(30, self.leases.ttl / 4))
+            for image in held:
+                self.record(_georef_image(tasks[image]), vrt_every=vrt_every)
+
+    def finish(self, vrt=False, mosaic=False, mosaic_rule='first', overviews=False, overview_levels=None, overview_resampling='average', workers=None, xyz=None, store=None):
+        """
+        Saves the manifest, reports the errors, writes the footprint index ('<id>_footprints.geojson' next to the VRT) and runs the VRT, mosaic, overview and XYZ tile stages.
+
+        Parameters
+        ----------
+        vrt : bool
+            Flag to generate virtual merged file.
+        mosaic : bool
+            Flag to merge the georeferenced images into a single GeoTIFF.
+        mosaic_rule : str
+            How overlapping images are merged in the mosaic: 'first', 'last' or 'mean'.
+        overviews : bool
+            Flag to build the overviews of the VRT and of the mosaic.
+        overview_levels : list
+            Decimation factors of the overviews, or 'None'.
+        overview_resampling : str
+            Resampling method of the overviews.
+        workers : int
+            Number of threads used by the mosaic and overview stages, and of processes used by the XYZ tile stage.
+        xyz : str/path
+            Folder of the Web Mercator XYZ tile pyramid to update (see tileExporter.XYZExporter), or 'None'.
+        store : str/path
+            Folder of the memory-mapped tile store to update (see tileStore.TileStore), or 'None'.
+
+        Returns
+        -------
+        errors : dict
+            Dictionary mapping the filenames that failed to their error traceback.
+        """
+        self.save()
+        if self.profile == 'gpkg':
+            close_gpkg(os.path.join(self.save_path, GPKG_CONTAINER))
+
+        for image, error in self.errors.items():
+            print(f'Failed to georeference {image}\n{error}')
+        if self.errors:
+            print(f'{len(self.errors)} of {len(self.tasks)} images failed')
+
+        #write the footprints of the georeferenced files, to find the tiles covering an area
+        with self.timer.stage('footprints'):
+            self.footprint_index().write(self.footprints_path)
+
+        #generate virtual meged vrt file
+        if vrt:
+            with self.timer.stage('vrt'):
+                Geotagger.genVRT(input_path=self.save_path, output_path=self.vrt_path, files=self.georeferenced_files())
+            if overviews and os.path.exists(self.vrt_path):
+                with self.timer.stage('overviews'):
+                    Geotagger.genOverviews(self.vrt_path, levels=overview_levels, resampling=overview_resampling, workers=workers)
+
+        #merge the georeferenced images into a single file
+        if mosaic and self.georeferenced_files():
+            from mosaicBuilder import MosaicBuilder
+            with self.timer.stage('mosaic'):
+                MosaicBuilder(self.georeferenced_files(), self.mosaic_path, rule=mosaic_rule,
+                              profile='cog' if self.profile == 'cog' else 'deflate', workers=workers or 4).build()
+            if overviews and self.profile != 'cog':
+                with self.timer.stage('overviews'):
+                    Geotagger.genOverviews(self.mosaic_path, levels=overview_levels, resampling=overview_resampling, workers=workers)
+
+        #cut the web map tiles of the images added or changed since the last export
+        if xyz is not None:
+            from tileExporter import XYZExporter
+            with self.timer.stage('xyz'):
+                XYZExporter(self.georeferenced_files(), xyz, workers=workers).export()
+
+        #copy the pixels of the images added or changed since the last export to the tile store of the training jobs
+        if store is not None:
+            from tileStore import TileStore
+            with self.timer.stage('store'):
+                tile_store = TileStore(store)
+                tile_store.append(self.imagePath, [image for image, _ in self.manifest.done()], workers=workers or 4)
+            for image, error in tile_store.errors.items():
+                print(f'Failed to add {image} to the tile store: {error}')
+
+        if self.timing is not None:
+            self.timer.write(self.timing)
+            self.timer.summary()
+            self.timer.records = []
+
+        return self.errors
+
+
+    def __getattr__(self, attrib):
+        if attrib=="__version__":
+            return self.__version__
+        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{attrib}'")
+
+
+def main(imagePath, vrt=False, saveFolder=None, start=None, stop=None, workers=None, chunksize=None, block_size=None, profile='gtiff', sidecar=False, incremental=True, mosaic=False, mosaic_rule='first', vrt_every=None, overviews=False, overview_levels=None, overview_resampling='average', prefetch=None,
+         shard_index=None, shard_count=None, lease=False, lease_ttl=600, node=None, merge=False, timing=None, quality=False, xyz=None, store=None):
+    """
+    Georeferences the images of a GEBOT acquisition folder.
+
+    Parameters
+    ----------
+    imagePath : str/path
+        Path to the image folder.
+    vrt : bool
+        Flag to generate virtual merged file once all the images are georeferenced.
+    saveFolder : str/path
+        Name of the folder where the georeferenced images should be saved.
+    start : int
+        Index of the first image to georeference. Superseded by the manifest, kept for compatibility.
+    stop : int
+        Index after the last image to georeference. Superseded by the manifest, kept for compatibility.
+    workers : int
+        Number of worker processes. If set to 'None' or 1, the images are georeferenced one after another in this process.
+    chunksize : int
+        Number of images sent to a worker at a time. If set to 'None', it is derived from the number of images and workers.
+    block_size : int
+        Number of rows read and written at a time. If set, the images are streamed in strips so the memory used per image is bounded. If set to 'None', each image is decoded at once.
+    profile : str
+        Output profile, one of the keys of PROFILES ('gtiff', 'deflate', 'lzw', 'zstd', 'jpeg', 'cog' or 'gpkg').
+        With 'gpkg', all the images are pasted into one tile matrix of a GeoPackage in the save folder (GPKG_CONTAINER) instead of thousands of TIFFs (see tileContainer.GpkgTileWriter).
+        The tiles are committed every 64 images and before each manifest save, and GDAL reads the GeoPackage as a single RGBA raster, so the VRT has one source. The last image written wins where images overlap.
+        The GeoPackage has a single writer, so with several workers the images are decoded by threads and written by the writer thread of the prefetch pipeline.
+    sidecar : bool
+        If True, the images are not rewritten: a world file and a .aux.xml are written next to each of them and the VRT references the original images.
+    incremental : bool
+        If True, the manifest in the save folder is used to skip the images already georeferenced with the same options and not modified since. If False, all the images are georeferenced again.
+    vrt_every : int
+        If set with vrt, the VRT is also updated every vrt_every georeferenced images, so a partial mosaic can be opened during the run.
+        Each update reopens all the tiles georeferenced so far (about N²/(2 vrt_every) opens over a run of N images), so keep it large for folders on a NAS.
+    mosaic : bool
+        Flag to merge the georeferenced images into a single tiled, compressed GeoTIFF (see mosaicBuilder.MosaicBuilder), written next to the VRT.
+    mosaic_rule : str
+        How overlapping images are merged in the mosaic: 'first', 'last' or 'mean'.
+    overviews : bool
+        Flag to build the overviews of the VRT and of the mosaic (a COG mosaic already has them).
+    overview_levels : list
+        Decimation factors of the overviews. If set to 'None', they are derived from the raster size.
+    overview_resampling : str
+        Resampling method of the overviews, e.g. 'nearest' or 'average'.
+    prefetch : int
+        If set, the images go through a threaded read/decode/write pipeline (see georefPipeline.pipeline) instead of worker processes:
+        a reader thread prefetches up to prefetch images, workers threads decode them and a writer thread writes the GeoTIFFs, so the network latency is hidden behind the CPU work.
+        Not available in sidecar or windowed (block_size) mode.
+    shard_index : int
+        Index of the shard of this node, when several nodes georeference the same folder: the node only georeferences the images with shard_of(image, shard_count) == shard_index.
+    shard_count : int
+        Number of shards (nodes).
+    lease : bool
+        If True, the images are claimed through lease files in the save folder, so a node that drops out does not leave its images undone: the others take them over after lease_ttl seconds.
+        The leases are stamped with the profile and the size and modification time of the image, so a run with another profile or a modified image claims it again. With incremental False, the done leases are cleared.
+    lease_ttl : int
+        Time in seconds after which the lease of a node that dropped out can be taken over.
+    node : str
+        Name of this node in lease mode, for its manifest ('georef_manifest/<node>.json') and leases. If set to 'None', the host name.
+        Set it when several processes of the same host share a folder.
+    merge : bool
+        If True, nothing is georeferenced: the VRT (and mosaic/overviews, if requested) is built from the outputs of all the nodes.
+    timing : str/path
+        Path of a JSON lines file where the duration and bytes of each stage (decode, color, corners, write, vrt, ...) of each image are appended. A summary of each stage is printed at the end.
+        If set to 'None', nothing is recorded.
+    quality : bool
+        If True, the images are first checked for blank, grey or partly loaded captures (see tileQuality.TileQuality). The bad images are not georeferenced and are listed in 'requeue.csv' in the save folder, with the id, Long and Lat columns of the grid points CSV, so they can be downloaded again.
+    xyz : str/path
+        Folder of a Web Mercator XYZ tile pyramid ('<z>/<x>/<y>.png') for web viewers, updated at the end of the run (see tileExporter.XYZExporter).
+        Only the tiles overlapping images added or changed since the last export are rendered. If set to 'None', no tiles are exported.
+    store : str/path
+        Folder of a memory-mapped tile store (see tileStore.TileStore) updated at the end of the run: the pixels of the images in chunked .npy files and their grid id, transform and bounds in an index, for training jobs.
+        Only the images added or changed since the last export are decoded. If set to 'None', no store is written.
+
+    Returns
+    -------
+    errors : dict
+        Dictionary mapping the filenames that failed to their error traceback.
+    """
+    run = GeorefRun(imagePath, saveFolder=saveFolder, start=start, stop=stop, incremental=incremental,
+                    block_size=block_size, profile=profile, sidecar=sidecar,
+                    shard_index=shard_index, shard_count=shard_count, lease=lease, lease_ttl=lease_ttl, node=node, timing=timing,
+                    quality=quality)
+
+    if merge:
+        return run.finish(vrt=True, mosaic=mosaic, mosaic_rule=mosaic_rule, overviews=overviews,
+                          overview_levels=overview_levels, overview_resampling=overview_resampling, workers=workers, xyz=xyz, store=store)
+
+    if profile == 'gpkg' and workers is not None and workers > 1 and not prefetch:
+        if block_size is not None:
+            raise ValueError("The 'gpkg' profile cannot be written by several workers with block_size")
+        prefetch = 8
+
+    executor = None
+    if prefetch:
+        if sidecar or block_size is not None:
+            raise ValueError("prefetch cannot be combined with sidecar or block_size")
+        from georefPipeline import pipeline
+        results = pipeline(run.tasks, prefetch=prefetch, workers=workers or 4)
+    elif workers is None or workers <= 1:
+        results = map(_georef_image, run.tasks)
+    else:
+        if chunksize is None:
+            chunksize = max(1, len(run.tasks) // (workers * 4))
+        # executor.map yields the results in the input order, so the output stays deterministic
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(_georef_image, run.tasks, chunksize=chunksize)
+
+    try:
+        for result in tqdm(results, total=len(run.tasks)):
+            run.record(result, vrt_every=vrt_every if vrt else None)
+        run.retry_held(vrt_every=vrt_every if vrt else None)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        run.save()
+
+    return run.finish(vrt=vrt, mosaic=mosaic, mosaic_rule=mosaic_rule, overviews=overviews,
+                      overview_levels=overview_levels, overview_resampling=overview_resampling, workers=workers, xyz=xyz, store=store)
+
+def watch(imagePath, saveFolder=None, vrt=True, vrt_interval=30, settle=2.0, poll_interval=1.0, idle_timeout=None,
+          block_size=None, profile='gtiff', sidecar=False, timing=None, quality=False):
+    """
+    Georeferences the images of a folder while they are downloaded: each image is georeferenced as soon as it is complete (see folderWatcher.FolderWatcher) and the VRT is kept up to date.
+
+    The images already in the folder and not in the manifest are georeferenced first. The daemon stops on Ctrl+C or after idle_timeout seconds without new images.
+
+    Parameters
+    ----------
+    imagePath : str/path
+        Path to the image folder, e.g. the savePath of the downloader.
+    saveFolder : str/path
+        Name of the folder where the georeferenced images should be saved. If set to 'None', '_GEOTAGGED' is appended to the image folder name.
+    vrt : bool
+        Flag to keep the virtual merged file up to date.
+    vrt_interval : float
+        Minimum time in seconds between two updates of the VRT, so a fast burst of images does not rebuild it for each image.
+    settle : float
+        Time in seconds an image must keep the same size to be complete, when the folder is polled.
+    poll_interval : float
+        Time in seconds between two scans of the folder, when the folder is polled.
+    idle_timeout : float
+        Time in seconds without new images after which the daemon stops. If set to 'None', it runs until interrupted.
+    block_size : int
+        Number of rows read and written at a time, or 'None'.
+    profile : str
+        Output profile, one of the keys of PROFILES.
+    sidecar : bool
+        If True, only world files and .aux.xml are written next to the images.
+    timing : str/path
+        Path of a JSON lines file for the stage timings, or 'None'.
+    quality : bool
+        If True, the bad captures are not georeferenced and are listed in 'requeue.csv' in the save folder.
+
+    Returns
+    -------
+    errors : dict
+        Dictionary mapping the filenames that failed to their error traceback.
+    """
+    from folderWatcher import FolderWatcher
+
+    # The watcher is started before the folder is listed, so an image saved in between is not missed
+    watcher = FolderWatcher(imagePath, extensions=IMAGE_EXTENSIONS, settle=settle, poll_interval=poll_interval)
+    run = GeorefRun(imagePath, saveFolder=saveFolder, block_size=block_size, profile=profile, sidecar=sidecar, timing=timing, quality=quality)
+    print(f'Watching {imagePath} ({watcher.mode}), {len(run.tasks)} images waiting')
+
+    tasks = list(run.tasks)
+    changed = False
+    last_vrt = last_image = time.monotonic()
+    try:
+        while True:
+            for task in tasks:
+                result = _georef_image(task)
+                run.record(result)
+                if result[2] is not None:
+                    print(f'Failed to georeference {result[0]}')
+                changed = True
+            if tasks:
+                run.save()
+
+            now = time.monotonic()
+            if vrt and changed and now - last_vrt >= vrt_interval:
+                Geotagger.genVRT(input_path=run.save_path, output_path=run.vrt_path, files=run.georeferenced_files())
+                changed = False
+                last_vrt = now
+
+            timeouts = [vrt_interval - (now - last_vrt) if vrt and changed else None,
+                        idle_timeout - (now - last_image) if idle_timeout is not None else None]
+            timeouts = [max(0.0, timeout) for timeout in timeouts if timeout is not None]
+            names = watcher.wait(timeout=min(timeouts) if timeouts else None)
+
+            if names:
+                tasks = run.add(names)
+                last_image = time.monotonic()
+            else:
+                tasks = []
+                if idle_timeout is not None and time.monotonic() - last_image >= idle_timeout:
+                    print(f'No new image for {idle_timeout} s, stopping')
+                    break
+    except KeyboardInterrupt:
+        print('Stopped')
+    finally:
+        watcher.close()
+
+    return run.finish(vrt=vrt)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Process command line arguments")
@@ -365,6 +2004,32 @@ if __name__ == "__main__":
     parser.add_argument("--outputpath","-o", help="Save folder path")
     parser.add_argument("--inputpath","-i", help="Image path", required=True)
     parser.add_argument("--vrt","-v", help="Merges files if True", default=False)
+    parser.add_argument("--workers","-w", type=int, help="Number of worker processes", default=None)
+    parser.add_argument("--block-size","-b", type=int, help="Rows read and written at a time", default=None)
+    parser.add_argument("--profile","-p", choices=list(PROFILES), help="Output profile", default='gtiff')
+    parser.add_argument("--sidecar", action="store_true", help="Only write world files and .aux.xml next to the images")
+    parser.add_argument("--force", action="store_true", help="Georeference all the images again, ignoring the manifest")
+    parser.add_argument("--vrt-every", type=int, help="Update the VRT every N georeferenced images", default=None)
+    parser.add_argument("--mosaic","-m", action="store_true", help="Merge the georeferenced images into a single GeoTIFF")
+    parser.add_argument("--prefetch", type=int, help="Georeference with a read/decode/write pipeline prefetching N images", default=None)
+    parser.add_argument("--shard-index", type=int, help="Index of the shard of this node", default=None)
+    parser.add_argument("--shard-count", type=int, help="Number of shards (nodes)", default=None)
+    parser.add_argument("--lease", action="store_true", help="Claim the images through lease files, so nodes can drop out")
+    parser.add_argument("--lease-ttl", type=int, help="Seconds after which an abandoned lease is taken over", default=600)
+    parser.add_argument("--node", help="Name of this node in lease mode (default: host name)", default=None)
+    parser.add_argument("--merge", action="store_true", help="Only build the VRT from the outputs of all the nodes")
+    parser.add_argument("--timing", help="Append the duration of each stage of each image to this JSON lines file", default=None)
+    parser.add_argument("--quality","-q", action="store_true", help="Skip blank or partly loaded captures and list them in requeue.csv")
+    parser.add_argument("--xyz", help="Folder of the XYZ tile pyramid to update at the end of the run", default=None)
+    parser.add_argument("--store", help="Folder of the memory-mapped tile store to update at the end of the run", default=None)
+    parser.add_argument("--watch", action="store_true", help="Keep running and georeference the images as they are saved to the input folder")
+    parser.add_argument("--settle", type=float, help="Seconds a polled image must keep the same size to be complete (watch mode)", default=2.0)
+    parser.add_argument("--vrt-interval", type=float, help="Minimum seconds between two VRT updates (watch mode)", default=30)
+    parser.add_argument("--idle-timeout", type=float, help="Stop after this many seconds without new images (watch mode)", default=None)
+    parser.add_argument("--overviews", action="store_true", help="Build the overviews of the VRT and the mosaic")
+    parser.add_argument("--overview-levels", type=int, nargs='+', help="Decimation factors of the overviews", default=None)
+    parser.add_argument("--overview-resampling", help="Resampling method of the overviews", default='average')
+    parser.add_argument("--mosaic-rule", choices=['first', 'last', 'mean'], help="Overlap rule of the mosaic", default='first')
     
     args = parser.parse_args() 
 
@@ -388,17 +2053,78 @@ if __name__ == "__main__":
                                       If set to 'None', the function will start from the beginning (start=0).
             stop (int)              : The ending number for the filenames of the images in the folder for georeferencing. 
                                       If set to 'None', the function will perform the action for all the items in the folder.
-
-        The 'start' and 'stop' parameters are helpful if we want to terminate the process in the middle and restart it later.
+            workers (int)           : Number of worker processes used to georeference the images in parallel.
+                                      If set to 'None', the images are georeferenced one after another.
+            block-size (int)        : Number of rows read and written at a time, to bound the memory used per image.
+                                      If set to 'None', each image is decoded at once.
+            profile (str)           : Output profile: 'gtiff' (plain GeoTIFF, default), 'deflate', 'lzw', 'zstd', 'jpeg'
+                                      (tiled, compressed GeoTIFF), 'cog' (Cloud-Optimized GeoTIFF with internal overviews)
+                                      or 'gpkg' (all the images in one tile matrix of a GeoPackage, 'tiles.gpkg' in the output folder).
+            sidecar (flag)          : Only write a world file and a .aux.xml next to each image, without rewriting the pixels.
+                                      The VRT then references the original images.
+            force (flag)            : Georeference all the images again. By default, the manifest kept in the save folder
+                                      ('georef_manifest.json') is used to only georeference new or modified images.
+            vrt-every (int)         : Also update the VRT every N georeferenced images during the run, so a partial
+                                      mosaic can be opened before the end. The VRT is only rebuilt when its tiles change, but each
+                                      rebuild reopens all the tiles so far: keep N large for folders on a NAS.
+            prefetch (int)          : Use a threaded pipeline: a reader prefetches N images from the (network) disk, 'workers'
+                                      threads decode them and a writer thread writes the GeoTIFFs. For NAS-backed folders.
+            shard-index (int)       : Index of this node (0 to shard-count - 1) when several nodes share the folder on the NAS.
+            shard-count (int)       : Number of nodes. The images are assigned to the nodes from a hash of their filename.
+            lease (flag)            : Claim each image through a lease file in the save folder before georeferencing it.
+                                      With a shard, the node then helps with the shards of slower nodes or nodes that dropped out.
+            lease-ttl (int)         : Seconds after which the lease of a node that dropped out is taken over (default: 600).
+                                      At the end of its run, a node waits for the images held by other nodes and takes over the abandoned ones.
+            node (str)              : Name of this node in lease mode (default: host name). Set it when several processes of a host share a folder.
+            merge (flag)            : Georeference nothing, only build the VRT from the outputs of all the nodes.
+            timing (str/path)       : JSON lines file where the duration and bytes of each stage of each image are appended.
+                                      A summary of each stage is printed at the end.
+            quality (flag)          : Check the images for blank, grey or partly loaded captures first. The bad ones are not georeferenced
+                                      and are listed in requeue.csv (id, Long, Lat) in the output folder to be downloaded again.
+            xyz (str/path)          : Folder of a Web Mercator XYZ tile pyramid (<z>/<x>/<y>.png) for web viewers, updated at the end
+                                      of the run. Only the tiles of the images added or changed since the last export are rendered.
+            store (str/path)        : Folder of a memory-mapped tile store for training jobs (pixels in chunked .npy files, grid id,
+                                      transform and bounds in an index), updated at the end of the run with the new or changed images.
+            watch (flag)            : Keep running next to the downloader: each image is georeferenced as soon as it is saved (inotify if the
+                                      inotify_simple package is installed, polling otherwise) and, with vrt, the VRT is kept up to date.
+            settle (float)          : Seconds a polled image must keep the same size to be complete (default: 2).
+            vrt-interval (float)    : Minimum seconds between two VRT updates in watch mode (default: 30).
+            idle-timeout (float)    : Stop watching after this many seconds without new images (default: run until Ctrl+C).
+            overviews (flag)        : Build the overviews of the VRT ('.ovr' file) and of the mosaic, so zoomed-out views are fast.
+            overview-levels (int)   : Decimation factors of the overviews, e.g. 2 4 8 16. Derived from the size if not set.
+            overview-resampling     : Resampling method of the overviews (default: 'average').
+            mosaic (flag)           : Merge the georeferenced images into a single tiled, compressed GeoTIFF ('{id1}_{id2}_mosaic.tif'),
+                                      written next to the VRT. COG if the profile is 'cog'.
+            mosaic-rule (str)       : How overlapping images are merged in the mosaic: 'first' (default), 'last' or 'mean'.
+
+        Re-running the same command after an interruption resumes where it stopped, using the manifest.
+        The 'start' and 'stop' parameters are kept to restrict a run to a slice of the sorted filenames.
 
         Examples:
             python georef.py --inputpath path/to/image_folder 
                              --outputpath path/to/save_folder 
                              --start 10 
                              --stop 20
+                             --workers 8
+
+            python georef.py -i path/to/image_folder --shard-index 0 --shard-count 3 --lease    (on each node)
+            python georef.py -i path/to/image_folder --merge                                   (once all nodes are done)
+            python georef.py -i path/to/savePath --watch --vrt True --idle-timeout 3600       (next to the downloader)
     """
     
-    main(imagePath=args.inputpath, vrt=args.vrt, saveFolder=savefolder, start=start, stop=stop)
+    if args.watch:
+        watch(imagePath=args.inputpath, saveFolder=savefolder, vrt=args.vrt, vrt_interval=args.vrt_interval, settle=args.settle,
+              idle_timeout=args.idle_timeout, block_size=args.block_size, profile=args.profile, sidecar=args.sidecar,
+              timing=args.timing, quality=args.quality)
+        sys.exit(0)
+
+    main(imagePath=args.inputpath, vrt=args.vrt, saveFolder=savefolder, start=start, stop=stop,
+         workers=args.workers, block_size=args.block_size, profile=args.profile, sidecar=args.sidecar,
+         incremental=not args.force, vrt_every=args.vrt_every, mosaic=args.mosaic, mosaic_rule=args.mosaic_rule,
+         overviews=args.overviews, overview_levels=args.overview_levels, overview_resampling=args.overview_resampling,
+         prefetch=args.prefetch, shard_index=args.shard_index, shard_count=args.shard_count,
+         lease=args.lease, lease_ttl=args.lease_ttl, node=args.node, merge=args.merge, timing=args.timing,
+         quality=args.quality, xyz=args.xyz, store=args.store)
 
 
     
@@ -0,0 +1,252 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import shutil
+import tempfile
+import multiprocessing
+import numpy as np
+import cv2
+from concurrent.futures import ProcessPoolExecutor
+
+# Image sizes (width, height) benchmarked by default: a GEBOT capture and smaller/larger screens
+SIZES = [(1920, 1080), (2880, 1620), (4800, 2700)]
+STAGES = ('getcoord', 'decode', 'geotag', 'genVRT', 'main')
+
+
+def make_images(folder, count, width, height, lat=35.0, lon=22.0, seed=0):
+    """
+    Writes synthetic GEBOT-style captures, named 'IMG####_LT<lat>_LG<lon>.png' like the downloaded images.
+
+    The images are a smooth gradient with noise, so they compress in PNG about as badly as real aerial captures.
+    The centers follow one another along a row, one image width apart.
+
+    Parameters
+    ----------
+    folder : str/path
+        Folder of the images, created if needed.
+    count : int
+        Number of images.
+    width : int
+        Width of the images in pixels.
+    height : int
+        Height of the images in pixels.
+    lat : float, optional
+        Latitude of the first image center (default: 35.0).
+    lon : float, optional
+        Longitude of the first image center (default: 22.0).
+    seed : int, optional
+        Seed of the noise, so the inputs are the same from one run to the next (default: 0).
+
+    Returns
+    -------
+    size : int
+        Total size of the images in bytes.
+    """
+    from georef import PIX_RES
+
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    gradient = np.add.outer(np.linspace(0, 127, height), np.linspace(0, 127, width))
+    step = width * PIX_RES / 111320 / np.cos(np.radians(lat))
+
+    size = 0
+    for i in range(count):
+        noise = rng.integers(0, 64, size=(height, width, 3), dtype=np.uint8)
+        img = (gradient[:, :, None] + noise).astype(np.uint8)
+        path = os.path.join(folder, f'IMG{i:04d}_LT{lat:.6f}_LG{lon + i * step:.6f}.png')
+        cv2.imwrite(path, img)
+        size += os.path.getsize(path)
+    return size
+
+
+def _peak_rss():
+    """
+    Returns the peak resident memory of this process and of its finished children, in MB (ru_maxrss is in kB on Linux and in bytes on macOS).
+    """
+    scale = 1 if sys.platform == 'darwin' else 1024
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak * scale / 2**20
+
+
+def _run_stage(stage, folder, savefolder, workers):
+    """
+    Runs one benchmark stage over the images of folder. Called in a fresh process, so the peak memory belongs to the stage.
+
+    Returns
+    -------
+    seconds : float
+        Wall clock time of the stage.
+    peak_rss : float
+        Peak resident memory in MB.
+    """
+    import georef
+    from georef import Geotagger, PIX_RES
+
+    images = sorted(f for f in os.listdir(folder) if f.endswith('.png'))
+    os.makedirs(savefolder, exist_ok=True)
+    vrt_path = os.path.join(savefolder, 'benchmark.vrt')
+    if stage == 'genVRT':
+        # Otherwise the tile list of the previous run is up to date and genVRT returns at once
+        for path in (vrt_path, vrt_path + '.tiles'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    start = time.perf_counter()
+    if stage == 'getcoord':
+        for image in images:
+            Geotagger(os.path.join(folder, image), Geotagger.name2latlong(image), savefolder, PIX_RES, PIX_RES).getcoord()
+    elif stage == 'decode':
+        for image in images:
+            Geotagger(os.path.join(folder, image), Geotagger.name2latlong(image), savefolder, PIX_RES, PIX_RES).decode()
+    elif stage == 'geotag':
+        for image in images:
+            Geotagger(os.path.join(folder, image), Geotagger.name2latlong(image), savefolder, PIX_RES, PIX_RES).geotag()
+    elif stage == 'genVRT':
+        Geotagger.genVRT(savefolder, vrt_path)
+    elif stage == 'main':
+        georef.main(folder, saveFolder=savefolder, workers=workers, incremental=False)
+    seconds = time.perf_counter() - start
+
+    return seconds, _peak_rss()
+
+
+def benchmark(sizes=SIZES, count=16, workers=None, stages=STAGES, repeat=3, workdir=None):
+    """
+    Benchmarks the georeferencing of synthetic captures.
+
+    Each stage runs in a fresh process, repeat times, and the fastest run is kept. genVRT runs on the outputs of geotag, so it needs geotag in stages (without it, there is no tile and nothing is built).
+
+    Parameters
+    ----------
+    sizes : list, optional
+        Image sizes (width, height) to benchmark (default: SIZES).
+    count : int, optional
+        Number of images per size (default: 16).
+    workers : int, optional
+        Number of worker processes of the 'main' stage. If set to 'None', the images are georeferenced one after another (default: None).
+    stages : tuple, optional
+        Stages to time, among STAGES (default: all).
+    repeat : int, optional
+        Number of runs of each stage (default: 3).
+    workdir : str/path, optional
+        Folder of the synthetic images and outputs. If set to 'None', a temporary folder is used and removed at the end (default: None).
+
+    Returns
+    -------
+    report : dict
+        Environment and, for each size and stage, the time, images/s, MB/s (of PNG input) and peak memory.
+    """
+    import rasterio
+
+    tmpdir = workdir if workdir is not None else tempfile.mkdtemp(prefix='georef_bench_')
+    report = {'python': platform.python_version(),
+              'numpy': np.__version__,
+              'opencv': cv2.__version__,
+              'rasterio': rasterio.__version__,
+              'gdal': rasterio.__gdal_version__,
+              'cpus': os.cpu_count(),
+              'count': count,
+              'workers': workers,
+              'results': []}
+
+    # A fresh process per run, so the imports, buffers and peak memory do not leak from one stage into the next
+    context = multiprocessing.get_context('spawn')
+    try:
+        for width, height in sizes:
+            folder = os.path.join(tmpdir, f'{width}x{height}')
+            savefolder = folder + '_GEOTAGGED'
+            megabytes = make_images(folder, count, width, height) / 2**20
+
+            for stage in stages:
+                runs = []
+                for _ in range(repeat):
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                        runs.append(executor.submit(_run_stage, stage, folder, savefolder, workers).result())
+                seconds = min(run[0] for run in runs)
+                result = {'stage': stage,
+                          'width': width,
+                          'height': height,
+                          'seconds': round(seconds, 4),
+                          'images_per_s': round(count / seconds, 2),
+                          'mb_per_s': round(megabytes / seconds, 2),
+                          'peak_rss_mb': round(max(run[1] for run in runs), 1)}
+                report['results'].append(result)
+                print(f"{stage:>9} {width}x{height}: {result['images_per_s']:8.2f} img/s {result['mb_per_s']:8.2f} MB/s {result['peak_rss_mb']:8.1f} MB", file=sys.stderr)
+    finally:
+        if workdir is None:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    return report
+
+
+def compare(report, baseline, tolerance=0.1):
+    """
+    Compares a report with a baseline report, e.g. before upgrading GDAL or rasterio on the production machines.
+
+    Parameters
+    ----------
+    report : dict
+        Report of benchmark().
+    baseline : dict
+        Earlier report of benchmark().
+    tolerance : float, optional
+        Relative slowdown tolerated (default: 0.1).
+
+    Returns
+    -------
+    regressions : list
+        Description of the stages slower than the baseline by more than tolerance.
+    """
+    previous = {(r['stage'], r['width'], r['height']): r for r in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        before = previous.get((result['stage'], result['width'], result['height']))
+        if before is not None and result['images_per_s'] < before['images_per_s'] * (1 - tolerance):
+            regressions.append(f"{result['stage']} {result['width']}x{result['height']}: "
+                               f"{before['images_per_s']} -> {result['images_per_s']} img/s")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process command line arguments")
+    parser.add_argument("--count","-n", type=int, help="Number of images per size", default=16)
+    parser.add_argument("--sizes", nargs='+', help="Image sizes as WIDTHxHEIGHT", default=None)
+    parser.add_argument("--stages", nargs='+', choices=STAGES, help="Stages to time", default=list(STAGES))
+    parser.add_argument("--workers","-w", type=int, help="Number of worker processes of georef.main", default=None)
+    parser.add_argument("--repeat","-r", type=int, help="Number of runs of each stage", default=3)
+    parser.add_argument("--outputpath","-o", help="JSON report path (default: stdout)", default=None)
+    parser.add_argument("--baseline", help="Earlier JSON report to compare with", default=None)
+    parser.add_argument("--tolerance", type=float, help="Relative slowdown tolerated against the baseline", default=0.1)
+
+    args = parser.parse_args()
+
+    """
+        Benchmarks Geotagger.getcoord, Geotagger.decode, Geotagger.geotag, Geotagger.genVRT and georef.main on synthetic captures and reports images/s, MB/s and peak memory as JSON.
+        getcoord decodes with OpenCV and swaps the channels, decode reads straight into the band-interleaved buffer written by geotag: compare them to measure the decoding gain.
+
+        Example:
+            python georefBenchmark.py -o report.json
+            python georefBenchmark.py --sizes 4800x2700 -n 32 -w 4 --baseline report.json
+
+        With --baseline, the exit status is 1 if a stage is slower than the baseline by more than the tolerance.
+    """
+
+    sizes = [tuple(int(v) for v in size.lower().split('x')) for size in args.sizes] if args.sizes else SIZES
+    report = benchmark(sizes=sizes, count=args.count, workers=args.workers, stages=args.stages, repeat=args.repeat)
+
+    if args.outputpath is not None:
+        with open(args.outputpath, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            regressions = compare(report, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
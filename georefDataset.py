@@ -0,0 +1,320 @@
+import os
+import time
+import argparse
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from rasterio.transform import Affine
+from georef import Geotagger, PIX_RES, IMAGE_EXTENSIONS, plan
+
+
+class GeorefDataset:
+    __version__='1.0'
+    """
+    **GeorefDataset**
+
+    A class for streaming georeferenced arrays straight from the downloaded GEBOT images, e.g. into a training loop, without writing GeoTIFFs.
+
+    Each item is a tuple (array, transform, (lat, lon)): the band-interleaved RGB uint8 array of shape (3, height, width) decoded by Geotagger.decode(), its affine transform in EPSG:4326 and the coordinates of its center.
+    The bounds of all the images are computed once from the filenames and image headers (see georef.plan), so they are identical to the ones of the GeoTIFFs written by georef.
+
+    With chip_size, chips_per_image random square chips are cut from each image instead, with their own transform and center.
+    Iterating decodes the next images in workers threads, up to prefetch images ahead (rasterio releases the GIL while decoding), and yields them in order.
+
+    Parameters
+    ----------
+    imagePath : str/path
+        Path to the image folder.
+    images : list, optional
+        Filenames of the images. If set to 'None', all the PNG/JPG images of the folder, sorted by name (default: None).
+    chip_size : int, optional
+        Size in pixels of the random chips. If set to 'None', whole images are yielded (default: None).
+    chips_per_image : int, optional
+        Number of chips cut from each image (default: 1).
+    shuffle : bool, optional
+        If True, the images are visited in a random order, different at each iteration (default: False).
+    seed : int, optional
+        Seed of the random order and chips (default: None).
+    workers : int, optional
+        Number of decoding threads (default: 4).
+    prefetch : int, optional
+        Maximum number of images decoded ahead (default: 8).
+
+    Examples
+    --------
+    >>> dataset = GeorefDataset('path/to/image_folder', chip_size=256, chips_per_image=4, shuffle=True)
+    >>> for array, transform, (lat, lon) in dataset:
+    ...     train(array)
+    >>> array, transform, (lat, lon) = dataset[0]
+
+    >>> python georefDataset.py --inputpath path/to/image_folder --chip-size 256
+
+    Methods
+    -------
+    __init__()
+        Initializes the GeorefDataset object and computes the bounds of the images.
+
+        Parameters
+        ----------
+        See the class parameters.
+
+        Returns
+        -------
+
+    __len__()
+        Returns the number of items of an iteration (images, or chips).
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        int
+            Number of items.
+
+    __getitem__(index)
+        Decodes one image.
+
+        Parameters
+        ----------
+        index : int
+            Index of the image.
+
+        Returns
+        -------
+        tuple
+            The array, the transform and the (lat, lon) of the image center.
+
+    __iter__()
+        Iterates over the images (or chips), decoding them in parallel threads.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        iterator
+            Iterator of (array, transform, (lat, lon)) tuples.
+
+    iter_images(order=None)
+        Decodes whole images, with their filename, in parallel threads.
+
+        Parameters
+        ----------
+        order : list, optional
+            Indices of the images. If set to 'None', all the images in order (default: None).
+
+        Returns
+        -------
+        iterator
+            Iterator of (image, array, transform, (lat, lon)) tuples.
+
+    chips(array, transform, rng)
+        Cuts random chips from an image.
+
+        Parameters
+        ----------
+        array : numpy.ndarray
+            Array of shape (3, height, width).
+        transform : affine.Affine
+            Transform of the image.
+        rng : numpy.random.Generator
+            Random generator.
+
+        Returns
+        -------
+        list
+            The (array, transform, (lat, lon)) tuples of the chips.
+
+    """
+
+    def __init__(self, imagePath, images=None, chip_size=None, chips_per_image=1, shuffle=False, seed=None, workers=4, prefetch=8):
+        """
+        Initializes the GeorefDataset object and computes the bounds of the images. The images whose filename or header cannot be read are left out and listed in errors.
+
+        Parameters
+        ----------
+        imagePath : str/path
+            Path to the image folder.
+        images : list, optional
+            Filenames of the images. If set to 'None', all the PNG/JPG images of the folder, sorted by name (default: None).
+        chip_size : int, optional
+            Size in pixels of the random chips. If set to 'None', whole images are yielded (default: None).
+        chips_per_image : int, optional
+            Number of chips cut from each image (default: 1).
+        shuffle : bool, optional
+            If True, the images are visited in a random order, different at each iteration (default: False).
+        seed : int, optional
+            Seed of the random order and chips (default: None).
+        workers : int, optional
+            Number of decoding threads (default: 4).
+        prefetch : int, optional
+            Maximum number of images decoded ahead (default: 8).
+        """
+        if images is None:
+            images = sorted(f for f in os.listdir(imagePath) if f.lower().endswith(IMAGE_EXTENSIONS))
+
+        self.imagePath = imagePath
+        self.chip_size = chip_size
+        self.chips_per_image = chips_per_image
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(seed)
+        self.workers = max(1, workers)
+        self.prefetch = max(1, prefetch)
+        self.errors = {}
+
+        self.images, self.bounds = [], []
+        for image, bounds in zip(images, plan(imagePath, images)):
+            if bounds is None:
+                self.errors[image] = 'The filename or the image header could not be read'
+                continue
+            self.images.append(image)
+            self.bounds.append(bounds)
+
+    def __len__(self):
+        """
+        Returns the number of items of an iteration: the number of images, times chips_per_image with chips.
+        """
+        return len(self.images) * (self.chips_per_image if self.chip_size is not None else 1)
+
+    def _load(self, index):
+        """
+        Decodes an image and returns its array, transform and center (lat, lon).
+        """
+        image = self.images[index]
+        geotagger = Geotagger(filepath=os.path.join(self.imagePath, image), center_coord=Geotagger.name2latlong(image), savepath=None,
+                              pixXRES=PIX_RES, pixYRES=PIX_RES, bounds=self.bounds[index])
+        # The array outlives the call, so the thread buffer is not reused
+        array = geotagger.decode(reuse=False)
+        n, s, w, e = geotagger.get_bounds(array.shape[2], array.shape[1])
+        transform = Affine((e - w) / array.shape[2], 0.0, w, 0.0, (s - n) / array.shape[1], n)
+        return array, transform, geotagger.center_coord
+
+    def __getitem__(self, index):
+        """
+        Decodes one image (whole, even with chip_size), e.g. for a map-style dataset of a training framework.
+
+        Parameters
+        ----------
+        index : int
+            Index of the image.
+
+        Returns
+        -------
+        item : tuple
+            The array of shape (3, height, width), the transform and the (lat, lon) of the image center.
+        """
+        return self._load(index)
+
+    def chips(self, array, transform, rng):
+        """
+        Cuts chips_per_image random chips of chip_size pixels from an image. The chips are copies, so the image can be freed.
+
+        Parameters
+        ----------
+        array : numpy.ndarray
+            Array of shape (3, height, width).
+        transform : affine.Affine
+            Transform of the image.
+        rng : numpy.random.Generator
+            Random generator.
+
+        Returns
+        -------
+        chips : list
+            The (array, transform, (lat, lon)) tuples of the chips.
+        """
+        size = self.chip_size
+        if size > array.shape[1] or size > array.shape[2]:
+            raise ValueError(f'Chips of {size} pixels do not fit in an image of {array.shape[2]}x{array.shape[1]} pixels')
+
+        chips = []
+        rows = rng.integers(0, array.shape[1] - size + 1, self.chips_per_image)
+        cols = rng.integers(0, array.shape[2] - size + 1, self.chips_per_image)
+        for row, col in zip(rows.tolist(), cols.tolist()):
+            lon, lat = transform * (col + size / 2, row + size / 2)
+            chips.append((array[:, row:row + size, col:col + size].copy(), transform * Affine.translation(col, row), (lat, lon)))
+        return chips
+
+    def __iter__(self):
+        """
+        Iterates over the images (or chips), decoding up to prefetch images ahead in workers threads. The images that fail to decode are skipped and listed in errors.
+
+        Yields
+        ------
+        item : tuple
+            The array of shape (3, height, width), the transform and the (lat, lon) of the center.
+        """
+        order = self.rng.permutation(len(self.images)) if self.shuffle else np.arange(len(self.images))
+        # Each iteration gets its own generator for the chips, so concurrent iterations do not share state
+        rng = np.random.default_rng(self.rng.integers(2**63))
+
+        for _, array, transform, center in self.iter_images(order.tolist()):
+            if self.chip_size is None:
+                yield array, transform, center
+            else:
+                yield from self.chips(array, transform, rng)
+
+    def iter_images(self, order=None):
+        """
+        Decodes whole images in the given order, up to prefetch images ahead in workers threads. The images that fail to decode are skipped and listed in errors.
+
+        Parameters
+        ----------
+        order : list, optional
+            Indices of the images. If set to 'None', all the images in order (default: None).
+
+        Yields
+        ------
+        item : tuple
+            The filename of the image, its array of shape (3, height, width), its transform and the (lat, lon) of its center.
+        """
+        indexes = deque(range(len(self.images)) if order is None else order)
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while indexes or pending:
+                while indexes and len(pending) < self.prefetch:
+                    index = indexes.popleft()
+                    pending.append((index, executor.submit(self._load, index)))
+
+                index, future = pending.popleft()
+                try:
+                    array, transform, center = future.result()
+                except Exception:
+                    self.errors[self.images[index]] = traceback.format_exc()
+                    continue
+                yield self.images[index], array, transform, center
+
+
+    def __getattr__(self, attrib):
+        if attrib=="__version__":
+            return self.__version__
+        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{attrib}'")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process command line arguments")
+    parser.add_argument("--inputpath","-i", help="Image path", required=True)
+    parser.add_argument("--chip-size", type=int, help="Size in pixels of random chips (default: whole images)", default=None)
+    parser.add_argument("--chips-per-image", type=int, help="Number of chips cut from each image", default=1)
+    parser.add_argument("--shuffle", action="store_true", help="Visit the images in a random order")
+    parser.add_argument("--workers","-w", type=int, help="Number of decoding threads", default=4)
+    parser.add_argument("--prefetch", type=int, help="Maximum number of images decoded ahead", default=8)
+
+    args = parser.parse_args()
+
+    # Reads the whole dataset once and reports the throughput, to size workers and prefetch
+    dataset = GeorefDataset(args.inputpath, chip_size=args.chip_size, chips_per_image=args.chips_per_image, shuffle=args.shuffle,
+                            workers=args.workers, prefetch=args.prefetch)
+    start = time.perf_counter()
+    count = nbytes = 0
+    for array, transform, center in dataset:
+        count += 1
+        nbytes += array.nbytes
+    seconds = time.perf_counter() - start
+    print(f'{count} items, {nbytes / 2**20:.1f} MB in {seconds:.2f} s ({count / max(seconds, 1e-9):.1f} items/s, {nbytes / 2**20 / max(seconds, 1e-9):.1f} MB/s)')
+    for image, error in dataset.errors.items():
+        print(f'{image}: {error}')
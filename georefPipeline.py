@@ -0,0 +1,105 @@
+import os
+import queue
+import threading
+import traceback
+from georef import _make_geotagger, _records, _lease_stamp
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+def pipeline(tasks, prefetch=8, workers=4):
+    """
+    Georeferences images with a three-stage threaded pipeline, for image and save folders on a network share (NAS):
+
+    - a reader thread reads the next image files into memory, up to prefetch images ahead,
+    - workers compute threads decode them and compute their bounds,
+    - a writer thread writes the GeoTIFFs.
+
+    The stages are connected by bounded queues, so the read and write latency is hidden behind the decoding and the memory used is bounded by the queue sizes.
+    Decoding and writing happen in rasterio/GDAL, which release the GIL, so threads are enough to overlap the stages.
+
+    Parameters
+    ----------
+    tasks : list
+        Tasks of georef.GeorefRun (image filename, image folder, save folder, precomputed bounds, Geotagger options, LeaseManager or None, timing flag).
+    prefetch : int, optional
+        Maximum number of images waiting in each queue (default: 8).
+    workers : int, optional
+        Number of compute threads (default: 4).
+
+    Yields
+    ------
+    result : tuple
+        Tuple containing the image filename, the output filename, the error traceback (None if the image was georeferenced) and the timing records (None if timing is disabled), in completion order.
+        The output and error are both None if the image is held by another node.
+    """
+    read_queue = queue.Queue(maxsize=prefetch)
+    write_queue = queue.Queue(maxsize=prefetch)
+    result_queue = queue.Queue()
+
+    def reader():
+        # The sentinels are sent whatever happens, or the compute threads, the writer and main would wait forever
+        try:
+            for task in tasks:
+                image, imagePath, leases = task[0], task[1], task[5]
+                try:
+                    # A failed claim (e.g. the NAS dropped out) is the error of this image
+                    if leases is not None and not leases.claim(image, stamp=_lease_stamp(task)):
+                        result_queue.put((image, None, None, None))
+                        continue
+                    with open(os.path.join(imagePath, image), 'rb') as file:
+                        read_queue.put((task, file.read(), None))
+                except Exception:
+                    read_queue.put((task, None, traceback.format_exc()))
+        finally:
+            for _ in range(workers):
+                read_queue.put(_DONE)
+
+    def compute():
+        while True:
+            item = read_queue.get()
+            if item is _DONE:
+                write_queue.put(_DONE)
+                return
+            task, data, error = item
+            geotagger = img = None
+            if error is None:
+                try:
+                    geotagger = _make_geotagger(task)
+                    # The array is handed over to the writer, so the thread buffer is not reused
+                    img = geotagger.decode(data=data, reuse=False)
+                except Exception:
+                    error = traceback.format_exc()
+            write_queue.put((task, geotagger, img, error))
+
+    def writer():
+        running = workers
+        while running:
+            item = write_queue.get()
+            if item is _DONE:
+                running -= 1
+                continue
+            task, geotagger, img, error = item
+            output = None
+            if error is None:
+                try:
+                    output = os.path.basename(geotagger.write(img))
+                except Exception:
+                    error = traceback.format_exc()
+            leases = task[5]
+            if leases is not None:
+                leases.release(task[0], done=error is None)
+            result_queue.put((task[0], output, error, _records(geotagger)))
+        result_queue.put(_DONE)
+
+    threads = [threading.Thread(target=reader, daemon=True), threading.Thread(target=writer, daemon=True)]
+    threads += [threading.Thread(target=compute, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    while True:
+        result = result_queue.get()
+        if result is _DONE:
+            break
+        yield result
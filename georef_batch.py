@@ -1,24 +1,94 @@
-from georef import main
+from georef import GeorefRun, _georef_image
 import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from tqdm import tqdm
 
-def batchGeoref(folder_path, savepath=None):
-    savefolder = savepath
-    start = None
-    stop = 5
+def batchGeoref(folder_path, savepath=None, workers=None, vrt=True, **options):
+    """
+    Georeferences every acquisition folder of folder_path with one worker pool shared by all the acquisitions, so small acquisitions do not leave workers idle.
 
-    acq_list = os.listdir(folder_path)
-    count = len(acq_list)
-    for acq in acq_list[:1]:
-        print(f"Processing Acqisition {acq} and remaining is {count}")
+    The VRT (and mosaic/overviews, if requested) of an acquisition is generated as soon as all its images are done.
+
+    Parameters
+    ----------
+    folder_path : str/path
+        Folder containing one image folder per acquisition.
+    savepath : str/path
+        Folder where the '<acquisition>_GEOTAGGED' folders are created. If set to 'None', folder_path is used.
+    workers : int
+        Total number of worker processes. If set to 'None', the number of CPUs is used.
+    vrt : bool
+        Flag to generate the virtual merged file of each acquisition.
+    **options
+        Options of georef.GeorefRun (start, stop, incremental, block_size, profile, sidecar) and of GeorefRun.finish (mosaic, mosaic_rule, overviews, overview_levels, overview_resampling, xyz, store).
+        The tiles of each acquisition are exported to an '<xyz>/<acquisition>' pyramid, since the removed images of an export are the ones missing from its list.
+        Likewise, each acquisition has its own '<store>/<acquisition>' tile store, as the grid ids are only unique within an acquisition.
+
+    Returns
+    -------
+    errors : dict
+        Dictionary mapping each acquisition to its failed filenames and error tracebacks.
+    """
+    if options.get('profile') == 'gpkg':
+        # The worker processes would all write to the GeoPackage of their acquisition
+        raise ValueError("The 'gpkg' profile has a single writer, use georef.main for each acquisition")
+    savefolder = savepath if savepath is not None else folder_path
+    finish_keys = ('mosaic', 'mosaic_rule', 'overviews', 'overview_levels', 'overview_resampling', 'xyz', 'store')
+    finish_options = {key: options.pop(key) for key in finish_keys if key in options}
+
+    # The output folders may live next to the acquisitions
+    acq_list = sorted(acq for acq in os.listdir(folder_path)
+                      if os.path.isdir(os.path.join(folder_path, acq)) and not acq.endswith('_GEOTAGGED'))
+
+    runs = {}
+    for acq in acq_list:
         imagePath = os.path.join(folder_path,acq)
-        main(imagePath=imagePath, vrt=True, saveFolder=os.path.join(savefolder, acq+'_GEOTAGGED'), start=start, stop=stop)
-        count-=1
+        runs[acq] = GeorefRun(imagePath=imagePath, saveFolder=os.path.join(savefolder, acq+'_GEOTAGGED'), **options)
+
+    errors = {}
+    remaining = {acq: len(run.tasks) for acq, run in runs.items()}
+    print(f"Processing {len(acq_list)} acquisitions, {sum(remaining.values())} images")
+
+    def finish(acq):
+        print(f"Acquisition {acq} done")
+        options = dict(finish_options)
+        for key in ('xyz', 'store'):
+            if options.get(key) is not None:
+                options[key] = os.path.join(options[key], acq)
+        errors[acq] = runs[acq].finish(vrt=vrt, workers=workers, **options)
+
+    for acq in acq_list:
+        if remaining[acq] == 0:
+            finish(acq)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_georef_image, task): acq for acq in acq_list for task in runs[acq].tasks}
+        try:
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                acq = futures[future]
+                runs[acq].record(future.result())
+                remaining[acq] -= 1
+                if remaining[acq] == 0:
+                    # Images held by other nodes, georeferenced here if they drop out
+                    runs[acq].retry_held()
+                    finish(acq)
+        finally:
+            for acq, run in runs.items():
+                run.manifest.save()
+
+    return errors
 
 if __name__=="__main__":
     folder_path = '/home/savvas/SUPER-NAS/USERS/Chirag/PERIOPSIS/202405-Greece/Data/Trikala/trikala'
 
+    parser = argparse.ArgumentParser(description="Process command line arguments")
+    parser.add_argument("--inputpath","-i", help="Folder of acquisition folders", default=folder_path)
+    parser.add_argument("--outputpath","-o", help="Folder of the georeferenced acquisitions", default=None)
+    parser.add_argument("--workers","-w", type=int, help="Total number of worker processes", default=None)
+    args = parser.parse_args()
+
+    folder_path = args.inputpath
     if folder_path==None:
         folder_path = input("Enter the folder path: ")
-    batchGeoref(folder_path, savepath=folder_path)
-
+    batchGeoref(folder_path, savepath=args.outputpath, workers=args.workers)
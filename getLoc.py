@@ -46,7 +46,7 @@ class LocationGetter:
             x and y coordinates of the mouse position.
 
     collect_locations()
-        Collects mouse locations for the search bar, uncheck, save image, and save button.
+        Collects mouse locations for the search bar, uncheck, save image, and save button, and the region of the map.
 
         Parameters
         ----------
@@ -75,7 +75,7 @@ class LocationGetter:
         ----------
         None
         """
-        self.location_report = {"search_loc": 0, "uncheck": 0, "save_image_loc": 0, "save_button_loc": 0}
+        self.location_report = {"search_loc": 0, "uncheck": 0, "save_image_loc": 0, "save_button_loc": 0, "map_region": 0}
 
     def get_location(self, message):
         """
@@ -96,12 +96,17 @@ class LocationGetter:
 
     def collect_locations(self):
         """
-        Collects mouse locations for the search bar, uncheck, save image, and save button.
+        Collects mouse locations for the search bar, uncheck, save image, and save button, and the region of the map (left, top, width, height) watched by the adaptive waits of the downloader.
 
         Parameters
         ----------
         None
         """
+        # Map region, from its top left and bottom right corners
+        top_left = self.get_location("Top left corner of the map")
+        bottom_right = self.get_location("Bottom right corner of the map")
+        self.location_report['map_region'] = (top_left[0], top_left[1], bottom_right[0] - top_left[0], bottom_right[1] - top_left[1])
+
         # Search bar location
         search_loc = self.get_location("Search bar")
         self.location_report['search_loc'] = (search_loc[0], search_loc[1])
@@ -0,0 +1,388 @@
+import time
+import socket
+import sqlite3
+import argparse
+
+STATES = ('pending', 'in_progress', 'done', 'failed')
+# Difference in degrees (about 1 cm) under which the coordinates of a grid id are the same
+COORD_TOLERANCE = 1e-7
+
+
+class JobStore:
+    __version__='1.0'
+    """
+    **JobStore**
+
+    A class for keeping the download state of each grid point in a SQLite database, so the bot resumes exactly where it stopped after a crash or a reboot.
+
+    Each point (grid id, Lat, Long) is 'pending', 'in_progress', 'done' or 'failed', with its number of attempts, the time it was claimed and finished, the duration of the download and the last error.
+    Every change is committed at once, so the database is always up to date. Each claim records the node (machine) of the bot, and a machine runs a single Google Earth, so a single bot.
+    When the store is opened, the points left 'in_progress' by a crash of this node go back to 'pending': they are downloaded again rather than skipped.
+    The points in progress on another node are left to it, unless they were claimed more than stale_after seconds ago (the other node dropped out).
+    The failed points are claimed again once no point is pending, until they have been tried max_attempts times.
+
+    Parameters
+    ----------
+    path : str/path
+        Path of the SQLite database. It is created if it does not exist.
+    max_attempts : int, optional
+        Maximum number of attempts of a point (default: 3).
+    node : str, optional
+        Name of this node, recorded with its claims (default: host name).
+    stale_after : int, optional
+        Time in seconds after which a point in progress on another node is claimed again (default: 3600).
+
+    Examples
+    --------
+    >>> jobs = JobStore('path/to/savePath/jobs.sqlite')
+    >>> jobs.add(data['id'], data['Lat'], data['Long'])
+    >>> while (job := jobs.claim()) is not None:
+    ...     id, lat, long = job
+    ...     download(lat, long)
+    ...     jobs.done(id, seconds=12.3)
+
+    >>> python jobStore.py --inputpath path/to/savePath/jobs.sqlite
+
+    Methods
+    -------
+    __init__()
+        Initializes the JobStore object, creates the database and puts the points abandoned in progress back to pending.
+
+        Parameters
+        ----------
+        See the class parameters.
+
+        Returns
+        -------
+
+    add(img_id, latitude, longitude, done=None)
+        Adds grid points to the store. The points already in the store keep their state. Raises a ValueError if a grid id is already in the store at other coordinates.
+
+        Parameters
+        ----------
+        img_id : list
+            List of image IDs.
+        latitude : list
+            List of latitudes.
+        longitude : list
+            List of longitudes.
+        done : list, optional
+            For each point, True if it is already downloaded (default: None).
+
+        Returns
+        -------
+        int
+            Number of points added.
+
+    claim(ids=None)
+        Claims the next point to download: the pending point with the lowest id, else the failed point with the lowest id and attempts left.
+
+        Parameters
+        ----------
+        ids : list, optional
+            If set, only these grid ids are claimed (default: None).
+
+        Returns
+        -------
+        tuple
+            (id, lat, long) of the point, or None if there is nothing left.
+
+    done(id, seconds=None)
+        Marks a point as downloaded.
+
+        Parameters
+        ----------
+        id : int
+            Grid id of the point.
+        seconds : float, optional
+            Duration of the download (default: None).
+
+        Returns
+        -------
+
+    fail(id, error, seconds=None)
+        Marks a point as failed.
+
+        Parameters
+        ----------
+        id : int
+            Grid id of the point.
+        error : str
+            Reason of the failure.
+        seconds : float, optional
+            Duration of the attempt (default: None).
+
+        Returns
+        -------
+
+    remaining(ids=None)
+        Counts the points left to claim.
+
+        Parameters
+        ----------
+        ids : list, optional
+            If set, only these grid ids are counted (default: None).
+
+        Returns
+        -------
+        int
+            Number of points pending, or failed with attempts left.
+
+    counts()
+        Counts the points in each state.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        dict
+            Dictionary mapping each state to its number of points.
+
+    retry_failed()
+        Puts the failed points back to pending with no attempts.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        int
+            Number of points put back.
+
+    close()
+        Closes the database.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+    """
+
+    def __init__(self, path, max_attempts=3, node=None, stale_after=3600):
+        """
+        Initializes the JobStore object, creates the database and puts the points left in progress by a crash of this node, or abandoned by another node, back to pending.
+
+        Parameters
+        ----------
+        path : str/path
+            Path of the SQLite database. It is created if it does not exist.
+        max_attempts : int, optional
+            Maximum number of attempts of a point (default: 3).
+        node : str, optional
+            Name of this node, recorded with its claims (default: host name).
+        stale_after : int, optional
+            Time in seconds after which a point in progress on another node is claimed again (default: 3600).
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self.node = node if node is not None else socket.gethostname()
+        self.stale_after = stale_after
+        # Autocommit: each statement is durable as soon as it returns
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('''CREATE TABLE IF NOT EXISTS jobs (
+                                       id INTEGER PRIMARY KEY,
+                                       lat REAL NOT NULL,
+                                       long REAL NOT NULL,
+                                       state TEXT NOT NULL DEFAULT 'pending',
+                                       attempts INTEGER NOT NULL DEFAULT 0,
+                                       claimed_at REAL,
+                                       finished_at REAL,
+                                       seconds REAL,
+                                       error TEXT,
+                                       node TEXT)''')
+        if 'node' not in [column[1] for column in self.connection.execute('PRAGMA table_info(jobs)')]:
+            # Database created before the claims recorded their node
+            self.connection.execute('ALTER TABLE jobs ADD COLUMN node TEXT')
+        # Another bot may be downloading its points right now: only this node's points, and the stale ones, are reset
+        self.connection.execute('''UPDATE jobs SET state = 'pending'
+                                   WHERE state = 'in_progress' AND (node IS NULL OR node = ? OR claimed_at IS NULL OR claimed_at < ?)''',
+                                (self.node, time.time() - stale_after))
+
+    def add(self, img_id, latitude, longitude, done=None):
+        """
+        Adds grid points to the store. The points already in the store keep their state, so the same CSV can be added at every start.
+        The points are identified by their grid id only, so a grid id already in the store at other coordinates (e.g. a new CSV numbered from 0 again) raises a ValueError rather than being skipped as done with the old coordinates.
+
+        Parameters
+        ----------
+        img_id : list
+            List of image IDs.
+        latitude : list
+            List of latitudes.
+        longitude : list
+            List of longitudes.
+        done : list, optional
+            For each point, True if it is already downloaded, e.g. by a run before the store existed. Only used for the points added (default: None).
+
+        Returns
+        -------
+        added : int
+            Number of points added.
+        """
+        if done is None:
+            done = [False] * len(img_id)
+        rows = [(int(id), float(lat), float(long), 'done' if is_done else 'pending') for id, lat, long, is_done in zip(img_id, latitude, longitude, done)]
+        before = self.connection.total_changes
+        # One transaction for all the points, rather than one commit per point
+        self.connection.execute('BEGIN')
+        try:
+            stored = {id: (lat, long) for id, lat, long in self.connection.execute('SELECT id, lat, long FROM jobs')}
+            moved = [id for id, lat, long, _ in rows if id in stored and not (abs(stored[id][0] - lat) <= COORD_TOLERANCE and abs(stored[id][1] - long) <= COORD_TOLERANCE)]
+            if moved:
+                raise ValueError(f'{len(moved)} grid ids of {self.path} are at other coordinates (e.g. id {moved[0]}: {stored[moved[0]]} in the store, '
+                                 f'{next(row[1:3] for row in rows if row[0] == moved[0])} in the grid): use another job store for a new grid (\'jobStore\' in the configuration file of gebot)')
+            self.connection.executemany('INSERT OR IGNORE INTO jobs (id, lat, long, state) VALUES (?, ?, ?, ?)', rows)
+            self.connection.execute('COMMIT')
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        return self.connection.total_changes - before
+
+    @staticmethod
+    def _filter(ids):
+        """
+        Returns the SQL condition and parameters restricting a query to some grid ids.
+        """
+        if ids is None:
+            return '', []
+        ids = [int(id) for id in ids]
+        return f" AND id IN ({','.join('?' * len(ids))})", ids
+
+    def claim(self, ids=None):
+        """
+        Claims the next point to download: the pending point with the lowest id, else the failed point with the lowest id and attempts left. The point is 'in_progress' until done() or fail().
+
+        Parameters
+        ----------
+        ids : list, optional
+            If set, only these grid ids are claimed, e.g. a slice of the CSV (default: None).
+
+        Returns
+        -------
+        job : tuple
+            (id, lat, long) of the point, or None if there is nothing left.
+        """
+        condition, parameters = self._filter(ids)
+        # BEGIN IMMEDIATE takes the write lock, so two bots sharing the database never claim the same point
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = self.connection.execute(f'''SELECT id, lat, long FROM jobs
+                                              WHERE (state = 'pending' OR (state = 'failed' AND attempts < ?)){condition}
+                                              ORDER BY state = 'failed', id LIMIT 1''', [self.max_attempts] + parameters).fetchone()
+            if row is not None:
+                self.connection.execute('''UPDATE jobs SET state = 'in_progress', attempts = attempts + 1, claimed_at = ?, finished_at = NULL, node = ?
+                                           WHERE id = ?''', (time.time(), self.node, row[0]))
+            self.connection.execute('COMMIT')
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        return row
+
+    def done(self, id, seconds=None):
+        """
+        Marks a point as downloaded.
+
+        Parameters
+        ----------
+        id : int
+            Grid id of the point.
+        seconds : float, optional
+            Duration of the download (default: None).
+        """
+        self.connection.execute("UPDATE jobs SET state = 'done', finished_at = ?, seconds = ?, error = NULL WHERE id = ?",
+                                (time.time(), seconds, int(id)))
+
+    def fail(self, id, error, seconds=None):
+        """
+        Marks a point as failed. It is claimed again once no point is pending, if it has attempts left.
+
+        Parameters
+        ----------
+        id : int
+            Grid id of the point.
+        error : str
+            Reason of the failure.
+        seconds : float, optional
+            Duration of the attempt (default: None).
+        """
+        self.connection.execute("UPDATE jobs SET state = 'failed', finished_at = ?, seconds = ?, error = ? WHERE id = ?",
+                                (time.time(), seconds, error, int(id)))
+
+    def remaining(self, ids=None):
+        """
+        Counts the points left to claim.
+
+        Parameters
+        ----------
+        ids : list, optional
+            If set, only these grid ids are counted (default: None).
+
+        Returns
+        -------
+        remaining : int
+            Number of points pending, or failed with attempts left.
+        """
+        condition, parameters = self._filter(ids)
+        return self.connection.execute(f'''SELECT COUNT(*) FROM jobs
+                                           WHERE (state = 'pending' OR (state = 'failed' AND attempts < ?)){condition}''',
+                                       [self.max_attempts] + parameters).fetchone()[0]
+
+    def counts(self):
+        """
+        Counts the points in each state.
+
+        Returns
+        -------
+        counts : dict
+            Dictionary mapping each state to its number of points.
+        """
+        counts = dict.fromkeys(STATES, 0)
+        counts.update(self.connection.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall())
+        return counts
+
+    def retry_failed(self):
+        """
+        Puts the failed points back to pending with no attempts, e.g. after fixing the cause of the failures.
+
+        Returns
+        -------
+        count : int
+            Number of points put back.
+        """
+        return self.connection.execute("UPDATE jobs SET state = 'pending', attempts = 0 WHERE state = 'failed'").rowcount
+
+    def close(self):
+        """
+        Closes the database.
+        """
+        self.connection.close()
+
+
+    def __getattr__(self, attrib):
+        if attrib=="__version__":
+            return self.__version__
+        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{attrib}'")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process command line arguments")
+    parser.add_argument("--inputpath","-i", help="Path of the job database (jobs.sqlite in the save path)", required=True)
+    parser.add_argument("--retry-failed", action="store_true", help="Put the failed points back to pending")
+    parser.add_argument("--failed", action="store_true", help="List the failed points with their error")
+
+    args = parser.parse_args()
+
+    jobs = JobStore(args.inputpath)
+    if args.retry_failed:
+        print(f'{jobs.retry_failed()} failed points put back to pending')
+    print(', '.join(f'{state}: {count}' for state, count in jobs.counts().items()))
+    if args.failed:
+        for id, attempts, error in jobs.connection.execute("SELECT id, attempts, error FROM jobs WHERE state = 'failed' ORDER BY id"):
+            print(f'{id} ({attempts} attempts): {error}')
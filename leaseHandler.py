@@ -0,0 +1,323 @@
+import os
+import socket
+import hashlib
+import threading
+import time
+import uuid
+
+
+class LeaseManager:
+    __version__='1.0'
+    """
+    **LeaseManager**
+
+    A class for sharing the georeferencing of a folder between several nodes through lease files on the shared disk (NAS).
+
+    Before georeferencing an image, a node claims it by creating '<image>.lease' in the lease folder. The creation is exclusive, so only one node gets the image.
+    Each claim writes a unique token in the lease, and the node only releases or marks done the leases that still hold its token.
+    While a node holds leases, a background thread touches them every ttl/4 seconds, so a long image is not taken for abandoned.
+    A claim can carry a stamp, the version of the work on the image (e.g. the output options and the size and modification time of the input): the lease is then '<image>.<hash of the stamp>.lease', so a claim with another stamp (other options, modified image) gets a lease of its own.
+    Once the image is done, the lease is marked as done and is never claimed again with the same stamp. A lease that is not done and older than ttl seconds belongs to a node that dropped out, and can be taken over by another node.
+
+    A takeover writes a lease under a unique temporary name, renames it over the stale one and reads it back after settle seconds: if two nodes take over the same lease, only the last rename survives and the other node sees a foreign token and gives up.
+    This holds as long as the time between a node seeing the stale lease and renaming its own is shorter than settle.
+
+    Parameters
+    ----------
+    lease_path : str/path
+        Folder of the lease files, shared by all the nodes.
+    node : str, optional
+        Name of this node, written in its leases (default: host name).
+    ttl : int, optional
+        Time in seconds after which a lease that is not done is considered abandoned (default: 600).
+    settle : float, optional
+        Time in seconds to wait before confirming a takeover (default: 1.0).
+
+    Examples
+    --------
+    >>> leases = LeaseManager('path/to/save_folder/.leases')
+    >>> if leases.claim(image, stamp='gtiff 1048576 1717171717000000000'):
+    ...     georeference(image)
+    ...     leases.release(image, done=True)
+
+    Methods
+    -------
+    __init__()
+        Initializes the LeaseManager object and creates the lease folder.
+
+        Parameters
+        ----------
+        lease_path : str/path
+            Folder of the lease files, shared by all the nodes.
+        node : str, optional
+            Name of this node (default: host name).
+        ttl : int, optional
+            Time in seconds after which a lease that is not done is considered abandoned (default: 600).
+        settle : float, optional
+            Time in seconds to wait before confirming a takeover (default: 1.0).
+
+        Returns
+        -------
+
+    claim(image, stamp=None)
+        Claims an image for this node.
+
+        Parameters
+        ----------
+        image : str
+            Filename of the image.
+        stamp : str, optional
+            Version of the work on the image. A lease done with another stamp does not count (default: None).
+
+        Returns
+        -------
+        bool
+            True if the image was claimed, False if it is done (with the same stamp) or held by another node.
+
+    release(image, done=True)
+        Releases an image claimed by this node.
+
+        Parameters
+        ----------
+        image : str
+            Filename of the image.
+        done : bool, optional
+            If True, the lease is marked as done; otherwise it is removed so another node can retry (default: True).
+
+        Returns
+        -------
+        bool
+            True if the lease was still owned by this node.
+
+    status(image, stamp=None)
+        Returns the state of the lease of an image.
+
+        Parameters
+        ----------
+        image : str
+            Filename of the image.
+        stamp : str, optional
+            Version of the work on the image, as given to claim() (default: None).
+
+        Returns
+        -------
+        str
+            'done', 'held' (by a node that is alive) or 'free' (no lease, or abandoned).
+
+    clear_done()
+        Removes the done leases of all the stamps, so all the images can be claimed again (e.g. to georeference them again).
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        int
+            Number of leases removed.
+
+    """
+
+    def __init__(self, lease_path, node=None, ttl=600, settle=1.0):
+        """
+        Initializes the LeaseManager object and creates the lease folder.
+
+        Parameters
+        ----------
+        lease_path : str/path
+            Folder of the lease files, shared by all the nodes.
+        node : str, optional
+            Name of this node, written in its leases (default: host name).
+        ttl : int, optional
+            Time in seconds after which a lease that is not done is considered abandoned (default: 600).
+        settle : float, optional
+            Time in seconds to wait before confirming a takeover (default: 1.0).
+        """
+        os.makedirs(lease_path, exist_ok=True)
+        self.lease_path = lease_path
+        self.node = node if node is not None else socket.gethostname()
+        self.ttl = ttl
+        self.settle = settle
+        # image -> (token, lease file) of the leases held by this process
+        self.held = {}
+        self._lock = threading.Lock()
+        self._heartbeat = None
+
+    def __getstate__(self):
+        # Sent to the worker processes: the held leases and the heartbeat thread stay in this process
+        state = self.__dict__.copy()
+        state.update(held={}, _lock=None, _heartbeat=None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _path(self, image, stamp=None):
+        """
+        Returns the path of the lease file of an image, for a stamp.
+        """
+        if stamp is None:
+            return os.path.join(self.lease_path, image + '.lease')
+        return os.path.join(self.lease_path, f'{image}.{hashlib.sha1(stamp.encode()).hexdigest()[:16]}.lease')
+
+    @staticmethod
+    def _read(path):
+        """
+        Returns the content of a lease file, or None if it does not exist.
+        """
+        try:
+            with open(path) as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def _stale(self, path):
+        """
+        Returns True if a lease has not been touched for ttl seconds.
+        """
+        try:
+            return time.time() - os.path.getmtime(path) >= self.ttl
+        except FileNotFoundError:
+            return False
+
+    def claim(self, image, stamp=None):
+        """
+        Claims an image for this node. An abandoned lease is taken over with a rename and confirmed after settle seconds.
+
+        Parameters
+        ----------
+        image : str
+            Filename of the image.
+        stamp : str, optional
+            Version of the work on the image, e.g. the options and the size and modification time of the input. A lease done with another stamp does not count (default: None).
+
+        Returns
+        -------
+        claimed : bool
+            True if the image was claimed, False if it is done (with the same stamp) or held by another node.
+        """
+        path = self._path(image, stamp)
+        token = f'{self.node} {uuid.uuid4().hex}'
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            content = self._read(path)
+            if content is None or content.startswith('done') or not self._stale(path):
+                # Removed by a node that failed (retried at the end of the run), done or held
+                return False
+            # Abandoned by a node that dropped out: take it over
+            part = f'{path}.{uuid.uuid4().hex}.part'
+            with open(part, 'w') as file:
+                file.write(token)
+            os.replace(part, path)
+            time.sleep(self.settle)
+            if self._read(path) != token:
+                return False
+        else:
+            with os.fdopen(fd, 'w') as file:
+                file.write(token)
+
+        with self._lock:
+            self.held[image] = (token, path)
+            if self._heartbeat is None or not self._heartbeat.is_alive():
+                self._heartbeat = threading.Thread(target=self._touch_held, daemon=True)
+                self._heartbeat.start()
+        return True
+
+    def _touch_held(self):
+        """
+        Touches the leases held by this process every ttl/4 seconds, until none is held.
+        """
+        while True:
+            time.sleep(self.ttl / 4)
+            with self._lock:
+                held = dict(self.held)
+            if not held:
+                return
+            for token, path in held.values():
+                if self._read(path) == token:
+                    try:
+                        os.utime(path)
+                    except FileNotFoundError:
+                        pass
+
+    def release(self, image, done=True):
+        """
+        Releases an image claimed by this node. Nothing is changed if the lease was taken over by another node meanwhile.
+
+        Parameters
+        ----------
+        image : str
+            Filename of the image.
+        done : bool, optional
+            If True, the lease is marked as done with the stamp of the claim; otherwise it is removed so another node can retry (default: True).
+
+        Returns
+        -------
+        owned : bool
+            True if the lease was still owned by this node.
+        """
+        with self._lock:
+            token, path = self.held.pop(image, (None, None))
+        if token is None or self._read(path) != token:
+            return False
+        if not done:
+            os.remove(path)
+            return True
+        part = f'{path}.{uuid.uuid4().hex}.part'
+        with open(part, 'w') as file:
+            file.write(f'done {self.node}')
+        os.replace(part, path)
+        return True
+
+    def status(self, image, stamp=None):
+        """
+        Returns the state of the lease of an image.
+
+        Parameters
+        ----------
+        image : str
+            Filename of the image.
+        stamp : str, optional
+            Version of the work on the image, as given to claim() (default: None).
+
+        Returns
+        -------
+        status : str
+            'done', 'held' (by a node that is alive) or 'free' (no lease, or abandoned).
+        """
+        path = self._path(image, stamp)
+        content = self._read(path)
+        if content is None:
+            return 'free'
+        if content.startswith('done'):
+            return 'done'
+        return 'free' if self._stale(path) else 'held'
+
+    def clear_done(self):
+        """
+        Removes the done leases of all the stamps, so all the images can be claimed again (e.g. to georeference them again). The leases held by the nodes are kept.
+
+        Returns
+        -------
+        count : int
+            Number of leases removed.
+        """
+        count = 0
+        for name in os.listdir(self.lease_path):
+            path = os.path.join(self.lease_path, name)
+            if not name.endswith('.lease') or not (self._read(path) or '').startswith('done'):
+                continue
+            try:
+                os.remove(path)
+                count += 1
+            except FileNotFoundError:
+                pass
+        return count
+
+
+    def __getattr__(self, attrib):
+        if attrib=="__version__":
+            return self.__version__
+        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{attrib}'")
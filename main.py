@@ -1,10 +1,11 @@
-# from gebot import ImageDownloader
+from gebot import ImageDownloader
 import pandas as pd
 import datetime
 import json
 import time
 
 def main(path, start=0,stop=None, config_path='./resources/config.json'):
+    # start and stop restrict the batch to a slice of the CSV; the points already downloaded are skipped by the job store of the downloader
     with open(config_path) as file:
         config = json.load(file)
     emailIDs = config['emailID']
@@ -25,7 +26,7 @@ def main(path, start=0,stop=None, config_path='./resources/config.json'):
     print(f"{datetime.datetime.now().replace(microsecond=0)} Input data processed. Number of files in the batch is {len(img_id)}")
     
     
-    downloader = ImageDownloader()
+    downloader = ImageDownloader(config_path=config_path)
     print(f"{datetime.datetime.now().replace(microsecond=0)} Download initilized")
     downloader.download_images(latitude, longitude, img_id=img_id, sleep_time=100, sleep_after=200)
 
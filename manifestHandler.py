@@ -0,0 +1,275 @@
+import json
+import os
+
+
+class GeorefManifest:
+    __version__='1.0'
+    """
+    **GeorefManifest**
+
+    A class for keeping track of the images georeferenced in an output folder, so that an interrupted or repeated run only processes new or changed images.
+
+    The manifest is a JSON file stored in the output folder. It records the size, modification time and status of each input image, together with the options used to georeference them.
+    If the options change (e.g. another output profile), the recorded images are processed again.
+
+    When several nodes georeference the same folder, each node writes its own manifest in the 'georef_manifest' subfolder (node parameter), and reads the manifests of the other nodes, so every node sees all the images done.
+
+    Parameters
+    ----------
+    save_path : str/path
+        Path of the output folder.
+    options : dict
+        Options used to georeference the images.
+    filename : str, optional
+        Name of the manifest file (default: 'georef_manifest.json').
+    node : str, optional
+        Name of the node, for runs shared by several nodes. If set, the manifest is written to 'georef_manifest/<node>.json' (default: None).
+
+    Examples
+    --------
+    >>> manifest = GeorefManifest('path/to/save_folder', options={'profile': 'gtiff'})
+    >>> if not manifest.is_done(image, size, mtime):
+    ...     georeference(image)
+    ...     manifest.update(image, size, mtime, output='image.tif')
+    >>> manifest.save()
+
+    Methods
+    -------
+    __init__()
+        Initializes the GeorefManifest object and loads the existing manifest, if any.
+
+        Parameters
+        ----------
+        save_path : str/path
+            Path of the output folder.
+        options : dict
+            Options used to georeference the images.
+        filename : str, optional
+            Name of the manifest file (default: 'georef_manifest.json').
+        node : str, optional
+            Name of the node, for runs shared by several nodes (default: None).
+
+        Returns
+        -------
+
+    load()
+        Loads the manifest and the manifests of the other nodes from the output folder. Entries recorded with other options are discarded.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+    is_done(image, size, mtime)
+        Checks if an image was already georeferenced and has not changed since.
+
+        Parameters
+        ----------
+        image : str
+            Filename of the input image.
+        size : int
+            Size of the input image in bytes.
+        mtime : int
+            Modification time of the input image in nanoseconds.
+
+        Returns
+        -------
+        bool
+            True if the image does not need to be georeferenced again.
+
+    update(image, size, mtime, output=None, error=None, bounds=None)
+        Records the result of georeferencing an image.
+
+        Parameters
+        ----------
+        image : str
+            Filename of the input image.
+        size : int
+            Size of the input image in bytes.
+        mtime : int
+            Modification time of the input image in nanoseconds.
+        output : str, optional
+            Filename of the output (default: None).
+        error : str, optional
+            Error traceback if the image failed (default: None).
+        bounds : tuple, optional
+            Bounding box (north, south, west, east) of the output (default: None).
+
+        Returns
+        -------
+
+    done()
+        Lists the images georeferenced successfully, by this node or by the other nodes.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        list
+            Sorted list of (image, output) filename tuples.
+
+    footprints()
+        Lists the bounding boxes of the images georeferenced successfully.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        dict
+            Dictionary mapping each image to its bounding box (north, south, west, east), or None if it was not recorded.
+
+    save()
+        Writes the manifest atomically, so an interrupted save never leaves a truncated manifest.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+    """
+
+    def __init__(self, save_path, options, filename='georef_manifest.json', node=None):
+        """
+        Initializes the GeorefManifest object and loads the existing manifest, if any.
+
+        Parameters
+        ----------
+        save_path : str/path
+            Path of the output folder.
+        options : dict
+            Options used to georeference the images.
+        filename : str, optional
+            Name of the manifest file (default: 'georef_manifest.json').
+        node : str, optional
+            Name of the node, for runs shared by several nodes. If set, the manifest is written to 'georef_manifest/<node>.json' (default: None).
+        """
+        self.main_path = os.path.join(save_path, filename)
+        self.nodes_path = os.path.splitext(self.main_path)[0]
+        if node is None:
+            self.path = self.main_path
+        else:
+            os.makedirs(self.nodes_path, exist_ok=True)
+            self.path = os.path.join(self.nodes_path, node + '.json')
+        self.options = options
+        self.images = {}
+        self.shared = {}
+        self.load()
+
+    def load(self):
+        """
+        Loads the manifest and the manifests of the other nodes from the output folder. Entries recorded with other options are discarded.
+        """
+        paths = [self.main_path]
+        if os.path.isdir(self.nodes_path):
+            paths += sorted(os.path.join(self.nodes_path, f) for f in os.listdir(self.nodes_path) if f.endswith('.json'))
+
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with open(path) as file:
+                data = json.load(file)
+            if data.get('options') != self.options:
+                continue
+            if path == self.path:
+                self.images = data.get('images', {})
+            else:
+                # Only the images done by the other nodes matter
+                self.shared.update((image, entry) for image, entry in data.get('images', {}).items() if entry['status'] == 'done')
+
+    def is_done(self, image, size, mtime):
+        """
+        Checks if an image was already georeferenced and has not changed since.
+
+        Parameters
+        ----------
+        image : str
+            Filename of the input image.
+        size : int
+            Size of the input image in bytes.
+        mtime : int
+            Modification time of the input image in nanoseconds.
+
+        Returns
+        -------
+        done : bool
+            True if the image does not need to be georeferenced again.
+        """
+        for entry in (self.images.get(image), self.shared.get(image)):
+            if entry is not None and entry['status'] == 'done' and entry['size'] == size and entry['mtime'] == mtime:
+                return True
+        return False
+
+    def update(self, image, size, mtime, output=None, error=None, bounds=None):
+        """
+        Records the result of georeferencing an image.
+
+        Parameters
+        ----------
+        image : str
+            Filename of the input image.
+        size : int
+            Size of the input image in bytes.
+        mtime : int
+            Modification time of the input image in nanoseconds.
+        output : str, optional
+            Filename of the output (default: None).
+        error : str, optional
+            Error traceback if the image failed (default: None).
+        bounds : tuple, optional
+            Bounding box (north, south, west, east) of the output (default: None).
+        """
+        self.images[image] = {'size': size,
+                              'mtime': mtime,
+                              'status': 'failed' if error is not None else 'done',
+                              'output': output,
+                              'error': error,
+                              'bounds': [float(value) for value in bounds] if bounds is not None else None}
+
+    def done(self):
+        """
+        Lists the images georeferenced successfully, by this node or by the other nodes.
+
+        Returns
+        -------
+        images : list
+            Sorted list of (image, output) filename tuples.
+        """
+        images = {image: entry['output'] for image, entry in self.shared.items()}
+        images.update((image, entry['output']) for image, entry in self.images.items() if entry['status'] == 'done')
+        return sorted(images.items())
+
+    def footprints(self):
+        """
+        Lists the bounding boxes of the images georeferenced successfully, by this node or by the other nodes.
+
+        Returns
+        -------
+        footprints : dict
+            Dictionary mapping each image to its bounding box (north, south, west, east), or None if it was not recorded (manifests of older runs).
+        """
+        footprints = {image: entry.get('bounds') for image, entry in self.shared.items()}
+        footprints.update((image, entry.get('bounds')) for image, entry in self.images.items() if entry['status'] == 'done')
+        return footprints
+
+    def save(self):
+        """
+        Writes the manifest atomically, so an interrupted save never leaves a truncated manifest.
+        """
+        tmppath = self.path + '.part'
+        with open(tmppath, 'w') as file:
+            json.dump({'version': 1, 'options': self.options, 'images': self.images}, file)
+        os.replace(tmppath, self.path)
+
+
+    def __getattr__(self, attrib):
+        if attrib=="__version__":
+            return self.__version__
+        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{attrib}'")
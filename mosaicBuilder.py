@@ -0,0 +1,297 @@
+import os
+import argparse
+import numpy as np
+import rasterio
+from concurrent.futures import ThreadPoolExecutor
+from rasterio.enums import Resampling
+from rasterio.windows import Window, from_bounds
+from tqdm import tqdm
+from georef import open_output
+
+
+class MosaicBuilder:
+    __version__='1.0'
+    """
+    **MosaicBuilder**
+
+    A class for merging the georeferenced tiles of an acquisition into a single tiled, compressed GeoTIFF (or COG), as an alternative to the virtual mosaic of Geotagger.genVRT.
+
+    The mosaic is written block by block: for each output block, only the source tiles overlapping it are read (in parallel threads) and resampled to the mosaic grid.
+    The memory used depends on the block size and on the number of tiles overlapping a block, not on the size of the area of interest.
+
+    Parameters
+    ----------
+    tile_paths : list
+        Paths to the georeferenced tiles (EPSG:4326, RGB uint8), e.g. the outputs of georef.main.
+    output_path : str/path
+        Path of the mosaic to write.
+    rule : str, optional
+        How overlapping tiles are merged: 'first' (first tile in tile_paths order wins), 'last' (last tile wins) or 'mean' (average of the overlapping tiles) (default: 'first').
+    profile : str, optional
+        Output profile, one of the keys of georef.PROFILES (default: 'deflate').
+    block_size : int, optional
+        Size in pixels of the square blocks the mosaic is written by (default: 1024).
+    workers : int, optional
+        Number of threads reading the source tiles (default: 4).
+
+    Examples
+    --------
+    >>> builder = MosaicBuilder(tile_paths, 'path/to/mosaic.tif', rule='mean', profile='cog')
+    >>> builder.build()
+
+    >>> python mosaicBuilder.py --inputpath path/to/save_folder --outputpath path/to/mosaic.tif --rule mean
+
+    Methods
+    -------
+    __init__()
+        Initializes the MosaicBuilder object.
+
+        Parameters
+        ----------
+        tile_paths : list
+            Paths to the georeferenced tiles.
+        output_path : str/path
+            Path of the mosaic to write.
+        rule : str, optional
+            How overlapping tiles are merged: 'first', 'last' or 'mean' (default: 'first').
+        profile : str, optional
+            Output profile, one of the keys of georef.PROFILES (default: 'deflate').
+        block_size : int, optional
+            Size in pixels of the square blocks the mosaic is written by (default: 1024).
+        workers : int, optional
+            Number of threads reading the source tiles (default: 4).
+
+        Returns
+        -------
+
+    read_bounds()
+        Reads the bounds and pixel sizes of the source tiles from their headers.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of shape (N, 4) containing the bounds (west, south, east, north) of each tile.
+
+    read_tile(path, bounds, shape)
+        Reads the part of a source tile covering the given bounds, resampled to the given shape.
+
+        Parameters
+        ----------
+        path : str
+            Path of the source tile.
+        bounds : tuple
+            Bounds (west, south, east, north) to read.
+        shape : tuple
+            Number of rows and columns of the output.
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of shape (3, rows, columns).
+
+    build()
+        Writes the mosaic.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        str
+            The path of the mosaic.
+
+    """
+
+    RULES = ('first', 'last', 'mean')
+
+    def __init__(self, tile_paths, output_path, rule='first', profile='deflate', block_size=1024, workers=4):
+        """
+        Initializes the MosaicBuilder object.
+
+        Parameters
+        ----------
+        tile_paths : list
+            Paths to the georeferenced tiles.
+        output_path : str/path
+            Path of the mosaic to write.
+        rule : str, optional
+            How overlapping tiles are merged: 'first', 'last' or 'mean' (default: 'first').
+        profile : str, optional
+            Output profile, one of the keys of georef.PROFILES (default: 'deflate').
+        block_size : int, optional
+            Size in pixels of the square blocks the mosaic is written by (default: 1024).
+        workers : int, optional
+            Number of threads reading the source tiles (default: 4).
+        """
+        if rule not in self.RULES:
+            raise ValueError(f"Unknown overlap rule '{rule}', expected one of {list(self.RULES)}")
+        self.tile_paths = list(tile_paths)
+        self.output_path = output_path
+        self.rule = rule
+        self.profile = profile
+        self.block_size = block_size
+        self.workers = workers
+        self.resolution = None
+
+    def read_bounds(self):
+        """
+        Reads the bounds and pixel sizes of the source tiles from their headers. The mosaic uses the finest pixel size of the tiles.
+
+        Returns
+        -------
+        bounds : numpy.ndarray
+            Array of shape (N, 4) containing the bounds (west, south, east, north) of each tile.
+        """
+        def header(path):
+            with rasterio.open(path) as src:
+                return tuple(src.bounds) + src.res
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            headers = np.array(list(executor.map(header, self.tile_paths)), dtype=np.float64)
+
+        self.resolution = headers[:, 4].min(), headers[:, 5].min()
+        return headers[:, :4]
+
+    @staticmethod
+    def read_tile(path, bounds, shape):
+        """
+        Reads the part of a source tile covering the given bounds, resampled (nearest neighbour) to the given shape.
+
+        Parameters
+        ----------
+        path : str
+            Path of the source tile.
+        bounds : tuple
+            Bounds (west, south, east, north) to read.
+        shape : tuple
+            Number of rows and columns of the output.
+
+        Returns
+        -------
+        data : numpy.ndarray
+            Array of shape (3, rows, columns).
+        """
+        with rasterio.open(path) as src:
+            window = from_bounds(*bounds, transform=src.transform)
+            return src.read([1, 2, 3], window=window, out_shape=(3,) + tuple(shape), resampling=Resampling.nearest)
+
+    def build(self):
+        """
+        Writes the mosaic.
+
+        Returns
+        -------
+        output_path : str
+            The path of the mosaic.
+        """
+        bounds = self.read_bounds()
+        xres, yres = self.resolution
+        west, south = bounds[:, 0].min(), bounds[:, 1].min()
+        east, north = bounds[:, 2].max(), bounds[:, 3].max()
+        width = int(np.ceil((east - west) / xres))
+        height = int(np.ceil((north - south) / yres))
+        transform = rasterio.transform.from_origin(west, north, xres, yres)
+
+        # Pixel extent of each tile in the mosaic grid
+        cols0 = np.floor((bounds[:, 0] - west) / xres + 0.5).astype(np.int64)
+        cols1 = np.floor((bounds[:, 2] - west) / xres + 0.5).astype(np.int64)
+        rows0 = np.floor((north - bounds[:, 3]) / yres + 0.5).astype(np.int64)
+        rows1 = np.floor((north - bounds[:, 1]) / yres + 0.5).astype(np.int64)
+
+        print(f'Building mosaic {self.output_path} ({width}x{height}) from {len(self.tile_paths)} tiles')
+        blocks = [(row, col) for row in range(0, height, self.block_size) for col in range(0, width, self.block_size)]
+
+        with rasterio.Env(GDAL_CACHEMAX=64, GDAL_TIFF_INTERNAL_MASK=True):
+            with open_output(self.output_path, width, height, transform, profile=self.profile, bigtiff='IF_SAFER') as dst, \
+                    ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for row, col in tqdm(blocks):
+                    bh, bw = min(self.block_size, height - row), min(self.block_size, width - col)
+                    hits = np.nonzero((cols0 < col + bw) & (cols1 > col) & (rows0 < row + bh) & (rows1 > row))[0]
+                    if len(hits) == 0:
+                        continue
+
+                    # Part of each tile falling in the block, in block pixel coordinates
+                    parts = []
+                    for i in hits:
+                        c0, c1 = max(cols0[i], col) - col, min(cols1[i], col + bw) - col
+                        r0, r1 = max(rows0[i], row) - row, min(rows1[i], row + bh) - row
+                        part_transform = transform * rasterio.Affine.translation(col + c0, row + r0)
+                        part_bounds = rasterio.transform.array_bounds(r1 - r0, c1 - c0, part_transform)
+                        parts.append((self.tile_paths[i], part_bounds, (r1 - r0, c1 - c0), (r0, r1, c0, c1)))
+
+                    datas = executor.map(lambda part: MosaicBuilder.read_tile(*part[:3]), parts)
+                    block, filled = self.merge(parts, datas, bh, bw)
+
+                    window = Window(col, row, bw, bh)
+                    dst.write(block, window=window)
+                    dst.write_mask(filled, window=window)
+
+        return self.output_path
+
+    def merge(self, parts, datas, height, width):
+        """
+        Merges the parts of the source tiles falling in a block with the overlap rule.
+
+        Parameters
+        ----------
+        parts : list
+            Path, bounds, shape and block pixel extent (r0, r1, c0, c1) of each part, in tile_paths order.
+        datas : iterable
+            Pixels of each part, in the same order.
+        height : int
+            Number of rows of the block.
+        width : int
+            Number of columns of the block.
+
+        Returns
+        -------
+        block : numpy.ndarray
+            Array of shape (3, height, width) with the merged pixels.
+        filled : numpy.ndarray
+            Boolean array of shape (height, width), True where a tile covers the block.
+        """
+        if self.rule == 'mean':
+            total = np.zeros((3, height, width), dtype=np.uint32)
+            count = np.zeros((height, width), dtype=np.uint16)
+            for (_, _, _, (r0, r1, c0, c1)), data in zip(parts, datas):
+                total[:, r0:r1, c0:c1] += data
+                count[r0:r1, c0:c1] += 1
+            filled = count > 0
+            block = (total // np.maximum(count, 1)).astype(np.uint8)
+            return block, filled
+
+        block = np.zeros((3, height, width), dtype=np.uint8)
+        filled = np.zeros((height, width), dtype=bool)
+        for (_, _, _, (r0, r1, c0, c1)), data in zip(parts, datas):
+            if self.rule == 'last':
+                block[:, r0:r1, c0:c1] = data
+            else:
+                empty = ~filled[r0:r1, c0:c1]
+                block[:, r0:r1, c0:c1][:, empty] = data[:, empty]
+            filled[r0:r1, c0:c1] = True
+        return block, filled
+
+
+    def __getattr__(self, attrib):
+        if attrib=="__version__":
+            return self.__version__
+        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{attrib}'")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process command line arguments")
+    parser.add_argument("--inputpath","-i", help="Folder of georeferenced tiles", required=True)
+    parser.add_argument("--outputpath","-o", help="Path of the mosaic", required=True)
+    parser.add_argument("--rule","-r", choices=MosaicBuilder.RULES, help="Overlap rule", default='first')
+    parser.add_argument("--profile","-p", help="Output profile", default='deflate')
+    parser.add_argument("--workers","-w", type=int, help="Number of reading threads", default=4)
+
+    args = parser.parse_args()
+
+    tile_paths = sorted(os.path.join(args.inputpath, f) for f in os.listdir(args.inputpath) if f.endswith('.tif'))
+    MosaicBuilder(tile_paths, args.outputpath, rule=args.rule, profile=args.profile, workers=args.workers).build()
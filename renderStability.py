@@ -0,0 +1,155 @@
+import time
+import numpy as np
+
+
+class RenderStability:
+    __version__='1.0'
+    """
+    **RenderStability**
+
+    A class for waiting until Google Earth has finished rendering the map, instead of sleeping for a fixed time.
+
+    Small grayscale screenshots of the map region are taken every interval seconds. The map is stable once stable_frames consecutive screenshots differ from the previous one by less than threshold gray levels on average.
+    The fixed sleeps of the downloader are kept as upper bounds: wait() never waits longer than its max_wait, so a map that keeps changing (clouds, moving imagery) costs no more than before.
+
+    Parameters
+    ----------
+    region : tuple, optional
+        Region of the screen showing the map (left, top, width, height). If set to 'None', the whole screen (default: None).
+    interval : float, optional
+        Time in seconds between two screenshots (default: 0.25).
+    threshold : float, optional
+        Mean absolute difference in gray levels below which two screenshots are the same (default: 1.0).
+    stable_frames : int, optional
+        Number of consecutive unchanged screenshots for the map to be stable (default: 3).
+    scale : int, optional
+        Reduction factor of the screenshots (default: 8).
+    min_wait : float, optional
+        Minimum time in seconds to wait, so an action the map has not reacted to yet is not taken as stable (default: 0.5).
+
+    Examples
+    --------
+    >>> render = RenderStability(region=(0, 150, 1920, 900))
+    >>> pyautogui.typewrite(['enter'])
+    >>> waited = render.wait(max_wait=4, require_change=True)
+
+    Methods
+    -------
+    __init__()
+        Initializes the RenderStability object.
+
+        Parameters
+        ----------
+        See the class parameters.
+
+        Returns
+        -------
+
+    grab()
+        Takes a reduced grayscale screenshot of the map region.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        numpy.ndarray
+            The screenshot, as a float32 array.
+
+    wait(max_wait, require_change=False)
+        Waits until the map is stable, or for max_wait seconds.
+
+        Parameters
+        ----------
+        max_wait : float
+            Maximum time to wait in seconds.
+        require_change : bool, optional
+            If True, the map is only stable after it has changed once, e.g. after a search that moves the view (default: False).
+
+        Returns
+        -------
+        float
+            Time waited in seconds.
+
+    """
+
+    def __init__(self, region=None, interval=0.25, threshold=1.0, stable_frames=3, scale=8, min_wait=0.5):
+        """
+        Initializes the RenderStability object.
+
+        Parameters
+        ----------
+        region : tuple, optional
+            Region of the screen showing the map (left, top, width, height). If set to 'None', the whole screen (default: None).
+        interval : float, optional
+            Time in seconds between two screenshots (default: 0.25).
+        threshold : float, optional
+            Mean absolute difference in gray levels below which two screenshots are the same (default: 1.0).
+        stable_frames : int, optional
+            Number of consecutive unchanged screenshots for the map to be stable (default: 3).
+        scale : int, optional
+            Reduction factor of the screenshots (default: 8).
+        min_wait : float, optional
+            Minimum time in seconds to wait (default: 0.5).
+        """
+        self.region = tuple(region) if region is not None else None
+        self.interval = interval
+        self.threshold = threshold
+        self.stable_frames = stable_frames
+        self.scale = scale
+        self.min_wait = min_wait
+
+    def grab(self):
+        """
+        Takes a reduced grayscale screenshot of the map region. Reducing before comparing keeps the comparison cheap and ignores single-pixel noise.
+
+        Returns
+        -------
+        frame : numpy.ndarray
+            The screenshot, as a float32 array.
+        """
+        import pyautogui
+        image = pyautogui.screenshot(region=self.region)
+        return np.asarray(image.convert('L').reduce(self.scale), dtype=np.float32)
+
+    def wait(self, max_wait, require_change=False):
+        """
+        Waits until the map is stable, or for max_wait seconds.
+
+        Parameters
+        ----------
+        max_wait : float
+            Maximum time to wait in seconds.
+        require_change : bool, optional
+            If True, the map is only stable after it has changed once, e.g. after a search that moves the view. A map that never changes waits for max_wait (default: False).
+
+        Returns
+        -------
+        waited : float
+            Time waited in seconds.
+        """
+        start = time.monotonic()
+        previous = self.grab()
+        changed = not require_change
+        stable = 0
+
+        while time.monotonic() - start < max_wait:
+            time.sleep(min(self.interval, max(0.0, max_wait - (time.monotonic() - start))))
+            frame = self.grab()
+            if np.abs(frame - previous).mean() < self.threshold:
+                stable += 1
+            else:
+                changed = True
+                stable = 0
+            previous = frame
+            if changed and stable >= self.stable_frames and time.monotonic() - start >= self.min_wait:
+                break
+
+        return time.monotonic() - start
+
+
+    def __getattr__(self, attrib):
+        if attrib=="__version__":
+            return self.__version__
+        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{attrib}'")
@@ -0,0 +1,199 @@
+import json
+import time
+from contextlib import contextmanager, nullcontext
+import numpy as np
+
+
+class StageTimer:
+    __version__='1.0'
+    """
+    **StageTimer**
+
+    A class for recording the duration and the bytes processed of each stage of the georeferencing (decode, color conversion, corner math, write, VRT, ...), per image.
+
+    Each record is a dict {'image', 'stage', 'seconds', 'bytes'}. The records of the worker processes are sent back with the results and added to the timer of the run (see add()).
+    When timing is disabled, NULL_TIMER is used instead: its stage() returns a shared empty context manager, so the instrumented code costs a method call per stage.
+
+    Parameters
+    ----------
+    image : str, optional
+        Filename of the image the records belong to, or 'None' for the stages of the whole run (default: None).
+
+    Examples
+    --------
+    >>> timer = StageTimer('IMG0001_LT35.1_LG22.1.png')
+    >>> with timer.stage('decode', nbytes=size):
+    ...     img = decode()
+    >>> timer.write('timings.jsonl')
+    >>> timer.summary()
+
+    Methods
+    -------
+    __init__()
+        Initializes the StageTimer object.
+
+        Parameters
+        ----------
+        image : str, optional
+            Filename of the image the records belong to (default: None).
+
+        Returns
+        -------
+
+    stage(name, nbytes=0)
+        Context manager recording the duration of a stage.
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage.
+        nbytes : int, optional
+            Number of bytes processed by the stage (default: 0).
+
+        Returns
+        -------
+
+    add(records)
+        Adds records, e.g. returned by a worker process.
+
+        Parameters
+        ----------
+        records : list
+            Records of another StageTimer.
+
+        Returns
+        -------
+
+    write(path)
+        Appends the records to a JSON lines file.
+
+        Parameters
+        ----------
+        path : str/path
+            Path of the JSON lines file.
+
+        Returns
+        -------
+
+    summary()
+        Prints the count, total, mean, median, 95th percentile and maximum duration of each stage, with a histogram of the durations.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+    """
+
+    enabled = True
+
+    def __init__(self, image=None):
+        """
+        Initializes the StageTimer object.
+
+        Parameters
+        ----------
+        image : str, optional
+            Filename of the image the records belong to, or 'None' for the stages of the whole run (default: None).
+        """
+        self.image = image
+        self.records = []
+
+    @contextmanager
+    def stage(self, name, nbytes=0):
+        """
+        Context manager recording the duration of a stage.
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage.
+        nbytes : int, optional
+            Number of bytes processed by the stage (default: 0).
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.records.append({'image': self.image, 'stage': name, 'seconds': time.perf_counter() - start, 'bytes': int(nbytes)})
+
+    def add(self, records):
+        """
+        Adds records, e.g. returned by a worker process.
+
+        Parameters
+        ----------
+        records : list
+            Records of another StageTimer.
+        """
+        self.records.extend(records)
+
+    def write(self, path):
+        """
+        Appends the records to a JSON lines file, one record per line.
+
+        Parameters
+        ----------
+        path : str/path
+            Path of the JSON lines file.
+        """
+        with open(path, 'a') as file:
+            for record in self.records:
+                file.write(json.dumps(record) + '\n')
+
+    def summary(self):
+        """
+        Prints the count, total, mean, median, 95th percentile and maximum duration of each stage, with a histogram of the durations in power of two millisecond bins.
+        """
+        stages = {}
+        for record in self.records:
+            stages.setdefault(record['stage'], []).append((record['seconds'], record['bytes']))
+
+        print(f"{'stage':>10} {'count':>7} {'total s':>9} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'MB/s':>8}")
+        for name, values in stages.items():
+            seconds = np.array([value[0] for value in values])
+            nbytes = sum(value[1] for value in values)
+            ms = seconds * 1000
+            rate = f'{nbytes / 2**20 / seconds.sum():8.1f}' if nbytes and seconds.sum() > 0 else f"{'-':>8}"
+            print(f'{name:>10} {len(ms):7d} {seconds.sum():9.3f} {ms.mean():9.2f} {np.percentile(ms, 50):9.2f} '
+                  f'{np.percentile(ms, 95):9.2f} {ms.max():9.2f} {rate}')
+
+            # Bin i holds the durations between 2**(i-1) and 2**i ms
+            bins = np.maximum(np.ceil(np.log2(np.maximum(ms, 1e-3))), 0).astype(int)
+            counts = np.bincount(bins)
+            for i, count in enumerate(counts):
+                if count:
+                    print(f"{'':>10} <{2**i:>6d} ms {'#' * max(1, int(50 * count / counts.max()))} {count}")
+
+
+    def __getattr__(self, attrib):
+        if attrib=="__version__":
+            return self.__version__
+        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{attrib}'")
+
+
+class NullTimer:
+    """
+    Timer used when timing is disabled: records nothing.
+    """
+
+    enabled = False
+    records = ()
+    _context = nullcontext()
+
+    def stage(self, name, nbytes=0):
+        return self._context
+
+    def add(self, records):
+        pass
+
+    def write(self, path):
+        pass
+
+    def summary(self):
+        pass
+
+
+NULL_TIMER = NullTimer()
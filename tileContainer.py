@@ -0,0 +1,364 @@
+import zlib
+import struct
+import sqlite3
+import threading
+import argparse
+from collections import OrderedDict
+import numpy as np
+import cv2
+import rasterio
+
+# GeoPackage 1.2: application id 'GPKG' and user version 10200
+GPKG_APPLICATION_ID = 0x47504B47
+GPKG_USER_VERSION = 10200
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+GPKG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS gpkg_spatial_ref_sys (srs_name TEXT NOT NULL, srs_id INTEGER PRIMARY KEY, organization TEXT NOT NULL,
+                                                 organization_coordsys_id INTEGER NOT NULL, definition TEXT NOT NULL, description TEXT);
+CREATE TABLE IF NOT EXISTS gpkg_contents (table_name TEXT NOT NULL PRIMARY KEY, data_type TEXT NOT NULL, identifier TEXT UNIQUE,
+                                          description TEXT DEFAULT '', last_change DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+                                          min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE, srs_id INTEGER,
+                                          CONSTRAINT fk_gc_r_srs_id FOREIGN KEY (srs_id) REFERENCES gpkg_spatial_ref_sys(srs_id));
+CREATE TABLE IF NOT EXISTS gpkg_geometry_columns (table_name TEXT NOT NULL, column_name TEXT NOT NULL, geometry_type_name TEXT NOT NULL,
+                                                  srs_id INTEGER NOT NULL, z TINYINT NOT NULL, m TINYINT NOT NULL,
+                                                  CONSTRAINT pk_geom_cols PRIMARY KEY (table_name, column_name));
+CREATE TABLE IF NOT EXISTS gpkg_tile_matrix_set (table_name TEXT NOT NULL PRIMARY KEY, srs_id INTEGER NOT NULL,
+                                                 min_x DOUBLE NOT NULL, min_y DOUBLE NOT NULL, max_x DOUBLE NOT NULL, max_y DOUBLE NOT NULL,
+                                                 CONSTRAINT fk_gtms_table_name FOREIGN KEY (table_name) REFERENCES gpkg_contents(table_name),
+                                                 CONSTRAINT fk_gtms_srs FOREIGN KEY (srs_id) REFERENCES gpkg_spatial_ref_sys (srs_id));
+CREATE TABLE IF NOT EXISTS gpkg_tile_matrix (table_name TEXT NOT NULL, zoom_level INTEGER NOT NULL, matrix_width INTEGER NOT NULL,
+                                             matrix_height INTEGER NOT NULL, tile_width INTEGER NOT NULL, tile_height INTEGER NOT NULL,
+                                             pixel_x_size DOUBLE NOT NULL, pixel_y_size DOUBLE NOT NULL,
+                                             CONSTRAINT pk_ttm PRIMARY KEY (table_name, zoom_level),
+                                             CONSTRAINT fk_tmm_table_name FOREIGN KEY (table_name) REFERENCES gpkg_contents(table_name));
+"""
+
+
+def encode_png(rgba, level=0):
+    """
+    Encodes an RGBA tile as a PNG, with no row filter and the given zlib level.
+
+    cv2.imencode filters every row and is several times slower than zlib alone; at level 0 the tile is stored as is, like the pixels of an uncompressed TIFF.
+
+    Parameters
+    ----------
+    rgba : numpy.ndarray
+        uint8 array of shape (height, width, 4).
+    level : int, optional
+        zlib compression level, from 0 (stored, fastest) to 9 (default: 0).
+
+    Returns
+    -------
+    data : bytes
+        The PNG file.
+    """
+    height, width = rgba.shape[:2]
+    raw = np.zeros((height, 1 + 4 * width), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(height, -1)
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    return (PNG_SIGNATURE + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw.tobytes(), level)) + chunk(b'IEND', b''))
+
+
+class GpkgTileWriter:
+    __version__='1.0'
+    """
+    **GpkgTileWriter**
+
+    A class for writing the georeferenced images of an acquisition into a single tile matrix of a GeoPackage, readable by GDAL as one RGBA raster.
+
+    The tile matrix is a grid of 256x256 PNG tiles covering the world in EPSG:4326, with the pixel size of the first image written and aligned on its top left corner, so the first image is pasted without resampling and a strip of images fills whole tile rows. Each image is resampled (nearest neighbour) to the grid and pasted into the tiles it covers:
+    the tiles it covers entirely are replaced, the ones on its edges are merged with the pixels already there, and the last image written wins where images overlap. A modified image written again replaces its own pixels.
+    The tiles are written with sqlite3 in transactions of commit_every images, so thousands of images make one file and a few hundred commits on the NAS, instead of thousands of TIFFs.
+    Within a transaction, the last cache_tiles tiles are kept decoded, so an edge tile shared by neighbouring images is encoded once rather than once per image.
+    The images written since the last commit are lost if the process stops, so the manifest must only be saved after commit().
+    A write and a commit can be called from different threads, e.g. the writer thread of georefPipeline and the main thread.
+
+    Parameters
+    ----------
+    path : str/path
+        Path of the GeoPackage. It is created by the first write if it does not exist.
+    table : str, optional
+        Name of the tile table (default: 'georef').
+    commit_every : int, optional
+        Number of images written per transaction (default: 64).
+    cache_tiles : int, optional
+        Maximum number of tiles kept decoded, 256 KB each (default: 256).
+    compress_level : int, optional
+        zlib level of the PNG tiles, from 0 (stored, as fast as an uncompressed TIFF) to 9 (default: 0).
+
+    Examples
+    --------
+    >>> writer = GpkgTileWriter('path/to/save_folder/tiles.gpkg')
+    >>> writer.write(img, transform)
+    >>> writer.close()
+
+    >>> python tileContainer.py --inputpath path/to/save_folder/tiles.gpkg
+
+    Methods
+    -------
+    __init__()
+        Initializes the GpkgTileWriter object, and opens or creates the GeoPackage.
+
+        Parameters
+        ----------
+        See the class parameters.
+
+        Returns
+        -------
+
+    write(img, transform)
+        Pastes an image into the tiles it covers.
+
+        Parameters
+        ----------
+        img : numpy.ndarray
+            RGB uint8 array of shape (3, height, width).
+        transform : affine.Affine
+            North-up transform of the image, in EPSG:4326.
+
+        Returns
+        -------
+        int
+            Number of tiles modified.
+
+    commit()
+        Commits the images written since the last commit and updates the extent of the raster.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+    close()
+        Commits and closes the GeoPackage.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+    """
+
+    TILE_SIZE = 256
+
+    def __init__(self, path, table='georef', commit_every=64, cache_tiles=256, compress_level=0):
+        """
+        Initializes the GpkgTileWriter object, and opens or creates the GeoPackage.
+
+        Parameters
+        ----------
+        path : str/path
+            Path of the GeoPackage. It is created if it does not exist.
+        table : str, optional
+            Name of the tile table (default: 'georef').
+        commit_every : int, optional
+            Number of images written per transaction (default: 64).
+        cache_tiles : int, optional
+            Maximum number of tiles kept decoded (default: 256).
+        compress_level : int, optional
+            zlib level of the PNG tiles, from 0 (stored) to 9 (default: 0).
+        """
+        self.path = path
+        self.table = table
+        self.commit_every = commit_every
+        self.cache_tiles = cache_tiles
+        self.compress_level = compress_level
+        # (column, row) -> RGBA tile modified since it was last written to the database
+        self.tiles = OrderedDict()
+        self.pixel_size = None
+        # Top left corner of the tile matrix
+        self.origin = None
+        self.extent = None
+        self.count = 0
+        self._lock = threading.Lock()
+
+        # Shared by the writer thread and the thread committing; the lock serialises them.
+        # The rollback journal is kept (WAL is not safe on network file systems), and a reader (e.g. QGIS) only delays a commit
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(f'PRAGMA application_id={GPKG_APPLICATION_ID}')
+        self.connection.execute(f'PRAGMA user_version={GPKG_USER_VERSION}')
+        self.connection.executescript(GPKG_SCHEMA)
+        self.connection.execute('BEGIN')
+        self.connection.execute('''CREATE TABLE IF NOT EXISTS "{}" (id INTEGER PRIMARY KEY AUTOINCREMENT, zoom_level INTEGER NOT NULL,
+                                   tile_column INTEGER NOT NULL, tile_row INTEGER NOT NULL, tile_data BLOB NOT NULL,
+                                   UNIQUE (zoom_level, tile_column, tile_row))'''.format(table))
+        srs = [('Undefined cartesian SRS', -1, 'NONE', -1, 'undefined', 'undefined cartesian coordinate reference system'),
+               ('Undefined geographic SRS', 0, 'NONE', 0, 'undefined', 'undefined geographic coordinate reference system'),
+               ('WGS 84 geodetic', 4326, 'EPSG', 4326, rasterio.crs.CRS.from_epsg(4326).to_wkt(), 'longitude/latitude coordinates in decimal degrees on the WGS 84 spheroid')]
+        self.connection.executemany('INSERT OR IGNORE INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?)', srs)
+
+        row = self.connection.execute('SELECT pixel_x_size, pixel_y_size FROM gpkg_tile_matrix WHERE table_name = ? AND zoom_level = 0', (table,)).fetchone()
+        if row is not None:
+            self.pixel_size = row
+            self.origin = self.connection.execute('SELECT min_x, max_y FROM gpkg_tile_matrix_set WHERE table_name = ?', (table,)).fetchone()
+            extent = self.connection.execute('SELECT min_x, min_y, max_x, max_y FROM gpkg_contents WHERE table_name = ?', (table,)).fetchone()
+            self.extent = extent if extent is not None and None not in extent else None
+        self._commit()
+
+    def _create_matrix(self, transform):
+        """
+        Registers the tile table with a tile matrix covering the world, with the pixel size of the given transform and a tile corner on its top left corner.
+        """
+        size = self.TILE_SIZE
+        xres, yres = transform.a, -transform.e
+        # Whole tiles from the image corner to the antimeridian and the pole
+        west = transform.c - np.floor((transform.c + 180) / (size * xres)) * size * xres
+        north = transform.f + np.floor((90 - transform.f) / (size * yres)) * size * yres
+        width, height = int(np.ceil((180 - west) / (size * xres))), int(np.ceil((north + 90) / (size * yres)))
+        self.connection.execute("INSERT INTO gpkg_contents (table_name, data_type, identifier, srs_id) VALUES (?, 'tiles', ?, 4326)",
+                                (self.table, self.table))
+        self.connection.execute('INSERT INTO gpkg_tile_matrix_set VALUES (?, 4326, ?, ?, ?, ?)',
+                                (self.table, west, north - height * size * yres, west + width * size * xres, north))
+        self.connection.execute('INSERT INTO gpkg_tile_matrix VALUES (?, 0, ?, ?, ?, ?, ?, ?)', (self.table, width, height, size, size, xres, yres))
+        self.pixel_size = (xres, yres)
+        self.origin = (west, north)
+
+    def _tile(self, column, row, read=True):
+        """
+        Returns a tile as an RGBA array to modify: from the cache, else from the database if read is True, else empty. The tile is then kept in the cache.
+        """
+        key = (column, row)
+        tile = self.tiles.pop(key, None)
+        if tile is None and read:
+            blob = self.connection.execute(f'SELECT tile_data FROM "{self.table}" WHERE zoom_level = 0 AND tile_column = ? AND tile_row = ?',
+                                           key).fetchone()
+            if blob is not None:
+                tile = cv2.cvtColor(cv2.imdecode(np.frombuffer(blob[0], dtype=np.uint8), cv2.IMREAD_UNCHANGED), cv2.COLOR_BGRA2RGBA)
+        if tile is None:
+            tile = np.zeros((self.TILE_SIZE, self.TILE_SIZE, 4), dtype=np.uint8)
+        self.tiles[key] = tile
+        # The least recently modified tiles are written, so the cache is bounded
+        while len(self.tiles) > self.cache_tiles:
+            self._flush_tile(*self.tiles.popitem(last=False))
+        return tile
+
+    def _flush_tile(self, key, tile):
+        """
+        Encodes a tile and writes it to the database.
+        """
+        self.connection.execute(f'INSERT OR REPLACE INTO "{self.table}" (zoom_level, tile_column, tile_row, tile_data) VALUES (0, ?, ?, ?)',
+                                key + (encode_png(tile, self.compress_level),))
+
+    def write(self, img, transform):
+        """
+        Pastes an image into the tiles it covers. The tiles covered entirely are replaced; the ones on the edges are merged with their pixels from other images.
+
+        Parameters
+        ----------
+        img : numpy.ndarray
+            RGB uint8 array of shape (3, height, width).
+        transform : affine.Affine
+            North-up transform of the image, in EPSG:4326.
+
+        Returns
+        -------
+        written : int
+            Number of tiles modified.
+        """
+        size = self.TILE_SIZE
+        height, width = img.shape[1:]
+        w, n = transform.c, transform.f
+        e, s = w + transform.a * width, n + transform.e * height
+
+        with self._lock:
+            if self.pixel_size is None:
+                self._create_matrix(transform)
+            xres, yres = self.pixel_size
+            west, north = self.origin
+
+            # Grid pixels whose center falls in the image, and the image pixel under each center
+            col0, col1 = int(np.ceil((w - west) / xres - 0.5)), int(np.ceil((e - west) / xres - 0.5))
+            row0, row1 = int(np.ceil((north - n) / yres - 0.5)), int(np.ceil((north - s) / yres - 0.5))
+            if col1 <= col0 or row1 <= row0:
+                return 0
+            cols = np.clip(((west + (np.arange(col0, col1) + 0.5) * xres - w) / transform.a).astype(np.int64), 0, width - 1)
+            rows = np.clip(((north - (np.arange(row0, row1) + 0.5) * yres - n) / transform.e).astype(np.int64), 0, height - 1)
+            # An image on the pixel grid is sliced; otherwise two 1D takes are several times faster than one 2D fancy index
+            if rows[-1] - rows[0] == len(rows) - 1 and cols[-1] - cols[0] == len(cols) - 1:
+                rgb = img[:, rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+            else:
+                rgb = img.take(rows, axis=1).take(cols, axis=2)
+            rgb = np.moveaxis(rgb, 0, -1)
+
+            written = 0
+            for tile_row in range(row0 // size, (row1 - 1) // size + 1):
+                for tile_column in range(col0 // size, (col1 - 1) // size + 1):
+                    # Part of the tile covered by the image, in tile and in resampled image pixels
+                    r0, r1 = max(row0, tile_row * size), min(row1, (tile_row + 1) * size)
+                    c0, c1 = max(col0, tile_column * size), min(col1, (tile_column + 1) * size)
+                    # A tile covered entirely is not read back
+                    tile = self._tile(tile_column, tile_row, read=r1 - r0 < size or c1 - c0 < size)
+                    tr, tc = r0 - tile_row * size, c0 - tile_column * size
+                    tile[tr:tr + r1 - r0, tc:tc + c1 - c0, :3] = rgb[r0 - row0:r1 - row0, c0 - col0:c1 - col0]
+                    tile[tr:tr + r1 - r0, tc:tc + c1 - c0, 3] = 255
+                    written += 1
+
+            bounds = (w, s, e, n)
+            if self.extent is None:
+                self.extent = bounds
+            else:
+                self.extent = (min(self.extent[0], w), min(self.extent[1], s), max(self.extent[2], e), max(self.extent[3], n))
+            self.count += 1
+            if self.count % self.commit_every == 0:
+                self._commit()
+        return written
+
+    def _commit(self, begin=True):
+        """
+        Writes the cached tiles, records the extent of the raster, commits the transaction and begins the next one. Called with the lock held.
+        """
+        while self.tiles:
+            self._flush_tile(*self.tiles.popitem(last=False))
+        if self.extent is not None:
+            self.connection.execute("UPDATE gpkg_contents SET min_x = ?, min_y = ?, max_x = ?, max_y = ?, last_change = strftime('%Y-%m-%dT%H:%M:%fZ','now') WHERE table_name = ?",
+                                    tuple(self.extent) + (self.table,))
+        self.connection.execute('COMMIT')
+        if begin:
+            # Deferred: the write lock is only taken by the next write
+            self.connection.execute('BEGIN')
+
+    def commit(self):
+        """
+        Commits the images written since the last commit and updates the extent of the raster, e.g. before saving the manifest.
+        """
+        with self._lock:
+            self._commit()
+
+    def close(self):
+        """
+        Commits and closes the GeoPackage.
+        """
+        with self._lock:
+            self._commit(begin=False)
+            self.connection.close()
+
+
+    def __getattr__(self, attrib):
+        if attrib=="__version__":
+            return self.__version__
+        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{attrib}'")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process command line arguments")
+    parser.add_argument("--inputpath","-i", help="Path of the GeoPackage", required=True)
+
+    args = parser.parse_args()
+
+    # Reports what GDAL reads from the container
+    with rasterio.open(args.inputpath) as src:
+        print(f'{args.inputpath}: {src.width}x{src.height} pixels, {src.count} bands, bounds {tuple(src.bounds)}, resolution {src.res}')
+    with sqlite3.connect(args.inputpath) as db:
+        for table, in db.execute("SELECT table_name FROM gpkg_contents WHERE data_type = 'tiles'"):
+            count = db.execute('SELECT COUNT(*) FROM "{}"'.format(table)).fetchone()[0]
+            print(f'{table}: {count} tiles')
@@ -0,0 +1,379 @@
+import os
+import math
+import json
+import argparse
+import numpy as np
+import cv2
+import rasterio
+from concurrent.futures import ProcessPoolExecutor
+from rasterio.enums import Resampling
+from rasterio.transform import from_origin
+from rasterio.warp import reproject
+from tqdm import tqdm
+
+# Half of the extent of the Web Mercator (EPSG:3857) square in meters
+ORIGIN = 20037508.342789244
+
+
+class XYZExporter:
+    __version__='1.0'
+    """
+    **XYZExporter**
+
+    A class for exporting georeferenced images (EPSG:4326) as a Web Mercator XYZ tile pyramid ('<z>/<x>/<y>.png', y from the top, as used by Leaflet, OpenLayers and QGIS), without a gdal2tiles pass over the VRT.
+
+    The tiles of the deepest zoom are warped from the source images overlapping them (the first source in tile_paths order wins where sources overlap). Each lower zoom is then built from the four child tiles, so a source is only read once.
+    The tiles of a zoom are rendered in parallel by worker processes.
+
+    The export is incremental: the modification time and bounds of the sources, and the zooms, are recorded in 'xyz_sources.json' in the output folder. On the next export, only the tiles overlapping new, modified or removed sources, and their parents, are rendered again.
+    The zooms derived by the first export are kept by the next ones, so a growing acquisition does not change them. A new max_zoom renders everything again; a lower min_zoom only renders the new zooms.
+
+    Parameters
+    ----------
+    tile_paths : list
+        Paths to the georeferenced images, e.g. GeorefRun.georeferenced_files().
+    output_path : str/path
+        Folder of the tile pyramid.
+    max_zoom : int, optional
+        Deepest zoom. If set to 'None', the one of the last export, else the zoom closest to the resolution of the sources (default: None).
+    min_zoom : int, optional
+        Shallowest zoom. If set to 'None', the one of the last export, else the deepest zoom at which the sources fit in one tile (default: None).
+    workers : int, optional
+        Number of worker processes. If set to 'None', the number of CPUs (default: None).
+    resampling : str, optional
+        Resampling method of the deepest zoom, e.g. 'nearest' or 'bilinear' (default: 'bilinear').
+
+    Examples
+    --------
+    >>> exporter = XYZExporter(run.georeferenced_files(), 'path/to/xyz')
+    >>> exporter.export()
+
+    >>> python tileExporter.py --inputpath path/to/save_folder --outputpath path/to/xyz --workers 8
+
+    Methods
+    -------
+    __init__()
+        Initializes the XYZExporter object.
+
+        Parameters
+        ----------
+        See the class parameters.
+
+        Returns
+        -------
+
+    tile_range(bounds, zoom)
+        Computes the XYZ tiles covering bounds at a zoom.
+
+        Parameters
+        ----------
+        bounds : numpy.ndarray
+            Array of shape (N, 4) with the bounds (west, south, east, north) in degrees.
+        zoom : int
+            Zoom level.
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of shape (N, 4) with the first and last tile columns and rows (x0, y0, x1, y1), inclusive.
+
+    export()
+        Renders the tiles affected by the sources changed since the last export.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        int
+            Number of tiles rendered.
+
+    """
+
+    STATE_FILE = 'xyz_sources.json'
+    TILE_SIZE = 256
+
+    def __init__(self, tile_paths, output_path, max_zoom=None, min_zoom=None, workers=None, resampling='bilinear'):
+        """
+        Initializes the XYZExporter object.
+
+        Parameters
+        ----------
+        tile_paths : list
+            Paths to the georeferenced images.
+        output_path : str/path
+            Folder of the tile pyramid.
+        max_zoom : int, optional
+            Deepest zoom, or 'None' to reuse the one of the last export or derive it from the sources (default: None).
+        min_zoom : int, optional
+            Shallowest zoom, or 'None' to reuse the one of the last export or derive it from the sources (default: None).
+        workers : int, optional
+            Number of worker processes (default: None).
+        resampling : str, optional
+            Resampling method of the deepest zoom (default: 'bilinear').
+        """
+        self.tile_paths = list(tile_paths)
+        self.output_path = output_path
+        self.max_zoom = max_zoom
+        self.min_zoom = min_zoom
+        self.workers = workers
+        self.resampling = resampling
+
+    @staticmethod
+    def tile_range(bounds, zoom):
+        """
+        Computes the XYZ tiles covering bounds at a zoom.
+
+        Parameters
+        ----------
+        bounds : numpy.ndarray
+            Array of shape (N, 4) with the bounds (west, south, east, north) in degrees.
+        zoom : int
+            Zoom level.
+
+        Returns
+        -------
+        ranges : numpy.ndarray
+            Array of shape (N, 4) with the first and last tile columns and rows (x0, y0, x1, y1), inclusive.
+        """
+        bounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 4)
+        n = 2 ** zoom
+        eps = 1e-9
+
+        def x_of(lon):
+            return (lon + 180) / 360 * n
+
+        def y_of(lat):
+            lat = np.radians(np.clip(lat, -85.0511, 85.0511))
+            return (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / np.pi) / 2 * n
+
+        x0 = np.floor(x_of(bounds[:, 0]))
+        x1 = np.floor(x_of(bounds[:, 2]) - eps)
+        y0 = np.floor(y_of(bounds[:, 3]))
+        y1 = np.floor(y_of(bounds[:, 1]) - eps)
+        return np.clip(np.stack([x0, y0, x1, y1], axis=1), 0, n - 1).astype(np.int64)
+
+    @staticmethod
+    def tile_transform(zoom, x, y):
+        """
+        Returns the affine transform of a tile in EPSG:3857.
+        """
+        size = 2 * ORIGIN / 2 ** zoom
+        return from_origin(-ORIGIN + x * size, ORIGIN - y * size, size / XYZExporter.TILE_SIZE, size / XYZExporter.TILE_SIZE)
+
+    def read_sources(self):
+        """
+        Reads the modification time and bounds of the sources, reusing the recorded bounds of the unchanged ones.
+
+        Returns
+        -------
+        sources : dict
+            Dictionary mapping each source path to [mtime_ns, west, south, east, north].
+        previous : dict
+            State recorded by the last export: its 'zooms' and 'sources' (empty for the first export).
+        """
+        state_path = os.path.join(self.output_path, self.STATE_FILE)
+        previous = {}
+        if os.path.exists(state_path):
+            with open(state_path) as file:
+                previous = json.load(file)
+        recorded = previous.get('sources', {})
+
+        sources = {}
+        for path in self.tile_paths:
+            mtime = os.stat(path).st_mtime_ns
+            if path in recorded and recorded[path][0] == mtime:
+                sources[path] = recorded[path]
+                continue
+            with rasterio.open(path) as src:
+                sources[path] = [mtime] + list(src.bounds)
+        return sources, previous
+
+    def export(self):
+        """
+        Renders the tiles affected by the sources changed since the last export: the tiles of the deepest zoom overlapping them, then their parents up to min_zoom.
+        The zooms below the min_zoom of the last export are rendered entirely.
+
+        Returns
+        -------
+        count : int
+            Number of tiles rendered.
+        """
+        if not self.tile_paths:
+            return 0
+        os.makedirs(self.output_path, exist_ok=True)
+        sources, previous = self.read_sources()
+        paths = list(sources)
+        bounds = np.array([sources[path][1:] for path in paths]).reshape(-1, 4)
+
+        # The zooms of the last export, unless set: derived again, they would move with the extent of the sources
+        last_min_zoom, last_max_zoom = previous.get('zooms', [None, None])
+        if self.max_zoom is None:
+            self.max_zoom = last_max_zoom
+        if self.min_zoom is None and self.max_zoom == last_max_zoom:
+            self.min_zoom = last_min_zoom
+        if self.max_zoom is None:
+            # Zoom whose pixel size is the closest to the one of the sources: a tile spans 360 / 2**zoom degrees of longitude
+            with rasterio.open(paths[0]) as src:
+                self.max_zoom = int(round(math.log2(360 / self.TILE_SIZE / src.res[0])))
+        if self.min_zoom is None:
+            extent = np.array([[bounds[:, 0].min(), bounds[:, 1].min(), bounds[:, 2].max(), bounds[:, 3].max()]])
+            self.min_zoom = self.max_zoom
+            while self.min_zoom > 0 and np.any(self.tile_range(extent, self.min_zoom)[0, :2] != self.tile_range(extent, self.min_zoom)[0, 2:]):
+                self.min_zoom -= 1
+
+        # Sources new, modified or removed since the last export. Another deepest zoom renders everything again
+        if self.max_zoom != last_max_zoom:
+            previous, last_min_zoom = {}, self.min_zoom
+        previous = previous.get('sources', {})
+        changed = [path for path in paths if previous.get(path) != sources[path]]
+        changed += [path for path in previous if path not in sources]
+        changed_bounds = np.array([(sources.get(path) or previous[path])[1:] for path in changed]).reshape(-1, 4)
+
+        tiles = set()
+        for x0, y0, x1, y1 in self.tile_range(changed_bounds, self.max_zoom):
+            tiles.update((x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+        print(f'{len(changed)} sources changed, rendering {len(tiles)} tiles at zoom {self.max_zoom} and their parents down to zoom {self.min_zoom}')
+        if self.min_zoom < last_min_zoom:
+            print(f'Rendering zooms {self.min_zoom} to {last_min_zoom - 1}, below the last export')
+
+        count = 0
+        ranges = self.tile_range(bounds, self.max_zoom)
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            jobs = []
+            for x, y in sorted(tiles):
+                hits = np.nonzero((ranges[:, 0] <= x) & (ranges[:, 2] >= x) & (ranges[:, 1] <= y) & (ranges[:, 3] >= y))[0]
+                jobs.append((self.output_path, self.max_zoom, x, y, [paths[i] for i in hits], self.resampling))
+            count += sum(tqdm(executor.map(_render_tile, jobs, chunksize=max(1, len(jobs) // 64)), total=len(jobs)))
+
+            for zoom in range(self.max_zoom - 1, self.min_zoom - 1, -1):
+                tiles = {(x // 2, y // 2) for x, y in tiles}
+                if zoom < last_min_zoom:
+                    # Not rendered by the last export: all the tiles of the sources
+                    for x0, y0, x1, y1 in self.tile_range(bounds, zoom):
+                        tiles.update((x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+                jobs = [(self.output_path, zoom, x, y) for x, y in sorted(tiles)]
+                count += sum(executor.map(_render_parent, jobs, chunksize=max(1, len(jobs) // 64)))
+
+        # Recorded last, so an interrupted export renders the same tiles again
+        with open(os.path.join(self.output_path, self.STATE_FILE + '.part'), 'w') as file:
+            json.dump({'zooms': [self.min_zoom, self.max_zoom], 'sources': sources}, file)
+        os.replace(os.path.join(self.output_path, self.STATE_FILE + '.part'), os.path.join(self.output_path, self.STATE_FILE))
+        return count
+
+
+    def __getattr__(self, attrib):
+        if attrib=="__version__":
+            return self.__version__
+        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{attrib}'")
+
+
+def _tile_file(output_path, zoom, x, y):
+    """
+    Returns the path of a tile of the pyramid.
+    """
+    return os.path.join(output_path, str(zoom), str(x), f'{y}.png')
+
+
+def _save_tile(path, rgba):
+    """
+    Writes an RGBA tile atomically, or removes it if it is empty.
+
+    Returns
+    -------
+    written : int
+        1 if the tile was written, 0 if it is empty.
+    """
+    if not rgba[3].any():
+        if os.path.exists(path):
+            os.remove(path)
+        return 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    bgra = cv2.cvtColor(np.ascontiguousarray(np.moveaxis(rgba, 0, -1)), cv2.COLOR_RGBA2BGRA)
+    cv2.imwrite(path + '.part.png', bgra)
+    os.replace(path + '.part.png', path)
+    return 1
+
+
+def _render_tile(job):
+    """
+    Renders a tile of the deepest zoom by warping the sources overlapping it. Unit of work of the worker processes.
+
+    Parameters
+    ----------
+    job : tuple
+        Output folder, zoom, x, y, paths of the sources overlapping the tile and resampling method.
+
+    Returns
+    -------
+    written : int
+        1 if the tile was written, 0 if it is empty.
+    """
+    output_path, zoom, x, y, paths, resampling = job
+    size = XYZExporter.TILE_SIZE
+    transform = XYZExporter.tile_transform(zoom, x, y)
+    tile = np.zeros((4, size, size), dtype=np.uint8)
+    part = np.empty_like(tile)
+
+    for path in paths:
+        part[:] = 0
+        with rasterio.open(path) as src:
+            reproject(rasterio.band(src, [1, 2, 3]), part, dst_transform=transform, dst_crs='EPSG:3857',
+                      dst_alpha=4, resampling=Resampling[resampling])
+        # The first source wins where the sources overlap
+        empty = tile[3] == 0
+        tile[:, empty] = part[:, empty]
+        if tile[3].all():
+            break
+
+    return _save_tile(_tile_file(output_path, zoom, x, y), tile)
+
+
+def _render_parent(job):
+    """
+    Renders a tile from its four children, averaging the colors weighted by their alpha so the edges of the sources do not get darker.
+
+    Parameters
+    ----------
+    job : tuple
+        Output folder, zoom, x and y of the tile.
+
+    Returns
+    -------
+    written : int
+        1 if the tile was written, 0 if it is empty.
+    """
+    output_path, zoom, x, y = job
+    size = XYZExporter.TILE_SIZE
+    block = np.zeros((2 * size, 2 * size, 4), dtype=np.uint8)
+    for dx in (0, 1):
+        for dy in (0, 1):
+            path = _tile_file(output_path, zoom + 1, 2 * x + dx, 2 * y + dy)
+            if os.path.exists(path):
+                block[dy * size:(dy + 1) * size, dx * size:(dx + 1) * size] = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+
+    alpha = block[:, :, 3:].astype(np.float32) / 255
+    color = cv2.resize(block[:, :, :3].astype(np.float32) * alpha, (size, size), interpolation=cv2.INTER_AREA)
+    alpha = cv2.resize(alpha[:, :, 0], (size, size), interpolation=cv2.INTER_AREA)
+    bgr = color / np.maximum(alpha, 1e-6)[:, :, None]
+    bgra = np.dstack([bgr, alpha * 255]).round().clip(0, 255).astype(np.uint8)
+
+    rgba = np.moveaxis(cv2.cvtColor(bgra, cv2.COLOR_BGRA2RGBA), -1, 0)
+    return _save_tile(_tile_file(output_path, zoom, x, y), rgba)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process command line arguments")
+    parser.add_argument("--inputpath","-i", help="Folder of georeferenced images", required=True)
+    parser.add_argument("--outputpath","-o", help="Folder of the tile pyramid", required=True)
+    parser.add_argument("--max-zoom", type=int, help="Deepest zoom (default: from the resolution of the images)", default=None)
+    parser.add_argument("--min-zoom", type=int, help="Shallowest zoom (default: the images fit in one tile)", default=None)
+    parser.add_argument("--workers","-w", type=int, help="Number of worker processes", default=None)
+    parser.add_argument("--resampling","-r", help="Resampling method of the deepest zoom", default='bilinear')
+
+    args = parser.parse_args()
+
+    tile_paths = sorted(os.path.join(args.inputpath, f) for f in os.listdir(args.inputpath) if f.endswith('.tif'))
+    XYZExporter(tile_paths, args.outputpath, max_zoom=args.max_zoom, min_zoom=args.min_zoom,
+                workers=args.workers, resampling=args.resampling).export()
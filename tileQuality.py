@@ -0,0 +1,302 @@
+import os
+import csv
+import argparse
+import numpy as np
+import cv2
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TileQuality:
+    __version__='1.0'
+    """
+    **TileQuality**
+
+    A class for detecting the blank, grey or partly loaded captures that Google Earth sometimes saves, so they are downloaded again before being georeferenced and mosaicked.
+
+    Each image is decoded as a grayscale image reduced by a factor 'reduce' (cheap for JPEG, and the checks do not need the full resolution) and scored with vectorized numpy operations:
+
+    - blank : fraction of the pixels having the most frequent gray value (a blank or grey frame is close to 1),
+    - std : standard deviation of the gray values (a frame without content has a low variance),
+    - flat : fraction of the block x block cells whose standard deviation is below flat_std (tiles that were not loaded yet are rendered as flat squares).
+
+    An image is bad if blank > blank_threshold, std < std_threshold or flat > flat_threshold. Large water bodies can look flat as well, so the thresholds may need to be raised for coastal areas.
+
+    Parameters
+    ----------
+    blank_threshold : float, optional
+        Maximum fraction of pixels with the most frequent value (default: 0.5).
+    std_threshold : float, optional
+        Minimum standard deviation of the gray values (default: 6.0).
+    flat_threshold : float, optional
+        Maximum fraction of flat cells (default: 0.25).
+    block : int, optional
+        Size in pixels of the cells of the reduced image (default: 32).
+    flat_std : float, optional
+        Standard deviation below which a cell is flat (default: 2.0).
+    reduce : int, optional
+        Reduction factor of the decoding: 1, 2, 4 or 8 (default: 4).
+
+    Examples
+    --------
+    >>> quality = TileQuality()
+    >>> quality.check('path/to/IMG0001_LT35.1_LG22.1.png')
+    {'file': 'IMG0001_LT35.1_LG22.1.png', 'blank': 0.01, 'std': 41.2, 'flat': 0.0, 'bad': False, 'reasons': ''}
+    >>> bad = quality.check_folder('path/to/savePath', requeue_path='path/to/savePath/requeue.csv')
+
+    >>> python tileQuality.py --inputpath path/to/savePath
+
+    Methods
+    -------
+    __init__()
+        Initializes the TileQuality object.
+
+        Parameters
+        ----------
+        See the class parameters.
+
+        Returns
+        -------
+
+    scores(gray, block=32, flat_std=2.0)
+        Computes the blank, std and flat scores of a grayscale image.
+
+        Parameters
+        ----------
+        gray : numpy.ndarray
+            Grayscale uint8 image.
+        block : int, optional
+            Size in pixels of the cells (default: 32).
+        flat_std : float, optional
+            Standard deviation below which a cell is flat (default: 2.0).
+
+        Returns
+        -------
+        dict
+            The scores 'blank', 'std' and 'flat'.
+
+    check(path)
+        Scores an image file.
+
+        Parameters
+        ----------
+        path : str/path
+            Path of the image.
+
+        Returns
+        -------
+        dict
+            The filename, the scores, 'bad' and the 'reasons' it is bad.
+
+    check_folder(path, images=None, requeue_path=None, workers=4)
+        Scores the images of a folder in parallel threads and writes the bad ones to a requeue list.
+
+        Parameters
+        ----------
+        path : str/path
+            Folder of the images.
+        images : list, optional
+            Filenames of the images to check. If set to 'None', all the PNG/JPG images of the folder (default: None).
+        requeue_path : str/path, optional
+            Path of the requeue CSV, or 'None' (default: None).
+        workers : int, optional
+            Number of threads (default: 4).
+
+        Returns
+        -------
+        list
+            Results of check() for the bad images.
+
+    write_requeue(results, requeue_path)
+        Appends bad images to a requeue CSV with the 'id', 'Long' and 'Lat' columns of the grid points CSV, so it can be given to the downloader again.
+
+        Parameters
+        ----------
+        results : list
+            Results of check() for the bad images.
+        requeue_path : str/path
+            Path of the requeue CSV.
+
+        Returns
+        -------
+
+    """
+
+    REDUCED_FLAGS = {1: cv2.IMREAD_GRAYSCALE, 2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+                     4: cv2.IMREAD_REDUCED_GRAYSCALE_4, 8: cv2.IMREAD_REDUCED_GRAYSCALE_8}
+
+    def __init__(self, blank_threshold=0.5, std_threshold=6.0, flat_threshold=0.25, block=32, flat_std=2.0, reduce=4):
+        """
+        Initializes the TileQuality object.
+
+        Parameters
+        ----------
+        blank_threshold : float, optional
+            Maximum fraction of pixels with the most frequent value (default: 0.5).
+        std_threshold : float, optional
+            Minimum standard deviation of the gray values (default: 6.0).
+        flat_threshold : float, optional
+            Maximum fraction of flat cells (default: 0.25).
+        block : int, optional
+            Size in pixels of the cells of the reduced image (default: 32).
+        flat_std : float, optional
+            Standard deviation below which a cell is flat (default: 2.0).
+        reduce : int, optional
+            Reduction factor of the decoding: 1, 2, 4 or 8 (default: 4).
+        """
+        if reduce not in self.REDUCED_FLAGS:
+            raise ValueError(f"Unknown reduction factor {reduce}, expected one of {list(self.REDUCED_FLAGS)}")
+        self.blank_threshold = blank_threshold
+        self.std_threshold = std_threshold
+        self.flat_threshold = flat_threshold
+        self.block = block
+        self.flat_std = flat_std
+        self.reduce = reduce
+
+    @staticmethod
+    def scores(gray, block=32, flat_std=2.0):
+        """
+        Computes the blank, std and flat scores of a grayscale image.
+
+        Parameters
+        ----------
+        gray : numpy.ndarray
+            Grayscale uint8 image.
+        block : int, optional
+            Size in pixels of the cells (default: 32).
+        flat_std : float, optional
+            Standard deviation below which a cell is flat (default: 2.0).
+
+        Returns
+        -------
+        scores : dict
+            The scores 'blank', 'std' and 'flat'.
+        """
+        histogram = np.bincount(gray.ravel(), minlength=256)
+        blank = histogram.max() / gray.size
+        # Mean and variance from the histogram, without a float copy of the image
+        values = np.arange(256)
+        mean = (histogram * values).sum() / gray.size
+        std = np.sqrt(max((histogram * values ** 2).sum() / gray.size - mean ** 2, 0.0))
+
+        rows, cols = gray.shape[0] // block, gray.shape[1] // block
+        if rows == 0 or cols == 0:
+            flat = 0.0
+        else:
+            cells = gray[:rows * block, :cols * block].reshape(rows, block, cols, block).astype(np.float32)
+            flat = float((cells.std(axis=(1, 3)) < flat_std).mean())
+
+        return {'blank': round(float(blank), 4), 'std': round(float(std), 2), 'flat': round(flat, 4)}
+
+    def check(self, path):
+        """
+        Scores an image file.
+
+        Parameters
+        ----------
+        path : str/path
+            Path of the image.
+
+        Returns
+        -------
+        result : dict
+            The filename, the scores, 'bad' and the 'reasons' it is bad (separated by spaces). An image that cannot be decoded is bad with the reason 'unreadable'.
+        """
+        result = {'file': os.path.basename(path)}
+        gray = cv2.imread(path, self.REDUCED_FLAGS[self.reduce])
+        if gray is None:
+            result.update(blank=None, std=None, flat=None, bad=True, reasons='unreadable')
+            return result
+
+        result.update(self.scores(gray, self.block, self.flat_std))
+        reasons = []
+        if result['blank'] > self.blank_threshold:
+            reasons.append('blank')
+        if result['std'] < self.std_threshold:
+            reasons.append('low_variance')
+        if result['flat'] > self.flat_threshold:
+            reasons.append('missing_tiles')
+        result.update(bad=bool(reasons), reasons=' '.join(reasons))
+        return result
+
+    def check_folder(self, path, images=None, requeue_path=None, workers=4):
+        """
+        Scores the images of a folder in parallel threads (OpenCV releases the GIL while decoding) and writes the bad ones to a requeue list.
+
+        Parameters
+        ----------
+        path : str/path
+            Folder of the images.
+        images : list, optional
+            Filenames of the images to check. If set to 'None', all the PNG/JPG images of the folder (default: None).
+        requeue_path : str/path, optional
+            Path of the requeue CSV. If set to 'None', no list is written (default: None).
+        workers : int, optional
+            Number of threads (default: 4).
+
+        Returns
+        -------
+        bad : list
+            Results of check() for the bad images.
+        """
+        if images is None:
+            images = sorted(f for f in os.listdir(path) if f.lower().endswith(('.png', '.jpg', '.jpeg')))
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(lambda image: self.check(os.path.join(path, image)), images))
+
+        bad = [result for result in results if result['bad']]
+        if bad and requeue_path is not None:
+            self.write_requeue(bad, requeue_path)
+        return bad
+
+    @staticmethod
+    def write_requeue(results, requeue_path):
+        """
+        Appends bad images to a requeue CSV with the 'id', 'Long' and 'Lat' columns of the grid points CSV, so it can be given to the downloader again.
+
+        Parameters
+        ----------
+        results : list
+            Results of check() for the bad images.
+        requeue_path : str/path
+            Path of the requeue CSV.
+        """
+        fields = ['id', 'Long', 'Lat', 'file', 'blank', 'std', 'flat', 'reasons']
+        new = not os.path.exists(requeue_path)
+        with open(requeue_path, 'a', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=fields, extrasaction='ignore')
+            if new:
+                writer.writeheader()
+            for result in results:
+                # Filenames of the downloader: 'IMG<id>_LT<lat>_LG<long>.png'
+                parts = os.path.splitext(result['file'])[0].split('_')
+                try:
+                    point = {'id': int(parts[0][3:]), 'Lat': parts[1][2:], 'Long': parts[2][2:]}
+                except (IndexError, ValueError):
+                    point = {}
+                writer.writerow(dict(result, **point))
+
+
+    def __getattr__(self, attrib):
+        if attrib=="__version__":
+            return self.__version__
+        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{attrib}'")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process command line arguments")
+    parser.add_argument("--inputpath","-i", help="Folder of the downloaded images", required=True)
+    parser.add_argument("--requeue","-r", help="Path of the requeue CSV (default: requeue.csv in the input folder)", default=None)
+    parser.add_argument("--workers","-w", type=int, help="Number of threads", default=4)
+    parser.add_argument("--blank", type=float, help="Maximum fraction of pixels with the most frequent value", default=0.5)
+    parser.add_argument("--std", type=float, help="Minimum standard deviation of the gray values", default=6.0)
+    parser.add_argument("--flat", type=float, help="Maximum fraction of flat cells", default=0.25)
+
+    args = parser.parse_args()
+
+    requeue_path = args.requeue if args.requeue is not None else os.path.join(args.inputpath, 'requeue.csv')
+    quality = TileQuality(blank_threshold=args.blank, std_threshold=args.std, flat_threshold=args.flat)
+    bad = quality.check_folder(args.inputpath, requeue_path=requeue_path, workers=args.workers)
+    for result in bad:
+        print(f"{result['file']}: {result['reasons']}")
+    print(f"{len(bad)} bad images" + (f", written to {requeue_path}" if bad else ""))
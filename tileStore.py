@@ -0,0 +1,397 @@
+import os
+import json
+import argparse
+import numpy as np
+from rasterio.transform import Affine
+
+# One row per tile: grid id, chunk and slot of the pixels, modification time of the source image, affine transform (a, b, c, d, e, f),
+# bounds (west, south, east, north) and center (lat, lon)
+INDEX_DTYPE = np.dtype([('id', '<i8'), ('chunk', '<i4'), ('slot', '<i4'), ('mtime', '<i8'),
+                        ('transform', '<f8', (6,)), ('bounds', '<f8', (4,)), ('center', '<f8', (2,))])
+
+
+def grid_id(image):
+    """
+    Returns the grid id of a downloaded image, from its filename 'IMG<id>_LT<lat>_LG<long>.png'.
+
+    Parameters
+    ----------
+    image : str
+        Filename of the image.
+
+    Returns
+    -------
+    id : int
+        The id of the grid point.
+    """
+    return int(os.path.basename(image).split('_')[0][3:])
+
+
+class TileStore:
+    __version__='1.0'
+    """
+    **TileStore**
+
+    A class for storing the images of an acquisition as a stack of pixels in memory-mapped chunks, so training jobs can read any tile without decoding a PNG or TIFF.
+
+    The store is a folder holding:
+
+    - 'chunks/<n>.npy' : uint8 arrays of shape (chunk_size, 3, height, width), opened with np.load(mmap_mode='r'),
+    - 'index.npy' : one row per tile (INDEX_DTYPE): grid id, chunk, slot, modification time of the source image, transform, bounds and center,
+    - 'meta.json' : the tile shape, the chunk size and the filenames of the source images.
+
+    get() returns a view of a chunk, so reading a tile only touches its pages on disk. All the tiles must have the same size, as the GEBOT captures of an acquisition do.
+    append() is incremental: the images already stored with the same modification time are skipped, and the modified ones are rewritten in their slot.
+    The chunks are written first and the index last (atomically), so an interrupted export leaves the store readable.
+
+    Parameters
+    ----------
+    path : str/path
+        Folder of the store. It is created by the first append().
+    chunk_size : int, optional
+        Number of tiles per chunk, for a new store (default: 64).
+
+    Examples
+    --------
+    >>> store = TileStore('path/to/acq_001.tiles')
+    >>> store.append('path/to/image_folder')
+    >>> array = store.get(1532)
+    >>> transform = store.transform(1532)
+    >>> tiles = store.get_bbox(22.10, 35.10, 22.12, 35.11)
+
+    >>> python tileStore.py --inputpath path/to/image_folder --outputpath path/to/acq_001.tiles
+
+    Methods
+    -------
+    __init__()
+        Initializes the TileStore object and loads the index of an existing store.
+
+        Parameters
+        ----------
+        See the class parameters.
+
+        Returns
+        -------
+
+    append(imagePath, images=None, workers=4, prefetch=8)
+        Adds the new or modified images of a folder to the store.
+
+        Parameters
+        ----------
+        imagePath : str/path
+            Path to the image folder.
+        images : list, optional
+            Filenames of the images. If set to 'None', all the PNG/JPG images of the folder (default: None).
+        workers : int, optional
+            Number of decoding threads (default: 4).
+        prefetch : int, optional
+            Maximum number of images decoded ahead (default: 8).
+
+        Returns
+        -------
+        int
+            Number of tiles written.
+
+    save()
+        Writes the index and the metadata of the store.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+    get(id)
+        Returns the pixels of a tile.
+
+        Parameters
+        ----------
+        id : int
+            Grid id of the tile.
+
+        Returns
+        -------
+        numpy.memmap
+            Read-only view of shape (3, height, width).
+
+    transform(id)
+        Returns the affine transform of a tile.
+
+        Parameters
+        ----------
+        id : int
+            Grid id of the tile.
+
+        Returns
+        -------
+        affine.Affine
+            The transform, in EPSG:4326.
+
+    query(west, south, east, north)
+        Finds the tiles intersecting a bounding box.
+
+        Parameters
+        ----------
+        west, south, east, north : float
+            Bounding box in degrees.
+
+        Returns
+        -------
+        list
+            Grid ids of the tiles.
+
+    get_bbox(west, south, east, north)
+        Returns the tiles intersecting a bounding box.
+
+        Parameters
+        ----------
+        west, south, east, north : float
+            Bounding box in degrees.
+
+        Returns
+        -------
+        list
+            The (id, array, transform) tuples of the tiles.
+
+    """
+
+    def __init__(self, path, chunk_size=64):
+        """
+        Initializes the TileStore object and loads the index of an existing store.
+
+        Parameters
+        ----------
+        path : str/path
+            Folder of the store. It is created by the first append().
+        chunk_size : int, optional
+            Number of tiles per chunk, for a new store. An existing store keeps its chunk size (default: 64).
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self.shape = None
+        self.images = []
+        self.index = np.zeros(0, dtype=INDEX_DTYPE)
+        self.errors = {}
+        self.chunks = {}
+        self.footprints = None
+
+        if os.path.exists(os.path.join(path, 'meta.json')):
+            with open(os.path.join(path, 'meta.json')) as file:
+                meta = json.load(file)
+            self.chunk_size = meta['chunk_size']
+            self.shape = tuple(meta['shape'])
+            self.images = meta['images']
+            self.index = np.load(os.path.join(path, 'index.npy'))
+        self.rows = {int(id): row for row, id in enumerate(self.index['id'])}
+
+    def __len__(self):
+        """
+        Returns the number of tiles in the store.
+        """
+        return len(self.index)
+
+    def _chunk_path(self, chunk):
+        """
+        Returns the path of a chunk file.
+        """
+        return os.path.join(self.path, 'chunks', f'{chunk:05d}.npy')
+
+    def _chunk(self, chunk):
+        """
+        Returns the read-only memory map of a chunk, opened once.
+        """
+        if chunk not in self.chunks:
+            self.chunks[chunk] = np.load(self._chunk_path(chunk), mmap_mode='r')
+        return self.chunks[chunk]
+
+    def append(self, imagePath, images=None, workers=4, prefetch=8):
+        """
+        Adds the new or modified images of a folder to the store, decoding them with georefDataset.GeorefDataset.
+        The images whose filename has no grid id, that fail to decode or whose size differs from the stored tiles are skipped and listed in errors.
+
+        Parameters
+        ----------
+        imagePath : str/path
+            Path to the image folder.
+        images : list, optional
+            Filenames of the images. If set to 'None', all the PNG/JPG images of the folder (default: None).
+        workers : int, optional
+            Number of decoding threads (default: 4).
+        prefetch : int, optional
+            Maximum number of images decoded ahead (default: 8).
+
+        Returns
+        -------
+        written : int
+            Number of tiles written.
+        """
+        from georef import IMAGE_EXTENSIONS
+        from georefDataset import GeorefDataset
+
+        if images is None:
+            images = sorted(f for f in os.listdir(imagePath) if f.lower().endswith(IMAGE_EXTENSIONS))
+
+        todo, mtimes = [], {}
+        for image in images:
+            try:
+                id = grid_id(image)
+            except (IndexError, ValueError):
+                self.errors[image] = 'The filename has no grid id'
+                continue
+            mtimes[image] = os.stat(os.path.join(imagePath, image)).st_mtime_ns
+            row = self.rows.get(id)
+            if row is None or self.index['mtime'][row] != mtimes[image]:
+                todo.append(image)
+        if not todo:
+            return 0
+
+        os.makedirs(os.path.join(self.path, 'chunks'), exist_ok=True)
+        index = list(self.index.tolist())
+        writers = {}
+        written = 0
+
+        dataset = GeorefDataset(imagePath, images=todo, workers=workers, prefetch=prefetch)
+        try:
+            for image, array, transform, (lat, lon) in dataset.iter_images():
+                if self.shape is None:
+                    self.shape = array.shape
+                if array.shape != self.shape:
+                    self.errors[image] = f'The image is {array.shape[2]}x{array.shape[1]} pixels, the tiles of the store {self.shape[2]}x{self.shape[1]}'
+                    continue
+
+                id = grid_id(image)
+                row = self.rows.get(id, len(index))
+                chunk, slot = divmod(row, self.chunk_size)
+
+                if chunk not in writers:
+                    mode = 'r+' if os.path.exists(self._chunk_path(chunk)) else 'w+'
+                    writers[chunk] = np.lib.format.open_memmap(self._chunk_path(chunk), mode=mode, dtype=np.uint8,
+                                                               shape=(self.chunk_size,) + self.shape)
+                writers[chunk][slot] = array
+
+                w, s, e, n = transform.c, transform.f + transform.e * self.shape[1], transform.c + transform.a * self.shape[2], transform.f
+                values = (id, chunk, slot, mtimes[image], tuple(transform)[:6], (w, s, e, n), (lat, lon))
+                if row == len(index):
+                    self.rows[id] = row
+                    index.append(values)
+                    self.images.append(image)
+                else:
+                    index[row] = values
+                    self.images[row] = image
+                written += 1
+        finally:
+            for writer in writers.values():
+                writer.flush()
+            writers.clear()
+            self.errors.update(dataset.errors)
+            self.index = np.array(index, dtype=INDEX_DTYPE)
+            self.chunks = {}
+            self.footprints = None
+            if self.shape is not None:
+                self.save()
+
+        return written
+
+    def save(self):
+        """
+        Writes the index and the metadata of the store, atomically.
+        """
+        with open(os.path.join(self.path, 'index.npy.part'), 'wb') as file:
+            np.save(file, self.index)
+        os.replace(os.path.join(self.path, 'index.npy.part'), os.path.join(self.path, 'index.npy'))
+
+        meta = {'shape': list(self.shape), 'dtype': 'uint8', 'chunk_size': self.chunk_size, 'images': self.images}
+        with open(os.path.join(self.path, 'meta.json.part'), 'w') as file:
+            json.dump(meta, file)
+        os.replace(os.path.join(self.path, 'meta.json.part'), os.path.join(self.path, 'meta.json'))
+
+    def get(self, id):
+        """
+        Returns the pixels of a tile, as a view of its chunk: nothing is read until the array is used.
+
+        Parameters
+        ----------
+        id : int
+            Grid id of the tile.
+
+        Returns
+        -------
+        array : numpy.memmap
+            Read-only view of shape (3, height, width).
+        """
+        row = self.index[self.rows[id]]
+        return self._chunk(int(row['chunk']))[int(row['slot'])]
+
+    def transform(self, id):
+        """
+        Returns the affine transform of a tile.
+
+        Parameters
+        ----------
+        id : int
+            Grid id of the tile.
+
+        Returns
+        -------
+        transform : affine.Affine
+            The transform, in EPSG:4326.
+        """
+        return Affine(*self.index['transform'][self.rows[id]])
+
+    def query(self, west, south, east, north):
+        """
+        Finds the tiles intersecting a bounding box, with a footprintIndex.FootprintIndex built on the first query.
+
+        Parameters
+        ----------
+        west, south, east, north : float
+            Bounding box in degrees.
+
+        Returns
+        -------
+        ids : list
+            Grid ids of the tiles.
+        """
+        if self.footprints is None:
+            from footprintIndex import FootprintIndex
+            self.footprints = FootprintIndex(self.index['id'].tolist(), self.index['bounds'], images=self.images)
+        return self.footprints.query(west, south, east, north)
+
+    def get_bbox(self, west, south, east, north):
+        """
+        Returns the tiles intersecting a bounding box, as views of their chunks.
+
+        Parameters
+        ----------
+        west, south, east, north : float
+            Bounding box in degrees.
+
+        Returns
+        -------
+        tiles : list
+            The (id, array, transform) tuples of the tiles.
+        """
+        return [(id, self.get(id), self.transform(id)) for id in self.query(west, south, east, north)]
+
+
+    def __getattr__(self, attrib):
+        if attrib=="__version__":
+            return self.__version__
+        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{attrib}'")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process command line arguments")
+    parser.add_argument("--inputpath","-i", help="Image path", required=True)
+    parser.add_argument("--outputpath","-o", help="Folder of the tile store", required=True)
+    parser.add_argument("--chunk-size", type=int, help="Number of tiles per chunk of a new store", default=64)
+    parser.add_argument("--workers","-w", type=int, help="Number of decoding threads", default=4)
+
+    args = parser.parse_args()
+
+    store = TileStore(args.outputpath, chunk_size=args.chunk_size)
+    written = store.append(args.inputpath, workers=args.workers)
+    for image, error in store.errors.items():
+        print(f'{image}: {error}')
+    print(f'{written} tiles written, {len(store)} tiles in {args.outputpath}')